@@ -2,11 +2,28 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 import sqlite3
-from database import DatabaseManager
+from database import DatabaseManager, STATS_COLUMNS
 from messaging import MessageManager
 from reminder_scheduler import ReminderScheduler
-from utils import format_phone_number, validate_phone_number
+from archive_manager import ArchiveManager, DEFAULT_HORIZON_DAYS
+from outbox import Outbox, announcement_key, ANNOUNCEMENT_BATCH_SIZE
+from template_engine import validate_template, render_template, TEMPLATE_VARIABLES
+from coalesce import dedupe_recipients
+from message_cost import segment_info, gsm_rewrite, optimize_template, UCS2, SAMPLE_MEMBER, CURRENCY
+from reminder_forecast import forecast_totals
+from reminder_queue import ReminderQueue, REMINDER_BUDGET, FINAL_NOTICE_DAYS
+from email_channel import email_recipients, REMINDER_SUBJECTS
+from whatsapp_links import (build_reminder_links, build_announcement_links, page_count, links_page,
+                            link_sheet_csv, link_sheet_html, LINKS_PER_PAGE)
+from instrumentation import query_stats, set_current_page, INSTRUMENTATION_ENABLED
+from render_profiler import (start_rerun_profile, profile_section, mark_section, flatten_sections, flame_html,
+                             PROFILER_HISTORY_SIZE)
+from utils import format_phone_number, validate_phone_number, format_date
 import time
+import os
+
+# Admin-only pages (Performance) are shown when KJ_ADMIN_MODE is set
+ADMIN_MODE = os.getenv("KJ_ADMIN_MODE", "").lower() in ("1", "true", "yes")
 
 # Initialize database manager
 @st.cache_resource
@@ -31,6 +48,13 @@ def main():
         initial_sidebar_state="expanded"
     )
     
+    # Render profiler (admins only); a cProfile run is armed from the sidebar for the next rerun
+    profiler = None
+    if ADMIN_MODE and st.session_state.get("render_profiler_enabled"):
+        profiler = start_rerun_profile(use_cprofile=st.session_state.pop("render_profiler_cprofile_armed", False))
+    
+    mark_section("Setup")
+    
     # Initialize managers
     db_manager = init_database()
     message_manager = init_message_manager()
@@ -211,37 +235,65 @@ def main():
     st.markdown("---")
     
     # Sidebar navigation
+    mark_section("Sidebar")
     with st.sidebar:
         st.header("Navigation")
-        page = st.selectbox(
-            "Select Page",
-            ["Dashboard", "Analytics", "Member Registration", "Payment Tracking", "Kids Training", 
-             "Send Reminders", "Bulk Messaging", "Member Check-in", "Message Settings", "Member Database", "Data Export"]
-        )
+        pages = ["Dashboard", "Analytics", "Member Registration", "Payment Tracking", "Kids Training",
+                 "Send Reminders", "Bulk Messaging", "Member Check-in", "Message Settings", "Member Database", "Data Export"]
+        if ADMIN_MODE:
+            pages.append("Performance")
+        page = st.selectbox("Select Page", pages)
+        
+        if ADMIN_MODE:
+            st.markdown("---")
+            st.toggle("⏱️ Render profiler", key="render_profiler_enabled")
+            if st.session_state.get("render_profiler_enabled"):
+                if st.button("🔬 cProfile next rerun"):
+                    st.session_state["render_profiler_cprofile_armed"] = True
+                if st.session_state.get("render_profiler_cprofile_armed"):
+                    st.caption("cProfile armed: the next interaction will be profiled.")
+    
+    # Query timings recorded during this rerun are attributed to the page
+    set_current_page(page)
     
     # Main content based on selected page
-    if page == "Dashboard":
-        show_dashboard(db_manager, reminder_scheduler)
-    elif page == "Analytics":
-        show_analytics(db_manager)
-    elif page == "Member Registration":
-        show_member_registration(db_manager)
-    elif page == "Payment Tracking":
-        show_payment_tracking(db_manager)
-    elif page == "Kids Training":
-        show_kids_training(db_manager)
-    elif page == "Send Reminders":
-        show_send_reminders(db_manager, message_manager)
-    elif page == "Bulk Messaging":
-        show_bulk_messaging(db_manager, message_manager)
-    elif page == "Member Check-in":
-        show_member_checkin(db_manager)
-    elif page == "Message Settings":
-        show_message_settings(db_manager)
-    elif page == "Member Database":
-        show_member_database(db_manager)
-    elif page == "Data Export":
-        show_data_export(db_manager)
+    try:
+        with profile_section(page):
+            if page == "Dashboard":
+                show_dashboard(db_manager, reminder_scheduler)
+            elif page == "Analytics":
+                show_analytics(db_manager)
+            elif page == "Member Registration":
+                show_member_registration(db_manager)
+            elif page == "Payment Tracking":
+                show_payment_tracking(db_manager)
+            elif page == "Kids Training":
+                show_kids_training(db_manager)
+            elif page == "Send Reminders":
+                show_send_reminders(db_manager, message_manager)
+            elif page == "Bulk Messaging":
+                show_bulk_messaging(db_manager, message_manager)
+            elif page == "Member Check-in":
+                show_member_checkin(db_manager)
+            elif page == "Message Settings":
+                show_message_settings(db_manager)
+            elif page == "Member Database":
+                show_member_database(db_manager)
+            elif page == "Data Export":
+                show_data_export(db_manager)
+            elif page == "Performance" and ADMIN_MODE:
+                show_performance()
+    finally:
+        # Also runs when a page calls st.rerun(), so the profiler never stays attached
+        if profiler is not None:
+            profiler.stop()
+    
+    if profiler is not None:
+        profiler.page = page
+        history = st.session_state.setdefault("render_profile_history", [])
+        history.append(profiler.to_entry())
+        del history[:-PROFILER_HISTORY_SIZE]
+        show_render_profile(history)
 
 def show_dashboard(db_manager, reminder_scheduler):
     st.header("📊 Dashboard")
@@ -391,7 +443,7 @@ def show_payment_tracking(db_manager):
                 with col3:
                     # Calculate next due date
                     next_due = db_manager.calculate_next_due_date(payment['payment_date'], payment['membership_type'])
-                    days_remaining = (next_due - datetime.now().date()).days
+                    days_remaining = (next_due - db_manager.clock.today()).days
                     
                     if days_remaining < 0:
                         st.error(f"Overdue by {abs(days_remaining)} days")
@@ -540,7 +592,7 @@ def show_kids_training(db_manager):
                         last_payment = db_manager.get_last_kid_payment(kid['id'])
                         if last_payment:
                             next_due = datetime.strptime(last_payment['payment_date'], '%Y-%m-%d').date() + timedelta(days=30)
-                            days_remaining = (next_due - datetime.now().date()).days
+                            days_remaining = (next_due - db_manager.clock.today()).days
                             
                             if days_remaining < 0:
                                 st.error(f"Overdue by {abs(days_remaining)} days")
@@ -592,15 +644,18 @@ def show_kid_payment_modal(db_manager, kid):
 def show_send_reminders(db_manager, message_manager):
     st.header("📱 Send Payment Reminders")
     
+    show_reminder_daemon_status(db_manager)
+    
     # Get pending reminders
     reminder_scheduler = init_reminder_scheduler()
+    show_reminder_forecast(db_manager, message_manager, reminder_scheduler)
     pending_reminders = reminder_scheduler.get_pending_reminders(db_manager)
     
     if not pending_reminders:
         st.info("🎉 No pending reminders at this time!")
         return
     
-    st.write(f"Found {len(pending_reminders)} members who need payment reminders:")
+    st.write(f"Found {len(pending_reminders)} members who need payment reminders (most urgent first):")
     
     # Display pending reminders
     selected_reminders = []
@@ -630,6 +685,7 @@ def show_send_reminders(db_manager, message_manager):
                     st.warning(f"Due in {days} days")
                 else:
                     st.info(f"Due in {days} days")
+                st.caption(f"{reminder['escalation'].title()} reminder · priority {reminder['priority_score']:,.0f}")
             
             st.markdown("---")
     
@@ -652,69 +708,329 @@ def show_send_reminders(db_manager, message_manager):
         with col2:
             if st.button("🚀 Send Reminders", use_container_width=True, type="primary"):
                 send_bulk_reminders(message_manager, selected_reminders, send_method, db_manager)
+    
+    show_whatsapp_link_sheet(db_manager, 'reminder_link_sheet')
+
+def reminder_service_running(job, clock):
+    """Whether the reminder service holds a live lease at clock's now, going by a scheduler_jobs row"""
+    return bool(job['lock_owner']) and job['lock_expires_at'] >= clock.timestamp()
+
+def show_reminder_daemon_status(db_manager):
+    """Status of the automatic reminder service (reminder_daemon.py)"""
+    jobs = db_manager.get_scheduler_jobs()
+    
+    with st.expander("🤖 Automatic Reminders", expanded=False):
+        if not jobs:
+            st.info("The automatic reminder service has not run yet. Start it with `python reminder_daemon.py`.")
+        else:
+            for job in jobs:
+                st.markdown(f"**{job['job_name'].replace('_', ' ').title()}**")
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("Status", job['status'].title())
+                with col2:
+                    st.metric("Last Run", job['last_run_at'] or "Never")
+                with col3:
+                    st.metric("Next Run", job['next_run_at'] or "-")
+                with col4:
+                    st.metric("Sent Last Run", job['last_sent_count'] or 0)
+                
+                details = f"Schedule `{job['schedule']}` · {job['run_count']} runs"
+                if job['last_duration_ms'] is not None:
+                    details += f" · last took {job['last_duration_ms'] / 1000:.1f} s"
+                if job['missed_runs']:
+                    details += f" · caught up {job['missed_runs']} missed runs"
+                st.caption(details)
+                if job['last_error']:
+                    st.error(f"Last run failed: {job['last_error']}")
+                
+                if reminder_service_running(job, db_manager.clock):
+                    st.caption(f"🟢 Service running ({job['lock_owner']})")
+                else:
+                    st.caption("🔴 Service not running - start it with `python reminder_daemon.py`")
+                
+                if st.button("▶️ Run at Next Check", key=f"run_job_{job['job_name']}"):
+                    if db_manager.request_job_run(job['job_name']):
+                        st.success("✅ The service will send due reminders within a minute.")
+        
+        escalation = ReminderQueue(db_manager).get_escalation_counts()
+        if escalation:
+            st.markdown("**Escalation Ladder (members reminded for their current due date)**")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Gentle", escalation.get('gentle', 0))
+            with col2:
+                st.metric("Firm", escalation.get('firm', 0))
+            with col3:
+                st.metric("Final Notice", escalation.get('final', 0))
+        if REMINDER_BUDGET is not None:
+            st.caption(f"💰 Each run spends at most ${REMINDER_BUDGET:,.2f} {CURRENCY}; "
+                       "the most valuable reminders go first and the rest wait for the next run.")
+        
+        outbox = Outbox(db_manager)
+        counts = outbox.get_status_counts()
+        if counts:
+            st.markdown("**Outbox**")
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Pending", counts.get('pending', 0))
+            with col2:
+                st.metric("Sending", counts.get('sending', 0))
+            with col3:
+                st.metric("Sent", counts.get('sent', 0))
+            with col4:
+                st.metric("Failed", counts.get('failed', 0))
+        
+        if outbox.send_window:
+            plan = outbox.get_plan_summary()
+            caption = f"🕘 Send window {outbox.send_window.describe()}"
+            if plan:
+                caption += (f" · {plan['pending']} waiting ({plan['overdue']} overdue, sent first), "
+                            f"next at {plan['first_at']}, last at {plan['last_at']}")
+            st.caption(caption)
+        
+        delivery = db_manager.get_message_status_counts(days=7)
+        if delivery:
+            st.markdown("**Delivery (status callbacks, last 7 days)**")
+            delivered = delivery.get('delivered', 0) + delivery.get('read', 0)
+            undelivered = delivery.get('undelivered', 0) + delivery.get('failed', 0)
+            reported = sum(delivery.values())
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Delivered", delivered)
+            with col2:
+                st.metric("Undelivered", undelivered)
+            with col3:
+                st.metric("In Transit", reported - delivered - undelivered)
+            with col4:
+                finished = delivered + undelivered
+                st.metric("Delivery Rate", f"{delivered / finished * 100:.1f}%" if finished else "-")
+        
+        bounces = db_manager.get_email_bounce_counts(days=7)
+        if bounces:
+            st.markdown("**Email Bounces (last 7 days)**")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Hard Bounces", bounces.get('hard', 0))
+            with col2:
+                st.metric("Soft Bounces", bounces.get('soft', 0))
+            with col3:
+                st.metric("Suppressed Addresses", len(db_manager.get_suppressed_emails()))
+        
+        attempts = db_manager.get_message_attempt_summary(days=7)
+        if attempts:
+            st.markdown("**Send Attempts (last 7 days)**")
+            attempts_df = pd.DataFrame(attempts)
+            attempts_df.columns = ['Provider', 'Channel', 'Outcome', 'Attempts', 'Avg Latency (ms)']
+            st.dataframe(attempts_df, use_container_width=True, hide_index=True)
+
+def show_reminder_forecast(db_manager, message_manager, reminder_scheduler):
+    """Automatic reminders expected per day, for budgeting message credits"""
+    with st.expander("📈 Reminder Forecast", expanded=False):
+        today = db_manager.clock.today()
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            start_date = st.date_input("From", value=today, min_value=today, key="forecast_start")
+        with col2:
+            end_date = st.date_input("To", value=today + timedelta(days=29), min_value=today, key="forecast_end")
+        with col3:
+            payment_delay_days = st.number_input("Members pay (days after due date)", min_value=0, max_value=90,
+                                                 value=0, key="forecast_delay")
+        
+        forecast = reminder_scheduler.forecast_reminders(db_manager, start_date, end_date, message_manager,
+                                                         int(payment_delay_days))
+        totals = forecast_totals(forecast)
+        if not totals:
+            st.info("Pick an end date on or after the start date.")
+            return
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Messages", f"{totals['messages']:,}")
+        with col2:
+            st.metric("SMS Segments", f"{totals['segments']:,}")
+        with col3:
+            st.metric("Estimated Cost", f"${totals['cost']:,.2f} {CURRENCY}")
+        with col4:
+            st.metric("Busiest Day", format_date(totals['busiest_date']), f"{totals['busiest_messages']} messages",
+                      delta_color="off")
+        
+        st.bar_chart(forecast.set_index('date')[['payment_reminders', 'overdue_reminders', 'final_notices',
+                                                 'kids_reminders']])
+        caption = (f"{totals['emails']:,} of the messages go out by email. Assumes members renew "
+                   f"{int(payment_delay_days)} days after each due date and that overdue members stay overdue; "
+                   "a parent with several kids is counted once per kid.")
+        if REMINDER_BUDGET is not None:
+            caption += f" Each day's run spends at most ${REMINDER_BUDGET:,.2f} {CURRENCY}, most valuable reminders first."
+        st.caption(caption)
+        
+        forecast_df = forecast.copy()
+        forecast_df.columns = ['Date', 'Payment', 'Overdue', 'Final', 'Kids', 'Messages', 'SMS', 'Emails', 'Segments',
+                               f'Cost ({CURRENCY})']
+        st.dataframe(forecast_df, use_container_width=True, hide_index=True)
 
 def send_bulk_reminders(message_manager, reminders, send_method, db_manager):
     """Generate WhatsApp links for sending reminders"""
-    import urllib.parse
+    links = build_reminder_links(reminders, db_manager.get_message_template("payment_reminder"))
     
-    st.subheader("📱 WhatsApp Reminder Links")
+    # Log every generated link in one transaction
+    db_manager.log_reminders_batch([(link['member_id'], "WhatsApp_Link", link['message'], True) for link in links])
+    
+    st.session_state['reminder_link_sheet'] = make_link_sheet("WhatsApp Reminder Links", links, "WhatsApp_Manual")
+
+def make_link_sheet(title, links, log_type):
+    """Session-state entry for show_whatsapp_link_sheet; the downloads are built once here"""
+    return {
+        'title': title,
+        'links': links,
+        'log_type': log_type,
+        'csv': link_sheet_csv(links),
+        'html': link_sheet_html(links, title),
+    }
+
+def show_whatsapp_link_sheet(db_manager, state_key):
+    """Paginated WhatsApp link sheet kept in session state, with CSV/HTML downloads"""
+    sheet = st.session_state.get(state_key)
+    if not sheet:
+        return
+    links = sheet['links']
+    
+    st.subheader(f"📱 {sheet['title']}")
     st.info("Click each link below to open WhatsApp with the message pre-filled. You can then send it manually.")
+    st.success(f"✅ Generated WhatsApp links for {len(links)} recipients!")
     
-    total_count = len(reminders)
+    col1, col2, col3 = st.columns([1, 1, 1])
+    with col1:
+        page = st.number_input("Page", min_value=1, max_value=page_count(links), value=1, step=1,
+                               key=f"{state_key}_page")
+    with col2:
+        st.download_button("⬇️ Download Link Sheet (HTML)", sheet['html'],
+                           file_name="whatsapp_links.html", mime="text/html", use_container_width=True)
+    with col3:
+        st.download_button("⬇️ Download Link Sheet (CSV)", sheet['csv'],
+                           file_name="whatsapp_links.csv", mime="text/csv", use_container_width=True)
+    st.caption(f"Page {page} of {page_count(links)} · {LINKS_PER_PAGE} recipients per page")
     
-    for i, reminder in enumerate(reminders):
-        message_template = db_manager.get_message_template("payment_reminder")
-        message = message_manager.format_message(message_template, reminder)
-        
-        # Format phone number for WhatsApp URL (remove spaces, ensure country code)
-        phone = reminder['phone'].replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
-        
-        # Add country code if not present (assuming Indian numbers start with +91)
-        if not phone.startswith('+'):
-            if phone.startswith('91'):
-                phone = '+' + phone
-            elif len(phone) == 10:  # Indian mobile number without country code
-                phone = '+91' + phone
-            else:
-                phone = '+91' + phone  # Default to India
-        
-        # URL encode the message
-        encoded_message = urllib.parse.quote(message)
-        
-        # Create WhatsApp URL
-        whatsapp_url = f"https://wa.me/{phone.replace('+', '')}?text={encoded_message}"
-        
-        # Display the reminder card
+    for link in links_page(links, page):
         with st.container():
             col1, col2 = st.columns([3, 1])
             
             with col1:
-                st.markdown(f"**{reminder['member_name']}** - {reminder['phone']}")
-                st.caption(f"₹{reminder['amount']} | {reminder['membership_type']}")
+                st.markdown(f"**{link['name']}** - {link['phone']}")
+                st.caption(link['details'])
                 
                 # Show a preview of the message (truncated)
-                preview = message[:100] + "..." if len(message) > 100 else message
+                preview = link['message'][:100] + "..." if len(link['message']) > 100 else link['message']
                 st.text(f"Message: {preview}")
             
             with col2:
-                st.markdown(f'<a href="{whatsapp_url}" target="_blank"><button style="background-color: #25D366; color: white; border: none; padding: 10px 15px; border-radius: 5px; cursor: pointer; width: 100%; font-weight: bold;">📱 Open WhatsApp</button></a>', unsafe_allow_html=True)
-                
-                # Log the reminder when link is generated
-                db_manager.log_reminder(reminder['member_id'], "WhatsApp_Link", message)
+                st.markdown(f'<a href="{link["url"]}" target="_blank"><button style="background-color: #25D366; color: white; border: none; padding: 10px 15px; border-radius: 5px; cursor: pointer; width: 100%; font-weight: bold;">📱 Open WhatsApp</button></a>', unsafe_allow_html=True)
         
         st.markdown("---")
     
-    st.success(f"✅ Generated WhatsApp links for {total_count} members!")
     st.info("💡 **How to use:** Click each 'Open WhatsApp' button to open WhatsApp with the message ready. Review and send manually.")
     
     # Option to mark all as sent
-    if st.button("✅ Mark All as Sent", type="secondary", use_container_width=True):
-        for reminder in reminders:
-            message_template = db_manager.get_message_template("payment_reminder")
-            message = message_manager.format_message(message_template, reminder)
-            db_manager.log_reminder(reminder['member_id'], "WhatsApp_Manual", message)
-        st.success("All reminders marked as sent!")
-        st.rerun()
+    if st.button("✅ Mark All as Sent", type="secondary", use_container_width=True, key=f"{state_key}_mark_sent"):
+        if sheet['log_type']:
+            db_manager.log_reminders_batch([(link['member_id'], sheet['log_type'], link['message'], True)
+                                            for link in links])
+        del st.session_state[state_key]
+        st.success("All messages marked as sent!")
+        st.balloons()
+
+def show_template_segments(db_manager, template_type, template_text):
+    """SMS segments a template takes and, when it is UCS-2, a GSM-7 rewrite that can be applied"""
+    if validate_template(template_text):
+        return
+    report = optimize_template(template_text)
+    current = report['current']
+    st.caption(f"📏 {current.encoding}, {current.length} characters: {current.segments} SMS segment(s) per reminder")
+    
+    if report['suggestion'] and report['segments_saved'] > 0:
+        replaced = ", ".join(f"{char} → '{replacement}'" if replacement else f"{char} removed"
+                             for char, replacement in report['replaced'].items())
+        st.warning(f"⚠️ {' '.join(current.non_gsm)} force UCS-2 encoding. A GSM-7 version takes "
+                   f"{report['suggested'].segments} segment(s), saving {report['segments_saved']} per reminder ({replaced}).")
+        with st.expander("Suggested GSM-7 template"):
+            st.code(report['suggestion'], language=None)
+            if st.button("Use GSM-7 Template", key=f"gsm_{template_type}"):
+                if db_manager.update_message_template(template_type, report['suggestion']):
+                    st.success("✅ Template updated!")
+                    st.rerun()
+                else:
+                    st.error("❌ Failed to update template")
+
+def show_email_templates(db_manager):
+    """HTML templates for reminder emails, with a preview for a sample member"""
+    st.write("**Email Templates** (members with an email address get reminders by email when SMTP is configured)")
+    st.caption("Each email carries the text template as its plain-text part and this HTML as its formatted part. "
+               "Use the same variables as the text templates; write CSS as inline style attributes.")
+    
+    for template_type, label in [("payment_reminder", "Payment Reminder"), ("overdue_reminder", "Overdue Reminder"),
+                                 ("final_reminder", "Final Notice")]:
+        st.markdown(f"**{label} Email**")
+        st.caption(f"Subject: {render_template(REMINDER_SUBJECTS[template_type], SAMPLE_MEMBER)}")
+        new_template = st.text_area(
+            "HTML Template:",
+            value=db_manager.get_message_template(f"{template_type}_email"),
+            height=200,
+            key=f"email_template_{template_type}"
+        )
+        
+        template_errors = validate_template(new_template)
+        if not template_errors:
+            with st.expander("Preview"):
+                st.markdown(render_template(new_template, SAMPLE_MEMBER), unsafe_allow_html=True)
+        
+        if st.button(f"Update {label} Email", key=f"update_{template_type}_email"):
+            if template_errors:
+                for error in template_errors:
+                    st.error(f"❌ {error}")
+            elif db_manager.update_message_template(f"{template_type}_email", new_template):
+                st.success("✅ Email template updated!")
+            else:
+                st.error("❌ Failed to update template")
+
+def show_reminder_trends(db_manager):
+    """Reminders sent over time, from the daily statistics rollup"""
+    st.write("**Reminder Trends**")
+    
+    today = db_manager.clock.today()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        start_date = st.date_input("From", value=today - timedelta(days=89), key="trend_start")
+    with col2:
+        end_date = st.date_input("To", value=today, key="trend_end")
+    with col3:
+        granularity = st.selectbox("Per", ["Day", "Week", "Month", "Year"], index=1, key="trend_granularity")
+    with col4:
+        split = st.selectbox("Split by", ["Reminder Type", "Channel"], key="trend_split")
+    
+    by = 'reminder_type' if split == "Reminder Type" else 'channel'
+    stats = db_manager.get_reminder_stats(start_date, end_date, granularity.lower(), by=(by,))
+    if stats.empty:
+        st.info("No reminders were logged in this period.")
+        return
+    
+    totals = stats[STATS_COLUMNS].sum()
+    finished = totals['delivered'] + totals['undelivered']
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Reminders", f"{totals['sent']:,}")
+    with col2:
+        st.metric("Success Rate", f"{totals['successful'] / totals['sent'] * 100:.1f}%")
+    with col3:
+        st.metric("Delivery Rate", f"{totals['delivered'] / finished * 100:.1f}%" if finished else "-")
+    with col4:
+        st.metric("Undelivered", f"{totals['undelivered']:,}")
+    
+    st.line_chart(stats.pivot_table(index='period', columns=by, values='sent', aggfunc='sum', fill_value=0))
+    st.caption("Counted as reminders are logged and delivery reports arrive; archived logs stay in the totals.")
+    
+    trend_df = stats.copy()
+    trend_df.columns = ['Period', split, 'Reminders', 'Successful', 'Tracked', 'Delivered', 'Undelivered']
+    st.dataframe(trend_df, use_container_width=True, hide_index=True)
 
 def show_message_settings(db_manager):
     st.header("⚙️ Message Settings")
@@ -724,8 +1040,11 @@ def show_message_settings(db_manager):
     # Get current templates
     payment_template = db_manager.get_message_template("payment_reminder")
     overdue_template = db_manager.get_message_template("overdue_reminder")
+    final_template = db_manager.get_message_template("final_reminder")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["Payment Reminder", "Overdue Reminder", "Available Variables", "Twilio Configuration"])
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(["Payment Reminder", "Overdue Reminder", "Final Notice",
+                                                        "Email Templates", "Available Variables",
+                                                        "Twilio Configuration", "Reminder Trends"])
     
     with tab1:
         st.write("**Payment Reminder Template** (sent 15-30 days before due date)")
@@ -737,8 +1056,14 @@ def show_message_settings(db_manager):
             help="Use variables like {member_name}, {amount}, {due_date}, etc."
         )
         
+        show_template_segments(db_manager, "payment_reminder", new_payment_template)
+        
         if st.button("Update Payment Template", key="update_payment"):
-            if db_manager.update_message_template("payment_reminder", new_payment_template):
+            template_errors = validate_template(new_payment_template)
+            if template_errors:
+                for error in template_errors:
+                    st.error(f"❌ {error}")
+            elif db_manager.update_message_template("payment_reminder", new_payment_template):
                 st.success("✅ Payment reminder template updated!")
             else:
                 st.error("❌ Failed to update template")
@@ -753,31 +1078,53 @@ def show_message_settings(db_manager):
             help="Use variables like {member_name}, {amount}, {overdue_days}, etc."
         )
         
+        show_template_segments(db_manager, "overdue_reminder", new_overdue_template)
+        
         if st.button("Update Overdue Template", key="update_overdue"):
-            if db_manager.update_message_template("overdue_reminder", new_overdue_template):
+            template_errors = validate_template(new_overdue_template)
+            if template_errors:
+                for error in template_errors:
+                    st.error(f"❌ {error}")
+            elif db_manager.update_message_template("overdue_reminder", new_overdue_template):
                 st.success("✅ Overdue reminder template updated!")
             else:
                 st.error("❌ Failed to update template")
     
     with tab3:
-        st.write("**Available Variables for Message Templates:**")
+        st.write(f"**Final Notice Template** (sent {FINAL_NOTICE_DAYS} days after due date, the last step after "
+                 "the payment and overdue reminders)")
         
-        variables = [
-            "{member_name} - Member's full name",
-            "{amount} - Payment amount",
-            "{due_date} - Next payment due date",
-            "{membership_type} - Type of membership",
-            "{overdue_days} - Number of days overdue",
-            "{court_name} - Your badminton court name",
-            "{phone} - Your contact phone number"
-        ]
+        new_final_template = st.text_area(
+            "Message Template:",
+            value=final_template,
+            height=150,
+            help="Use variables like {member_name}, {amount}, {overdue_days}, etc."
+        )
         
-        for var in variables:
-            st.code(var)
+        show_template_segments(db_manager, "final_reminder", new_final_template)
         
-        st.info("💡 You can customize these templates with your own message style and include any of these variables.")
+        if st.button("Update Final Notice Template", key="update_final"):
+            template_errors = validate_template(new_final_template)
+            if template_errors:
+                for error in template_errors:
+                    st.error(f"❌ {error}")
+            elif db_manager.update_message_template("final_reminder", new_final_template):
+                st.success("✅ Final notice template updated!")
+            else:
+                st.error("❌ Failed to update template")
     
     with tab4:
+        show_email_templates(db_manager)
+    
+    with tab5:
+        st.write("**Available Variables for Message Templates:**")
+        
+        for variable, description in TEMPLATE_VARIABLES.items():
+            st.code(f"{{{variable}}} - {description}")
+        
+        st.info("💡 You can customize these templates with your own message style and include any of these variables.")
+    
+    with tab6:
         st.write("**Twilio Configuration & Testing**")
         
         # Get message manager for testing
@@ -814,6 +1161,22 @@ def show_message_settings(db_manager):
         
         st.markdown("---")
         
+        st.subheader("📡 Provider Routes")
+        st.caption("Each channel tries its routes best first and fails over to the next "
+                   "(set with MESSAGE_ROUTES and MESSAGE_ROUTING_STRATEGY)")
+        routes = message_manager.router.snapshot()
+        if routes:
+            routes_df = pd.DataFrame(routes)
+            routes_df['configured'] = [message_manager.router.providers[route['provider']].configured()
+                                       for route in routes]
+            routes_df.columns = ['Route', 'Provider', 'Channel', 'Health', 'Avg Latency (ms)', 'Sends', 'Circuit',
+                                 'Configured']
+            st.dataframe(routes_df, use_container_width=True, hide_index=True)
+        else:
+            st.warning("⚠️ No message routes configured")
+        
+        st.markdown("---")
+        
         # Test connection button
         st.subheader("🧪 Test Connection")
         
@@ -910,6 +1273,9 @@ def show_message_settings(db_manager):
         
         st.markdown("---")
         st.info("💡 After updating any configuration, restart the app to apply changes.")
+    
+    with tab7:
+        show_reminder_trends(db_manager)
 
 def show_member_database(db_manager):
     st.header("🗄️ Member Database")
@@ -949,7 +1315,7 @@ def show_member_database(db_manager):
                 with col2:
                     # Calculate next due date
                     next_due = db_manager.calculate_next_due_date(member['payment_date'], member['membership_type'])
-                    days_remaining = (next_due - datetime.now().date()).days
+                    days_remaining = (next_due - db_manager.clock.today()).days
                     
                     st.write("**Payment Status:**")
                     if days_remaining < 0:
@@ -985,11 +1351,13 @@ def show_analytics(db_manager):
     st.header("📈 Analytics Dashboard")
     
     # Get analytics data
+    mark_section("Load analytics")
     revenue_analytics = db_manager.get_revenue_analytics()
     membership_analytics = db_manager.get_membership_analytics()
     kids_analytics = db_manager.get_kids_analytics()
     
     # Revenue Overview Section
+    mark_section("Revenue Overview")
     st.subheader("💰 Revenue Overview")
     
     col1, col2, col3, col4 = st.columns(4)
@@ -1055,6 +1423,7 @@ def show_analytics(db_manager):
     st.markdown("---")
     
     # Membership Analytics Section
+    mark_section("Membership Analytics")
     st.subheader("👥 Membership Analytics")
     
     col1, col2, col3 = st.columns(3)
@@ -1107,6 +1476,7 @@ def show_analytics(db_manager):
     st.markdown("---")
     
     # Kids Training Analytics
+    mark_section("Kids Training Analytics")
     st.subheader("🧒 Kids Training Analytics")
     
     col1, col2, col3 = st.columns(3)
@@ -1164,6 +1534,7 @@ def show_bulk_messaging(db_manager, message_manager):
     st.header("📢 Bulk Messaging")
     
     # Message composition section
+    mark_section("Compose Message")
     st.subheader("✉️ Compose Message")
     
     # Recipient selection
@@ -1188,17 +1559,18 @@ def show_bulk_messaging(db_manager, message_manager):
     if recipient_type == "All Members":
         recipients = db_manager.get_members_for_bulk_messaging()
         kids_parents = db_manager.get_kids_parents_for_messaging()
-        all_recipients = recipients + [{"id": f"parent_{i}", "name": p["name"], "phone": p["phone"], "membership_type": "Kids Parent"} for i, p in enumerate(kids_parents)]
+        # A member who is also a parent gets the announcement once
+        all_recipients = dedupe_recipients(recipients + [{"id": f"parent_{i}", "name": p["name"], "phone": p["phone"], "membership_type": f"Kids Parent: {p['kid_names']}"} for i, p in enumerate(kids_parents)])
     elif recipient_type == "Members by Type":
         recipients = db_manager.get_members_for_bulk_messaging(membership_filter)
         all_recipients = recipients
     elif recipient_type == "Kids Parents":
         kids_parents = db_manager.get_kids_parents_for_messaging()
-        all_recipients = [{"id": f"parent_{i}", "name": p["name"], "phone": p["phone"], "membership_type": "Kids Parent"} for i, p in enumerate(kids_parents)]
+        all_recipients = dedupe_recipients([{"id": f"parent_{i}", "name": p["name"], "phone": p["phone"], "membership_type": f"Kids Parent: {p['kid_names']}"} for i, p in enumerate(kids_parents)])
     else:  # Custom Selection
         all_members = db_manager.get_members_for_bulk_messaging()
         kids_parents = db_manager.get_kids_parents_for_messaging()
-        all_possible = all_members + [{"id": f"parent_{i}", "name": p["name"], "phone": p["phone"], "membership_type": "Kids Parent"} for i, p in enumerate(kids_parents)]
+        all_possible = dedupe_recipients(all_members + [{"id": f"parent_{i}", "name": p["name"], "phone": p["phone"], "membership_type": f"Kids Parent: {p['kid_names']}"} for i, p in enumerate(kids_parents)])
         
         st.write("**Select Recipients:**")
         selected_recipients = []
@@ -1246,7 +1618,8 @@ def show_bulk_messaging(db_manager, message_manager):
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        send_method = st.selectbox("Send via:", ["SMS", "WhatsApp"])
+        send_methods = ["SMS", "WhatsApp"] + (["Email"] if message_manager.is_configured("Email") else [])
+        send_method = st.selectbox("Send via:", send_methods)
     
     with col2:
         include_court_info = st.checkbox("Include Court Contact", value=True)
@@ -1254,6 +1627,12 @@ def show_bulk_messaging(db_manager, message_manager):
     with col3:
         send_test = st.checkbox("Send Test First")
     
+    if send_method == "Email":
+        # Only recipients with a valid address that hasn't bounced; kids' parents have no email on file
+        emailable = email_recipients(all_recipients, db_manager.get_suppressed_emails())
+        st.caption(f"📧 {len(emailable)} of {len(all_recipients)} recipients have an email address")
+        all_recipients = emailable
+    
     # Build final message (always build it when message_text exists)
     final_message = ""
     if message_text:
@@ -1272,8 +1651,18 @@ def show_bulk_messaging(db_manager, message_manager):
         
         # Cost estimation
         if all_recipients:
-            cost_estimate = message_manager.get_message_cost_estimate(len(all_recipients), send_method)
+            cost_estimate = message_manager.get_message_cost_estimate(len(all_recipients), send_method, final_message)
             st.write(f"**Estimated Cost:** ${cost_estimate['total_cost']:.3f} USD ({cost_estimate['recipients']} {cost_estimate['method']} messages)")
+            if send_method == "SMS":
+                segments = segment_info(final_message)
+                st.caption(f"{segments.encoding}, {segments.length} characters: {segments.segments} SMS segment(s) per recipient")
+                if segments.encoding == UCS2:
+                    suggestion, replaced, _ = gsm_rewrite(final_message)
+                    if replaced and segment_info(suggestion).segments < segments.segments:
+                        st.warning(f"⚠️ {' '.join(segments.non_gsm)} switch this message to UCS-2. Without them it would take "
+                                   f"{segment_info(suggestion).segments} segment(s) per recipient instead of {segments.segments}.")
+                        with st.expander("GSM-7 version of this message"):
+                            st.code(suggestion, language=None)
     
     # Send buttons
     if message_text and all_recipients and final_message:
@@ -1283,16 +1672,17 @@ def show_bulk_messaging(db_manager, message_manager):
             if send_test and st.button("🧪 Send Test Message", use_container_width=True):
                 # Send to first recipient only
                 test_recipient = all_recipients[0]
-                success = message_manager.send_message(
+                result = message_manager.send_message(
                     phone=test_recipient['phone'],
                     message=f"[TEST MESSAGE]\n\n{final_message}",
                     method=send_method
                 )
+                message_manager.flush_attempts(db_manager)
                 
-                if success:
+                if result:
                     st.success(f"✅ Test message sent to {test_recipient['name']}")
                 else:
-                    st.error("❌ Failed to send test message")
+                    st.error(f"❌ Failed to send test message ({result.error_class.replace('_', ' ')}): {result.error}")
         
         with col2:
             if st.button("🚀 Send to All", use_container_width=True, type="primary"):
@@ -1303,9 +1693,12 @@ def show_bulk_messaging(db_manager, message_manager):
                 # This would save the message as a custom template
                 st.info("Template saving feature coming soon!")
     
+    show_whatsapp_link_sheet(db_manager, 'announcement_link_sheet')
+    
     st.markdown("---")
     
     # Message history
+    mark_section("Recent Bulk Messages")
     st.subheader("📜 Recent Bulk Messages")
     message_history = db_manager.get_bulk_message_history(5)
     
@@ -1337,6 +1730,7 @@ def show_member_checkin(db_manager):
     tab1, tab2, tab3 = st.tabs(["Check-in/Check-out", "Currently in Court", "Analytics"])
     
     with tab1:
+        mark_section("Check-in / Check-out")
         st.subheader("⏱️ Check-in / Check-out")
         
         # Member selection for check-in
@@ -1345,11 +1739,10 @@ def show_member_checkin(db_manager):
         with col1:
             st.write("**Check-in Member**")
             
-            # Get all members for selection
-            all_members = db_manager.search_members()
+            # Build the selection straight from the member records
+            member_options = {f"{member['name']} ({member['phone']})": member for member in db_manager.iter_members()}
             
-            if all_members:
-                member_options = {f"{member['name']} ({member['phone']})": member for member in all_members}
+            if member_options:
                 selected_member_key = st.selectbox(
                     "Select Member:",
                     options=list(member_options.keys()),
@@ -1404,7 +1797,7 @@ def show_member_checkin(db_manager):
                     
                     # Show check-in details
                     checkin_time = datetime.strptime(selected_checkout['check_in_time'], '%Y-%m-%d %H:%M:%S')
-                    current_duration = int((datetime.now() - checkin_time).total_seconds() / 60)
+                    current_duration = int((db_manager.clock.now() - checkin_time).total_seconds() / 60)
                     
                     st.info(f"**Usage Type:** {selected_checkout['court_usage_type']}")
                     st.info(f"**Current Duration:** {current_duration} minutes")
@@ -1425,6 +1818,7 @@ def show_member_checkin(db_manager):
                 st.info("No members currently checked in.")
     
     with tab2:
+        mark_section("Currently in Court")
         st.subheader("🏸 Currently in Court")
         
         active_checkins = db_manager.get_active_checkins()
@@ -1447,7 +1841,7 @@ def show_member_checkin(db_manager):
                     
                     with col3:
                         checkin_time = datetime.strptime(checkin['check_in_time'], '%Y-%m-%d %H:%M:%S')
-                        current_duration = int((datetime.now() - checkin_time).total_seconds() / 60)
+                        current_duration = int((db_manager.clock.now() - checkin_time).total_seconds() / 60)
                         st.write(f"**{current_duration} minutes**")
                         st.caption(f"Since: {checkin_time.strftime('%I:%M %p')}")
                     
@@ -1466,6 +1860,7 @@ def show_member_checkin(db_manager):
             st.write("The court is empty right now.")
     
     with tab3:
+        mark_section("Check-in Analytics")
         st.subheader("📊 Check-in Analytics")
         
         # Time period selection
@@ -1536,67 +1931,61 @@ def show_member_checkin(db_manager):
         else:
             st.info("No frequent visitor data available")
 
-def send_bulk_announcement(db_manager, message_manager, recipients, message, send_method, message_type):
-    """Generate WhatsApp links for bulk announcements"""
-    import urllib.parse
+def queue_bulk_announcement(db_manager, message_manager, recipients, message, send_method, message_type):
+    """Queue a bulk announcement in the outbox and send it right away over the pooled async path"""
+    outbox = Outbox(db_manager)
+    queued = outbox.enqueue([{
+        'idempotency_key': announcement_key(message, recipient['phone']),
+        'source': "announcement",
+        'channel': send_method,
+        'phone': recipient['phone'],
+        'message': message,
+        'member_id': recipient['id'] if isinstance(recipient['id'], int) else None,
+        'log_type': None
+    } for recipient in recipients])
+    
+    if queued:
+        db_manager.log_bulk_message(
+            message_text=message,
+            recipient_count=queued,
+            message_type=f"{message_type} ({send_method}_Queued)",
+            sent_by="Admin"
+        )
     
-    st.subheader("📱 WhatsApp Bulk Message Links")
-    st.info("Click each link below to open WhatsApp with the announcement pre-filled. You can then send it manually.")
+    skipped = len(recipients) - queued
+    if skipped:
+        st.info(f"{skipped} recipients already have this announcement queued today and were skipped.")
     
-    total_count = len(recipients)
+    if not queued:
+        return
     
-    for i, recipient in enumerate(recipients):
-        # Format phone number for WhatsApp URL (remove spaces, ensure country code)
-        phone = recipient['phone'].replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
-        
-        # Add country code if not present (assuming Indian numbers start with +91)
-        if not phone.startswith('+'):
-            if phone.startswith('91'):
-                phone = '+' + phone
-            elif len(phone) == 10:  # Indian mobile number without country code
-                phone = '+91' + phone
-            else:
-                phone = '+91' + phone  # Default to India
-        
-        # URL encode the message
-        encoded_message = urllib.parse.quote(message)
-        
-        # Create WhatsApp URL
-        whatsapp_url = f"https://wa.me/{phone.replace('+', '')}?text={encoded_message}"
-        
-        # Display the recipient card
-        with st.container():
-            col1, col2 = st.columns([3, 1])
-            
-            with col1:
-                st.markdown(f"**{recipient['name']}** - {recipient['phone']}")
-                membership_type = recipient.get('membership_type', 'Member')
-                st.caption(f"Type: {membership_type}")
-                
-                # Show a preview of the message (truncated)
-                preview = message[:80] + "..." if len(message) > 80 else message
-                st.text(f"Message: {preview}")
-            
-            with col2:
-                st.markdown(f'<a href="{whatsapp_url}" target="_blank"><button style="background-color: #25D366; color: white; border: none; padding: 10px 15px; border-radius: 5px; cursor: pointer; width: 100%; font-weight: bold;">📱 Open WhatsApp</button></a>', unsafe_allow_html=True)
-        
-        st.markdown("---")
+    # Only announcement rows: due reminders stay with the reminder service and its send window
+    with st.spinner(f"Sending {queued} messages..."):
+        totals = Outbox(db_manager).drain(message_manager, batch_size=ANNOUNCEMENT_BATCH_SIZE, use_async=True,
+                                          source="announcement")
+    
+    st.success(f"✅ Sent {totals['sent']} messages!")
+    if totals['retrying'] or totals['failed']:
+        st.warning(f"{totals['retrying']} messages will be retried by the reminder service "
+                   f"(`python reminder_daemon.py`); {totals['failed']} failed permanently.")
+
+def send_bulk_announcement(db_manager, message_manager, recipients, message, send_method, message_type):
+    """Queue bulk announcements, or generate WhatsApp links when no messaging provider is configured"""
+    if message_manager.is_configured(send_method):
+        queue_bulk_announcement(db_manager, message_manager, recipients, message, send_method, message_type)
+        return
+    
+    links = build_announcement_links(recipients, message)
     
     # Log the bulk message
     db_manager.log_bulk_message(
         message_text=message,
-        recipient_count=total_count,
+        recipient_count=len(links),
         message_type=f"{message_type} (WhatsApp_Links)",
         sent_by="Admin"
     )
     
-    st.success(f"✅ Generated WhatsApp links for {total_count} recipients!")
-    st.info("💡 **How to use:** Click each 'Open WhatsApp' button to open WhatsApp with the message ready. Review and send manually.")
-    
-    # Option to mark all as sent
-    if st.button("✅ Mark All as Sent", type="secondary", use_container_width=True):
-        st.success("All bulk messages marked as sent!")
-        st.balloons()
+    st.session_state['announcement_link_sheet'] = make_link_sheet("WhatsApp Bulk Message Links", links, None)
 
 def show_edit_member_modal(db_manager, member):
     """Show member editing modal"""
@@ -1650,6 +2039,7 @@ def show_data_export(db_manager):
     st.markdown("Export your badminton court management data for backup or analysis purposes.")
     
     # Show database summary
+    mark_section("Database Overview")
     summary = db_manager.get_database_summary()
     
     st.subheader("📊 Database Overview")
@@ -1667,6 +2057,7 @@ def show_data_export(db_manager):
     st.markdown("---")
     
     # Export options
+    mark_section("Export Options")
     st.subheader("🔄 Export Options")
     
     # Individual exports
@@ -1882,6 +2273,152 @@ Data Range: {summary['date_range']['start']} to {summary['date_range']['end']}
     
     with col2:
         st.info(f"**Total Records**: {sum(summary.get(table, 0) for table in ['members', 'payment_history', 'kids_training', 'kids_payment_history', 'member_checkins', 'reminder_logs', 'bulk_messages_log'])}")
+    
+    # Archiving of old check-ins and message logs
+    st.markdown("---")
+    st.subheader("🗃️ Archive Old Records")
+    st.markdown(f"Completed check-ins and message logs older than {DEFAULT_HORIZON_DAYS} days are moved into yearly archive files. They still appear in history and exports.")
+    
+    archived = summary.get('archived', {})
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Archived Check-ins", archived.get('member_checkins', 0))
+    with col2:
+        st.metric("Archived Reminder Logs", archived.get('reminder_logs', 0))
+    with col3:
+        st.metric("Archived Bulk Messages", archived.get('bulk_messages_log', 0))
+    
+    if st.button("🗃️ Archive Old Records Now", use_container_width=True):
+        with st.spinner("Archiving old records..."):
+            moved = ArchiveManager(db_manager).archive_old_rows()
+        
+        if any(moved.values()):
+            st.success(f"✅ Archived {sum(moved.values())} records")
+            time.sleep(1)
+            st.rerun()
+        else:
+            st.info("No records old enough to archive")
+
+def show_performance():
+    st.header("⏱️ Performance")
+    
+    if not INSTRUMENTATION_ENABLED:
+        st.warning("Query instrumentation is turned off (KJ_QUERY_INSTRUMENTATION=0).")
+        return
+    
+    st.markdown(f"Timings since {query_stats.started_at.strftime('%Y-%m-%d %H:%M:%S')}. "
+                f"Statements slower than {query_stats.slow_query_ms:.0f} ms are logged with their query plan.")
+    
+    methods = query_stats.top_methods(limit=100)
+    statements = query_stats.top_statements(limit=100)
+    slow_queries = query_stats.slow_queries()
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Method Calls", sum(row['calls'] for row in methods))
+    with col2:
+        st.metric("SQL Statements", sum(row['calls'] for row in statements))
+    with col3:
+        st.metric("Time in Database", f"{sum(row['total_ms'] for row in statements) / 1000:.1f} s")
+    with col4:
+        st.metric("Slow Queries", len(slow_queries))
+    
+    if st.button("🔄 Reset Statistics"):
+        query_stats.reset()
+        st.rerun()
+    
+    if not methods:
+        st.info("No timings recorded yet. Use the app for a while and come back.")
+        return
+    
+    sort_options = {"Total time": "total_ms", "p95": "p95_ms", "Max": "max_ms", "Calls": "calls"}
+    sort_label = st.selectbox("Sort offenders by", list(sort_options.keys()))
+    sort_key = sort_options[sort_label]
+    
+    st.subheader("🐢 Top Methods")
+    methods_df = pd.DataFrame(sorted(methods, key=lambda row: row[sort_key], reverse=True)[:20])
+    st.dataframe(methods_df[['method', 'calls', 'total_ms', 'avg_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'rows', 'pages']],
+                 use_container_width=True, hide_index=True)
+    
+    selected_method = st.selectbox("Latency histogram for", [row['method'] for row in methods])
+    histogram = query_stats.method_histogram(selected_method)
+    if histogram:
+        histogram_df = pd.DataFrame({'Calls': list(histogram.values())}, index=list(histogram.keys()))
+        st.bar_chart(histogram_df)
+    
+    st.subheader("🧾 Top SQL Statements")
+    statements_df = pd.DataFrame(sorted(statements, key=lambda row: row[sort_key], reverse=True)[:20])
+    st.dataframe(statements_df[['sql', 'calls', 'total_ms', 'avg_ms', 'p95_ms', 'max_ms', 'rows', 'methods']],
+                 use_container_width=True, hide_index=True)
+    
+    st.subheader("📜 Slow Query Log")
+    if not slow_queries:
+        st.info("No slow queries logged.")
+    for entry in slow_queries[:50]:
+        with st.expander(f"{entry['at']} · {entry['elapsed_ms']:.0f} ms · {entry['method']} · {entry['page']}"):
+            st.code(entry['sql'], language="sql")
+            st.markdown(f"**Rows:** {entry['rows']}")
+            if entry['plan']:
+                st.markdown("**Query plan:**")
+                st.code("\n".join(entry['plan']))
+
+def show_render_profile(history):
+    entry = history[-1]
+    
+    st.markdown("---")
+    st.subheader("⏱️ Render Profile")
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Rerun Time", f"{entry['total_ms']:.0f} ms")
+    with col2:
+        st.metric("Database Time", f"{entry['db_ms']:.0f} ms")
+    with col3:
+        st.metric("Database Calls", entry['db_calls'])
+    with col4:
+        st.metric("Widgets & Python", f"{entry['other_ms']:.0f} ms")
+    
+    st.markdown(flame_html(entry['tree']), unsafe_allow_html=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**Sections**")
+        sections_df = pd.DataFrame([
+            {'Section': "\u2003" * depth + name, 'Time (ms)': ms, 'DB (ms)': db_ms}
+            for depth, name, ms, db_ms in flatten_sections(entry['tree'])
+        ])
+        st.dataframe(sections_df, use_container_width=True, hide_index=True)
+    with col2:
+        st.markdown("**Database Calls**")
+        if entry['db_breakdown']:
+            calls_df = pd.DataFrame([
+                {'Method': name, 'Calls': calls, 'Time (ms)': ms}
+                for name, (calls, ms) in entry['db_breakdown'].items()
+            ]).sort_values('Time (ms)', ascending=False)
+            st.dataframe(calls_df, use_container_width=True, hide_index=True)
+        elif not INSTRUMENTATION_ENABLED:
+            st.info("Database calls are not grouped while KJ_QUERY_INSTRUMENTATION=0.")
+        else:
+            st.info("No database calls in this rerun.")
+    
+    if entry['cprofile']:
+        with st.expander("🔬 cProfile (top functions by cumulative time)"):
+            st.code(entry['cprofile'])
+    
+    st.markdown(f"**Last {len(history)} Reruns**")
+    history_df = pd.DataFrame([
+        {'Time': item['at'], 'Page': item['page'], 'Total (ms)': item['total_ms'], 'DB (ms)': item['db_ms'],
+         'Widgets & Python (ms)': item['other_ms'], 'DB Calls': item['db_calls'],
+         'cProfile': "✓" if item['cprofile'] else ""}
+        for item in reversed(history)
+    ])
+    st.dataframe(history_df, use_container_width=True, hide_index=True)
+    if len(history) > 1:
+        chart_df = pd.DataFrame({
+            'DB (ms)': [item['db_ms'] for item in history],
+            'Widgets & Python (ms)': [item['other_ms'] for item in history],
+        })
+        st.bar_chart(chart_df)
 
 if __name__ == "__main__":
     main()
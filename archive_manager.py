@@ -0,0 +1,243 @@
+import os
+import re
+import glob
+import sqlite3
+from datetime import timedelta
+from instrumentation import open_connection
+
+# Append-only tables that can be archived: (timestamp column, condition for a closed row)
+ARCHIVE_TABLES = {
+    'member_checkins': ('check_in_time', 'check_out_time IS NOT NULL'),
+    'reminder_logs': ('sent_at', '1=1'),
+    'bulk_messages_log': ('sent_at', '1=1'),
+}
+
+DEFAULT_HORIZON_DAYS = int(os.getenv("ARCHIVE_HORIZON_DAYS", "365"))
+MIN_HORIZON_DAYS = 30
+
+def get_archive_dir(db_path):
+    """Directory holding the per-year archive databases"""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), "archives")
+
+def get_archive_path(db_path, year):
+    """Path of the archive database for one year"""
+    base_name = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(get_archive_dir(db_path), f"{base_name}_{year}.db")
+
+def list_archive_years(db_path):
+    """Years that have an archive database, newest first"""
+    base_name = os.path.splitext(os.path.basename(db_path))[0]
+    pattern = re.compile(rf"^{re.escape(base_name)}_(\d{{4}})\.db$")
+    years = []
+    for path in glob.glob(os.path.join(get_archive_dir(db_path), f"{base_name}_*.db")):
+        match = pattern.match(os.path.basename(path))
+        if match:
+            years.append(int(match.group(1)))
+    return sorted(years, reverse=True)
+
+def attach_archive(conn, db_path, year, create=False):
+    """ATTACH the archive for a year and return its schema name (None if it doesn't exist)"""
+    schema = f"archive_{year}"
+    cursor = conn.cursor()
+    cursor.execute('PRAGMA database_list')
+    if any(row[1] == schema for row in cursor.fetchall()):
+        return schema
+    
+    path = get_archive_path(db_path, year)
+    if not os.path.exists(path):
+        if not create:
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    
+    cursor.execute('ATTACH DATABASE ? AS ' + schema, (path,))
+    return schema
+
+def get_table_columns(conn, schema, table):
+    """Column names of a table in the given schema ([] if the table is missing)"""
+    cursor = conn.cursor()
+    cursor.execute(f'PRAGMA {schema}.table_info({table})')
+    return [row[1] for row in cursor.fetchall()]
+
+def archive_select_sql(conn, schema, table, columns):
+    """SELECT over an archive table that lines up with the hot table's columns.
+    
+    Archives written before a column was added to the hot table return NULL for it.
+    """
+    archive_columns = set(get_table_columns(conn, schema, table))
+    if not archive_columns:
+        return None
+    select_list = ", ".join(col if col in archive_columns else f"NULL AS {col}" for col in columns)
+    return f"SELECT {select_list} FROM {schema}.{table}"
+
+def history_source_sql(conn, db_path, table, since=None):
+    """FROM-clause source for a history table covering the hot rows and the archives.
+    
+    Archives older than the year of `since` are left out. Returns the plain table
+    name when no archive is needed, so callers can use it as `FROM {source}`.
+    """
+    columns = get_table_columns(conn, 'main', table)
+    selects = []
+    for year in list_archive_years(db_path):
+        if since is not None and year < since.year:
+            continue
+        schema = attach_archive(conn, db_path, year)
+        select_sql = archive_select_sql(conn, schema, table, columns) if schema else None
+        if select_sql:
+            selects.append(select_sql)
+    
+    if not selects:
+        return table
+    
+    main_select = f"SELECT {', '.join(columns)} FROM main.{table}"
+    return "(" + " UNION ALL ".join([main_select] + selects) + ")"
+
+class ArchiveManager:
+    def __init__(self, db_manager, horizon_days=DEFAULT_HORIZON_DAYS, clock=None):
+        self.db_manager = db_manager
+        self.db_path = db_manager.db_path
+        self.horizon_days = max(int(horizon_days), MIN_HORIZON_DAYS)
+        # The cutoff follows the database's clock unless given another
+        self.clock = clock or db_manager.clock
+    
+    def archive_old_rows(self, horizon_days=None):
+        """Move closed rows older than the horizon into per-year archive databases.
+        
+        Each year's move (copy into the archive, delete from the hot database and
+        bookkeeping in archive_state) is one transaction. Returns {table: rows moved}.
+        """
+        horizon_days = max(int(horizon_days or self.horizon_days), MIN_HORIZON_DAYS)
+        cutoff = (self.clock.now() - timedelta(days=horizon_days)).strftime('%Y-%m-%d %H:%M:%S')
+        moved = {table: 0 for table in ARCHIVE_TABLES}
+        
+        try:
+            conn = open_connection(self.db_path)
+            cursor = conn.cursor()
+            
+            for table, (time_column, closed_condition) in ARCHIVE_TABLES.items():
+                where = f"{time_column} < ? AND {closed_condition}"
+                
+                cursor.execute(f'''
+                SELECT DISTINCT strftime('%Y', {time_column}) FROM {table} WHERE {where}
+                ''', (cutoff,))
+                years = [int(row[0]) for row in cursor.fetchall() if row[0]]
+                
+                for year in years:
+                    schema = attach_archive(conn, self.db_path, year, create=True)
+                    columns = self._prepare_archive_table(conn, schema, table)
+                    column_list = ", ".join(columns)
+                    year_where = f"{where} AND strftime('%Y', {time_column}) = ?"
+                    
+                    cursor.execute('BEGIN IMMEDIATE')
+                    cursor.execute(f'''
+                    INSERT OR IGNORE INTO {schema}.{table} ({column_list})
+                    SELECT {column_list} FROM main.{table} WHERE {year_where}
+                    ''', (cutoff, str(year)))
+                    cursor.execute(f'DELETE FROM main.{table} WHERE {year_where}', (cutoff, str(year)))
+                    row_count = cursor.rowcount
+                    
+                    cursor.execute('''
+                    INSERT INTO archive_state (table_name, archived_before, archived_rows)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT (table_name) DO UPDATE SET
+                        archived_before = MAX(archived_before, excluded.archived_before),
+                        archived_rows = archived_rows + excluded.archived_rows
+                    ''', (table, cutoff, row_count))
+                    conn.commit()
+                    
+                    moved[table] += row_count
+            
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return moved
+        
+        if any(moved.values()):
+            self.reclaim_space()
+        
+        return moved
+    
+    def _prepare_archive_table(self, conn, schema, table):
+        """Create the archive copy of a table and add any columns it is missing"""
+        cursor = conn.cursor()
+        columns = get_table_columns(conn, 'main', table)
+        archive_columns = get_table_columns(conn, schema, table)
+        
+        if not archive_columns:
+            cursor.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,))
+            create_sql = cursor.fetchone()[0]
+            # Same definition, created inside the archive schema
+            create_sql = re.sub(rf'^\s*CREATE TABLE\s+(IF NOT EXISTS\s+)?{table}',
+                                f'CREATE TABLE IF NOT EXISTS {schema}.{table}', create_sql, count=1)
+            cursor.execute(create_sql)
+        else:
+            cursor.execute(f'PRAGMA main.table_info({table})')
+            column_types = {row[1]: row[2] for row in cursor.fetchall()}
+            for column in columns:
+                if column not in archive_columns:
+                    cursor.execute(f'ALTER TABLE {schema}.{table} ADD COLUMN {column} {column_types[column]}')
+        
+        conn.commit()
+        return columns
+    
+    def enable_incremental_vacuum(self):
+        """Switch the hot database to incremental auto-vacuum (one full VACUUM the first time)"""
+        conn = open_connection(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('PRAGMA auto_vacuum')
+        if cursor.fetchone()[0] != 2:
+            cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            cursor.execute('VACUUM')
+        
+        conn.close()
+    
+    def reclaim_space(self):
+        """Return free pages left behind by archived rows to the file system"""
+        try:
+            self.enable_incremental_vacuum()
+            
+            conn = open_connection(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('PRAGMA freelist_count')
+            free_pages = cursor.fetchone()[0]
+            cursor.execute('PRAGMA incremental_vacuum')
+            cursor.fetchall()
+            conn.close()
+            return free_pages
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return 0
+    
+    def get_archive_summary(self):
+        """Row counts per archive year and table"""
+        summary = {}
+        conn = open_connection(self.db_path)
+        
+        for year in list_archive_years(self.db_path):
+            schema = attach_archive(conn, self.db_path, year)
+            cursor = conn.cursor()
+            counts = {}
+            for table in ARCHIVE_TABLES:
+                if get_table_columns(conn, schema, table):
+                    cursor.execute(f'SELECT COUNT(*) FROM {schema}.{table}')
+                    counts[table] = cursor.fetchone()[0]
+            summary[year] = counts
+            cursor.execute(f'DETACH DATABASE {schema}')
+        
+        conn.close()
+        return summary
+
+if __name__ == "__main__":
+    import argparse
+    from database import DatabaseManager
+    
+    parser = argparse.ArgumentParser(description="Move old check-ins and message logs into yearly archives")
+    parser.add_argument("--db", default="badminton_court.db", help="Path to the hot database")
+    parser.add_argument("--horizon-days", type=int, default=DEFAULT_HORIZON_DAYS,
+                        help="Archive closed rows older than this many days")
+    args = parser.parse_args()
+    
+    archive_manager = ArchiveManager(DatabaseManager(args.db), args.horizon_days)
+    moved = archive_manager.archive_old_rows()
+    for table, count in moved.items():
+        print(f"{table}: {count} rows archived")
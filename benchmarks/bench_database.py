@@ -0,0 +1,251 @@
+"""Benchmark suite for every public DatabaseManager and ReminderScheduler method.
+
+Usage:
+    python -m benchmarks.bench_database --scale 10k --output results_10k.json
+    python -m benchmarks.bench_database --scale 10k --baseline benchmarks/baselines/10k.json
+
+Each run works on a scratch copy of the synthetic database (generated on
+first use), so write methods never change the source data. Results are
+saved as JSON; with --baseline the run is compared against a saved result
+and exits with status 1 when any method got slower than the threshold.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import inspect
+import platform
+import argparse
+import tempfile
+import statistics
+import contextlib
+from datetime import datetime, timedelta
+
+from database import DatabaseManager
+from messaging import MessageManager
+from reminder_scheduler import ReminderScheduler
+from benchmarks.synthetic_data import SCALES, generate, default_db_path
+
+DEFAULT_THRESHOLD_PCT = 25.0
+# Changes below this many milliseconds are treated as noise
+NOISE_FLOOR_MS = 0.5
+
+class BenchmarkContext:
+    """Shared state handed to the per-method argument builders"""
+    
+    def __init__(self, db_manager, scheduler, message_manager):
+        self.db = db_manager
+        self.scheduler = scheduler
+        self.messages = message_manager
+        self.calls = 0
+        self.today = datetime.now().date()
+        self.checked_in = []
+    
+    def next_id(self):
+        self.calls += 1
+        return self.calls
+    
+    def check_in_id(self):
+        self.checked_in.append(self.next_id())
+        return self.checked_in[-1]
+    
+    def check_out_id(self):
+        return self.checked_in.pop(0) if self.checked_in else self.next_id()
+
+# Argument builders for methods that need arguments; methods whose parameters
+# all have defaults are benchmarked with their defaults. Write methods use a
+# fresh id on each call so repeated runs do comparable work.
+DATABASE_CASES = {
+    'add_member': lambda ctx: ((f"Bench Member {ctx.next_id()}", f"+9170{ctx.calls:08d}", None, "Monthly Subscriber",
+                                1500.0, ctx.today, 30, ""), {}),
+    'record_payment': lambda ctx: ((ctx.next_id(), 1500.0, ctx.today, "UPI", "bench"), {}),
+    'add_kid': lambda ctx: ((f"Bench Kid {ctx.next_id()}", "Bench Parent", "+919999999999", 9,
+                             "Morning (6:00-7:00 AM)", 1000.0, ctx.today, "", ""), {}),
+    'record_kid_payment': lambda ctx: ((ctx.next_id(), 1000.0, ctx.today, "Cash", "bench"), {}),
+    'get_last_kid_payment': lambda ctx: ((ctx.next_id(),), {}),
+    'get_message_template': lambda ctx: (("payment_reminder",), {}),
+    'update_message_template': lambda ctx: (("payment_reminder", ctx.db.get_message_template("payment_reminder")), {}),
+    'log_reminder': lambda ctx: ((ctx.next_id(), "payment_reminder", "bench reminder"), {}),
+    'calculate_next_due_date': lambda ctx: ((ctx.today, "Quarterly"), {}),
+    'update_member': lambda ctx: ((ctx.next_id(), f"Renamed {ctx.calls}", f"+9171{ctx.calls:08d}", None,
+                                   "Quarterly", 4000.0, 30, ""), {}),
+    'delete_member': lambda ctx: ((ctx.next_id(),), {}),
+    'search_members': lambda ctx: (("Kumar",), {}),
+    'iter_members': lambda ctx: (("Kumar",), {}),
+    'log_bulk_message': lambda ctx: (("bench announcement", 100, "All Members"), {}),
+    'record_member_checkin': lambda ctx: ((ctx.check_in_id(), "Bench", "+910000000000"), {}),
+    'record_member_checkout': lambda ctx: ((ctx.check_out_id(),), {}),
+    'get_checkin_history': lambda ctx: ((), {'limit': 50, 'member_id': ctx.next_id()}),
+    'verify_table_counters': lambda ctx: ((), {'repair': False}),
+}
+
+SCHEDULER_CASES = {
+    'schedule_automatic_reminders': lambda ctx: ((ctx.db, ctx.messages), {}),
+    'forecast_reminders': lambda ctx: ((ctx.db,), {'end_date': ctx.today + timedelta(days=364)}),
+}
+
+def _public_methods(cls):
+    return sorted(name for name, member in inspect.getmembers(cls, inspect.isfunction)
+                  if not name.startswith('_'))
+
+def _defaults_only(function):
+    parameters = list(inspect.signature(function).parameters.values())[1:]
+    return all(parameter.default is not inspect.Parameter.empty for parameter in parameters)
+
+def _time_call(function, args, kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    # Iterator methods do their work while being consumed
+    if inspect.isgenerator(result):
+        for _ in result:
+            pass
+    return (time.perf_counter() - start) * 1000
+
+def _plan(ctx):
+    """List of (name, bound method, argument builder) for everything benchmarked"""
+    plan = []
+    skipped = []
+    
+    for name in _public_methods(DatabaseManager):
+        method = getattr(ctx.db, name)
+        if name in DATABASE_CASES:
+            plan.append((f"DatabaseManager.{name}", method, DATABASE_CASES[name]))
+        elif _defaults_only(method.__func__):
+            plan.append((f"DatabaseManager.{name}", method, lambda ctx: ((), {})))
+        else:
+            skipped.append(f"DatabaseManager.{name}")
+    
+    for name in _public_methods(ReminderScheduler):
+        method = getattr(ctx.scheduler, name)
+        if name in SCHEDULER_CASES:
+            plan.append((f"ReminderScheduler.{name}", method, SCHEDULER_CASES[name]))
+        else:
+            parameters = list(inspect.signature(method).parameters.values())
+            required = [p for p in parameters if p.default is inspect.Parameter.empty]
+            if [p.name for p in required] == ['db_manager']:
+                plan.append((f"ReminderScheduler.{name}", method, lambda ctx: ((ctx.db,), {})))
+            else:
+                skipped.append(f"ReminderScheduler.{name}")
+    
+    return plan, skipped
+
+def run_benchmarks(scale='1k', source_db=None, repeat=5, only=None):
+    """Time every planned method on a scratch copy of the synthetic database"""
+    source_db = source_db or default_db_path(scale)
+    if not os.path.exists(source_db):
+        print(f"Generating {scale} synthetic database at {source_db} ...")
+        generate(source_db, scale)
+    
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        scratch_db = os.path.join(scratch_dir, os.path.basename(source_db))
+        shutil.copy(source_db, scratch_db)
+        
+        # Never send real messages from a benchmark, whatever credentials are set
+        message_manager = MessageManager()
+        message_manager.client = None
+        
+        ctx = BenchmarkContext(DatabaseManager(scratch_db), ReminderScheduler(), message_manager)
+        plan, skipped = _plan(ctx)
+        
+        # Run from the scratch directory so anything opening the default
+        # database path touches a throwaway file, not the real one
+        original_cwd = os.getcwd()
+        os.chdir(scratch_dir)
+        try:
+            for name, method, build_args in plan:
+                if only and not any(pattern in name for pattern in only):
+                    continue
+                
+                timings = []
+                with contextlib.redirect_stdout(io.StringIO()):
+                    # One warm-up call, then the timed runs
+                    args, kwargs = build_args(ctx)
+                    _time_call(method, args, kwargs)
+                    for _ in range(repeat):
+                        args, kwargs = build_args(ctx)
+                        timings.append(_time_call(method, args, kwargs))
+                
+                timings.sort()
+                results[name] = {
+                    'median_ms': round(statistics.median(timings), 3),
+                    'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+                    'min_ms': round(timings[0], 3),
+                    'max_ms': round(timings[-1], 3),
+                    'runs': len(timings),
+                }
+                print(f"{name:<55} median {results[name]['median_ms']:>10.2f} ms")
+        finally:
+            os.chdir(original_cwd)
+    
+    return {
+        'scale': scale,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'results': results,
+        'skipped': skipped,
+    }
+
+def compare_results(current, baseline, threshold_pct=DEFAULT_THRESHOLD_PCT):
+    """Compare median timings; returns (regressions, improvements) as lists of dicts"""
+    regressions = []
+    improvements = []
+    
+    for name, result in current['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        
+        before, after = previous['median_ms'], result['median_ms']
+        if abs(after - before) < NOISE_FLOOR_MS:
+            continue
+        
+        change_pct = (after - before) / before * 100 if before else float('inf')
+        entry = {'method': name, 'baseline_ms': before, 'current_ms': after, 'change_pct': round(change_pct, 1)}
+        if change_pct > threshold_pct:
+            regressions.append(entry)
+        elif change_pct < -threshold_pct:
+            improvements.append(entry)
+    
+    return regressions, improvements
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark DatabaseManager and ReminderScheduler")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="1k")
+    parser.add_argument("--db", help="Source database (default: benchmarks/data/bench_<scale>.db)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per method")
+    parser.add_argument("--only", nargs="*", help="Only run methods whose name contains one of these")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Compare against this saved results JSON")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD_PCT,
+                        help="Allowed slowdown in percent before a method counts as a regression")
+    args = parser.parse_args()
+    
+    current = run_benchmarks(args.scale, args.db, args.repeat, args.only)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f"Results written to {args.output}")
+    
+    if current['skipped']:
+        print(f"Not benchmarked (needs arguments): {', '.join(current['skipped'])}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions, improvements = compare_results(current, baseline, args.threshold)
+        
+        for entry in improvements:
+            print(f"FASTER  {entry['method']}: {entry['baseline_ms']} -> {entry['current_ms']} ms ({entry['change_pct']}%)")
+        for entry in regressions:
+            print(f"SLOWER  {entry['method']}: {entry['baseline_ms']} -> {entry['current_ms']} ms (+{entry['change_pct']}%)")
+        
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions over {args.threshold}% against {args.baseline}")
@@ -0,0 +1,118 @@
+"""Email sending benchmark against the local SMTP stand-in.
+
+Usage:
+    python -m benchmarks.bench_email --messages 200 --latency-ms 20 --connect-latency-ms 150
+    python -m benchmarks.bench_email --modes pooled dispatcher --pool-size 8 --output email.json
+
+Sends the same batch of reminder emails through EmailProvider:
+    connect     a new SMTP connection (connect, EHLO, QUIT) per message
+    pooled      send_message in a loop over one pooled connection
+    dispatcher  ReminderDispatcher.send_all over the pool (pool_size connections)
+and reports throughput, connections opened and SMTP round trips per message.
+"""
+
+import io
+import json
+import time
+import argparse
+import platform
+import contextlib
+from datetime import datetime
+
+from messaging import MessageManager
+from dispatch import ReminderDispatcher
+from providers import ProviderRouter
+from email_channel import EmailProvider, SmtpPool, compose_email
+from smtp_standin import SmtpStandin, SmtpStandinConfig
+
+MODES = ['connect', 'pooled', 'dispatcher']
+FROM_ADDRESS = "court@example.com"
+
+def _message_manager(host, port, pool_size):
+    provider = EmailProvider(SmtpPool(host, port, security="none", size=pool_size), FROM_ADDRESS)
+    return MessageManager(router=ProviderRouter({'smtp': provider}, {'Email': [('smtp', 'Email')]}))
+
+def build_messages(count):
+    return [{
+        'phone': f"member{index}@example.com",
+        'message': compose_email("Payment reminder", f"Benchmark message {index}",
+                                 f"<p>Benchmark message <strong>{index}</strong></p>"),
+        'method': "Email"
+    } for index in range(count)]
+
+def run_mode(mode, host, port, messages, pool_size):
+    """Send the batch through one path; returns the number of successful sends"""
+    if mode == 'connect':
+        sent = 0
+        for item in messages:
+            pool = SmtpPool(host, port, security="none", size=1)
+            result, _ = EmailProvider(pool, FROM_ADDRESS).send(item['phone'], item['message'])
+            pool.close()
+            sent += bool(result)
+        return sent
+    if mode == 'pooled':
+        message_manager = _message_manager(host, port, 1)
+        return sum(1 for item in messages
+                   if message_manager.send_message(item['phone'], item['message'], item['method']))
+    if mode == 'dispatcher':
+        dispatcher = ReminderDispatcher(_message_manager(host, port, pool_size), None, max_workers=pool_size)
+        return sum(1 for _, success in dispatcher.send_all(messages) if success)
+    raise ValueError(f"Unknown mode: {mode}")
+
+def run_benchmark(standin, modes, count, pool_size):
+    host, port = standin.address
+    messages = build_messages(count)
+    results = {}
+    
+    for mode in modes:
+        standin.reset_stats()
+        # send_message prints one line per message
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            sent = run_mode(mode, host, port, messages, pool_size)
+            elapsed = time.perf_counter() - start
+        stats = standin.snapshot()
+        results[mode] = {
+            'messages': count,
+            'sent': sent,
+            'failed': count - sent,
+            'elapsed_seconds': round(elapsed, 3),
+            'messages_per_second': round(count / elapsed, 1) if elapsed else None,
+            'connections': stats['connections'],
+            'round_trips_per_message': round(stats['round_trips'] / count, 2) if count else None,
+        }
+        row = results[mode]
+        print(f"{mode:<12} {row['sent']:>6}/{count} sent in {row['elapsed_seconds']:>8.2f} s "
+              f"({row['messages_per_second']:>7} msg/s), {row['connections']} connections, "
+              f"{row['round_trips_per_message']} round trips/message")
+    
+    return {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pool_size': pool_size,
+        'latency_ms': standin.config.latency_ms,
+        'connect_latency_ms': standin.config.connect_latency_ms,
+        'results': results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark email sending against the SMTP stand-in")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--modes", nargs="*", choices=MODES, default=MODES)
+    parser.add_argument("--pool-size", type=int, default=4, help="Pooled connections for the dispatcher")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--connect-latency-ms", type=float, default=150)
+    parser.add_argument("--output", help="Write results JSON here")
+    args = parser.parse_args()
+    
+    config = SmtpStandinConfig(latency_ms=args.latency_ms, connect_latency_ms=args.connect_latency_ms)
+    with SmtpStandin(config) as standin:
+        report = run_benchmark(standin, args.modes, args.messages, args.pool_size)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
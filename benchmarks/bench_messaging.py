@@ -0,0 +1,145 @@
+"""Bulk-send throughput benchmark against the local Twilio stand-in.
+
+Usage:
+    python -m benchmarks.bench_messaging --messages 500 --latency-ms 100
+    python -m benchmarks.bench_messaging --rate-limit 30 --failure-rate 0.05 --modes dispatcher async
+    python -m benchmarks.bench_messaging --base-url http://127.0.0.1:8099 --output messaging.json
+
+Sends the same batch through each sending path of MessageManager:
+    serial      send_message in a loop (what send_bulk_messages does)
+    dispatcher  ReminderDispatcher.send_all (thread pool + token bucket)
+    async       send_messages_concurrently (one pooled aiohttp session)
+and reports throughput, failures and how many requests the stand-in
+throttled or failed. Unless --base-url is given, a stand-in is started in
+this process with the configured latency, failure rate and rate limit.
+Nothing is sent to Twilio.
+"""
+
+import io
+import os
+import json
+import time
+import argparse
+import platform
+import contextlib
+import urllib.request
+from datetime import datetime
+
+from messaging import MessageManager
+from dispatch import ReminderDispatcher
+from twilio_standin import StandinConfig, TwilioStandin
+
+MODES = ['serial', 'dispatcher', 'async']
+ACCOUNT_SID = "AC" + "0" * 32
+
+def _message_manager(base_url):
+    os.environ.update(
+        TWILIO_ACCOUNT_SID=ACCOUNT_SID,
+        TWILIO_AUTH_TOKEN="bench",
+        TWILIO_PHONE_NUMBER="+15005550006"
+    )
+    message_manager = MessageManager()
+    message_manager.api_base_url = base_url
+    return message_manager
+
+def _standin_stats(base_url):
+    with urllib.request.urlopen(f"{base_url}/_standin/stats", timeout=10) as response:
+        return json.load(response)
+
+def _reset_standin(base_url):
+    request = urllib.request.Request(f"{base_url}/_standin/reset", data=b"", method='POST')
+    urllib.request.urlopen(request, timeout=10).close()
+
+def build_messages(count, method):
+    return [{
+        'phone': f"+9198{index:08d}",
+        'message': f"Benchmark message {index}",
+        'method': method
+    } for index in range(count)]
+
+def run_mode(mode, message_manager, messages, workers, concurrency):
+    """Send the batch through one path; returns the number of successful sends"""
+    if mode == 'serial':
+        return sum(1 for item in messages
+                   if message_manager.send_message(item['phone'], item['message'], item['method']))
+    if mode == 'dispatcher':
+        dispatcher = ReminderDispatcher(message_manager, None, max_workers=workers)
+        return sum(1 for _, success in dispatcher.send_all(messages) if success)
+    if mode == 'async':
+        return sum(1 for result in message_manager.send_messages_concurrently(messages, concurrency=concurrency)
+                   if result)
+    raise ValueError(f"Unknown mode: {mode}")
+
+def run_benchmark(base_url, modes, count, method, workers, concurrency):
+    message_manager = _message_manager(base_url)
+    messages = build_messages(count, method)
+    results = {}
+    
+    for mode in modes:
+        _reset_standin(base_url)
+        # send_message prints one line per message
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            sent = run_mode(mode, message_manager, messages, workers, concurrency)
+            elapsed = time.perf_counter() - start
+        stats = _standin_stats(base_url)
+        results[mode] = {
+            'messages': count,
+            'sent': sent,
+            'failed': count - sent,
+            'elapsed_seconds': round(elapsed, 3),
+            'messages_per_second': round(count / elapsed, 1) if elapsed else None,
+            'requests': stats['requests'],
+            'throttled': stats['throttled'],
+            'server_errors': stats['failed'],
+        }
+        row = results[mode]
+        print(f"{mode:<12} {row['sent']:>6}/{count} sent in {row['elapsed_seconds']:>8.2f} s "
+              f"({row['messages_per_second']:>7} msg/s), {row['throttled']} throttled, "
+              f"{row['server_errors']} server errors")
+    
+    return {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'method': method,
+        'workers': workers,
+        'concurrency': concurrency,
+        'results': results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bulk sending against the Twilio stand-in")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--method", choices=["SMS", "WhatsApp"], default="SMS")
+    parser.add_argument("--modes", nargs="*", choices=MODES, default=MODES)
+    parser.add_argument("--workers", type=int, default=16, help="Dispatcher threads")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent requests on the async path")
+    parser.add_argument("--base-url", help="Use a running stand-in instead of starting one")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=0, help="Stand-in sends per second (0 = unlimited)")
+    parser.add_argument("--output", help="Write results JSON here")
+    args = parser.parse_args()
+    
+    standin = None
+    base_url = args.base_url
+    if not base_url:
+        config = StandinConfig(latency_ms=args.latency_ms, failure_rate=args.failure_rate,
+                               rate_limit=args.rate_limit, seed=1)
+        standin = TwilioStandin(config).start()
+        base_url = standin.base_url
+    
+    try:
+        report = run_benchmark(base_url.rstrip('/'), args.modes, args.messages, args.method,
+                               args.workers, args.concurrency)
+    finally:
+        if standin:
+            standin.stop()
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""Concurrency load test simulating several front-desk and court-entrance sessions.
+
+Usage:
+    python -m benchmarks.load_test --scale 10k --workers 8 --duration 30
+    python -m benchmarks.load_test --scale 10k --workers 8 --mode process --output load_10k.json
+
+Each worker (thread or process) repeatedly picks a session script and runs
+its steps against DatabaseManager on a scratch copy of the synthetic
+database. The report gives throughput, latency percentiles per step and how
+often a step failed with "database is locked".
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from database import DatabaseManager
+from benchmarks.synthetic_data import SCALES, LAST_NAMES, PAYMENT_METHODS, USAGE_TYPES, generate, default_db_path
+
+# Session scripts: the steps one tablet runs for one visitor or task
+SESSION_SCRIPTS = {
+    'front_desk_payment': ['search', 'record_payment', 'search'],
+    'court_entrance': ['search', 'check_in', 'check_out'],
+    'walk_in': ['search', 'check_in', 'search', 'record_payment', 'check_out'],
+    'manager_dashboard': ['analytics_refresh'],
+}
+
+# How often each script is picked
+SESSION_MIX = {
+    'front_desk_payment': 0.30,
+    'court_entrance': 0.45,
+    'walk_in': 0.15,
+    'manager_dashboard': 0.10,
+}
+
+LOCK_MARKERS = ("database is locked", "database table is locked")
+
+class _ErrorTap:
+    """Stand-in for sys.stdout that remembers the last "Database error" printed per thread.
+    
+    DatabaseManager write methods print the sqlite3 error and return False, so
+    this is how the harness learns why a write failed.
+    """
+    
+    def __init__(self):
+        self.local = threading.local()
+    
+    def write(self, text):
+        if "Database error" in text:
+            self.local.error = text.strip()
+        return len(text)
+    
+    def flush(self):
+        pass
+    
+    def pop_error(self):
+        error = getattr(self.local, 'error', None)
+        self.local.error = None
+        return error
+
+class SessionRunner:
+    """Runs session scripts for one worker and collects one sample per step"""
+    
+    def __init__(self, db_path, member_count, seed, think_ms=0):
+        self.db = DatabaseManager(db_path)
+        self.member_count = member_count
+        self.rng = random.Random(seed)
+        self.think_ms = think_ms
+        self.samples = []
+        self.checked_in = []
+    
+    def _pick_script(self):
+        roll = self.rng.random()
+        for name, share in SESSION_MIX.items():
+            roll -= share
+            if roll <= 0:
+                return name
+        return name
+    
+    def _member_id(self):
+        return self.rng.randint(1, self.member_count)
+    
+    def search(self):
+        return self.db.search_members(self.rng.choice(LAST_NAMES))
+    
+    def check_in(self):
+        member_id = self._member_id()
+        result = self.db.record_member_checkin(member_id, f"Member {member_id}", "+910000000000",
+                                               self.rng.choice(USAGE_TYPES))
+        if result[0]:
+            self.checked_in.append(member_id)
+        return result
+    
+    def check_out(self):
+        if not self.checked_in:
+            return False, "No active check-in found"
+        return self.db.record_member_checkout(self.checked_in.pop(0))
+    
+    def record_payment(self):
+        return self.db.record_payment(self._member_id(), 1500.0, date.today(),
+                                      self.rng.choice(PAYMENT_METHODS), "load test")
+    
+    def analytics_refresh(self):
+        # What the dashboard and analytics pages load on a rerun
+        self.db.get_database_summary()
+        self.db.get_revenue_analytics()
+        self.db.get_membership_analytics()
+        return self.db.get_checkin_analytics(30)
+    
+    def _run_step(self, step, tap):
+        start = time.perf_counter()
+        error = None
+        try:
+            result = getattr(self, step)()
+        except Exception as e:
+            result = None
+            error = str(e)
+        latency_ms = (time.perf_counter() - start) * 1000
+        
+        printed_error = tap.pop_error()
+        if error is None:
+            if result is False:
+                error = printed_error or "failed"
+            elif isinstance(result, tuple) and not result[0]:
+                # (False, message): only database errors count, not "already checked in"
+                if result[1].startswith("Database error"):
+                    error = result[1]
+        
+        if error is None:
+            outcome = 'ok'
+        elif any(marker in error for marker in LOCK_MARKERS):
+            outcome = 'locked'
+        else:
+            outcome = 'error'
+        self.samples.append((step, latency_ms, outcome))
+    
+    def run(self, duration, tap):
+        deadline = time.perf_counter() + duration
+        sessions = 0
+        while time.perf_counter() < deadline:
+            for step in SESSION_SCRIPTS[self._pick_script()]:
+                self._run_step(step, tap)
+                if self.think_ms:
+                    time.sleep(self.rng.uniform(0, self.think_ms) / 1000)
+            sessions += 1
+        
+        # Leave nobody checked in so the next worker run starts clean
+        for member_id in self.checked_in:
+            self.db.record_member_checkout(member_id)
+        return sessions
+
+_tap = None
+
+def _install_tap():
+    global _tap
+    if _tap is None:
+        _tap = _ErrorTap()
+    sys.stdout = _tap
+    return _tap
+
+def _run_worker(worker_id, db_path, member_count, duration, seed, think_ms):
+    """Worker entry point shared by the thread and process modes"""
+    tap = _install_tap()
+    runner = SessionRunner(db_path, member_count, seed + worker_id, think_ms)
+    sessions = runner.run(duration, tap)
+    return sessions, runner.samples
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summarize(samples, elapsed, sessions):
+    """Aggregate (step, latency_ms, outcome) samples into the report dict"""
+    steps = {}
+    for step, latency_ms, outcome in samples:
+        entry = steps.setdefault(step, {'latencies': [], 'ok': 0, 'locked': 0, 'error': 0})
+        entry['latencies'].append(latency_ms)
+        entry[outcome] += 1
+    
+    report = {}
+    for step, entry in sorted(steps.items()):
+        latencies = sorted(entry.pop('latencies'))
+        total = len(latencies)
+        report[step] = {
+            'count': total,
+            'ok': entry['ok'],
+            'locked': entry['locked'],
+            'error': entry['error'],
+            'locked_rate': round(entry['locked'] / total, 4),
+            'p50_ms': round(_percentile(latencies, 50), 2),
+            'p95_ms': round(_percentile(latencies, 95), 2),
+            'p99_ms': round(_percentile(latencies, 99), 2),
+            'max_ms': round(latencies[-1], 2),
+        }
+    
+    total_ops = len(samples)
+    locked = sum(1 for sample in samples if sample[2] == 'locked')
+    errors = sum(1 for sample in samples if sample[2] == 'error')
+    return {
+        'elapsed_s': round(elapsed, 2),
+        'sessions': sessions,
+        'operations': total_ops,
+        'throughput_ops_s': round(total_ops / elapsed, 1) if elapsed else 0.0,
+        'sessions_per_s': round(sessions / elapsed, 2) if elapsed else 0.0,
+        'locked': locked,
+        'locked_rate': round(locked / total_ops, 4) if total_ops else 0.0,
+        'errors': errors,
+        'steps': report,
+    }
+
+def run_load_test(scale='1k', source_db=None, workers=4, duration=10.0, mode='thread', seed=42, think_ms=0):
+    """Run the load test on a scratch copy of the synthetic database and return the report"""
+    source_db = source_db or default_db_path(scale)
+    if not os.path.exists(source_db):
+        print(f"Generating {scale} synthetic database at {source_db} ...")
+        generate(source_db, scale)
+    
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        scratch_db = os.path.join(scratch_dir, os.path.basename(source_db))
+        shutil.copy(source_db, scratch_db)
+        member_count = DatabaseManager(scratch_db).get_total_members()
+        
+        executor_class = ProcessPoolExecutor if mode == 'process' else ThreadPoolExecutor
+        original_stdout = sys.stdout
+        start = time.perf_counter()
+        try:
+            with executor_class(max_workers=workers) as executor:
+                futures = [executor.submit(_run_worker, worker_id, scratch_db, member_count,
+                                           duration, seed, think_ms)
+                           for worker_id in range(workers)]
+                results = [future.result() for future in futures]
+        finally:
+            sys.stdout = original_stdout
+        elapsed = time.perf_counter() - start
+    
+    samples = [sample for _, worker_samples in results for sample in worker_samples]
+    sessions = sum(worker_sessions for worker_sessions, _ in results)
+    report = summarize(samples, elapsed, sessions)
+    report.update({'scale': scale, 'workers': workers, 'mode': mode, 'think_ms': think_ms})
+    return report
+
+def print_report(report):
+    print(f"{report['workers']} {report['mode']} workers, {report['elapsed_s']} s, scale {report['scale']}")
+    print(f"Sessions: {report['sessions']} ({report['sessions_per_s']}/s)  "
+          f"Operations: {report['operations']} ({report['throughput_ops_s']}/s)")
+    print(f"database is locked: {report['locked']} ({report['locked_rate']:.2%})  Other errors: {report['errors']}")
+    print()
+    print(f"{'step':<20}{'count':>8}{'locked':>8}{'error':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for step, entry in report['steps'].items():
+        print(f"{step:<20}{entry['count']:>8}{entry['locked']:>8}{entry['error']:>8}"
+              f"{entry['p50_ms']:>10.2f}{entry['p95_ms']:>10.2f}{entry['p99_ms']:>10.2f}{entry['max_ms']:>10.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate concurrent front-desk sessions against DatabaseManager")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="1k")
+    parser.add_argument("--db", help="Source database (default: benchmarks/data/bench_<scale>.db)")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent sessions")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds each worker runs")
+    parser.add_argument("--mode", choices=["thread", "process"], default="thread")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--think-ms", type=float, default=0, help="Max random pause between steps")
+    parser.add_argument("--output", help="Write the report JSON here")
+    args = parser.parse_args()
+    
+    report = run_load_test(args.scale, args.db, args.workers, args.duration, args.mode, args.seed, args.think_ms)
+    print_report(report)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
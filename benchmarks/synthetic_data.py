@@ -0,0 +1,195 @@
+"""Deterministic synthetic data for benchmarking DatabaseManager and ReminderScheduler.
+
+Usage:
+    python -m benchmarks.synthetic_data --scale 10k --db benchmarks/data/bench_10k.db
+
+The same scale, seed and anchor date always produce the same rows. The
+default target is a scratch file under benchmarks/data/ so the real
+badminton_court.db is never overwritten by accident; pass --db explicitly to
+fill another file.
+"""
+
+import os
+import random
+import sqlite3
+import argparse
+from datetime import date, datetime, timedelta
+
+from database import DatabaseManager
+
+# Rows generated per scale; check-ins and payments are per member on average
+SCALES = {
+    '1k': {'members': 1000, 'checkins_per_member': 20, 'reminders_per_member': 4, 'bulk_messages': 50},
+    '10k': {'members': 10000, 'checkins_per_member': 25, 'reminders_per_member': 4, 'bulk_messages': 200},
+    '100k': {'members': 100000, 'checkins_per_member': 30, 'reminders_per_member': 4, 'bulk_messages': 500},
+}
+
+# Membership mix: (type, share of members, fee, days covered)
+MEMBERSHIP_MIX = [
+    ("Monthly Subscriber", 0.60, 1500.0, 30),
+    ("Quarterly", 0.20, 4000.0, 90),
+    ("Half Yearly", 0.12, 7500.0, 180),
+    ("Annual", 0.08, 14000.0, 365),
+]
+
+BATCH_TIMES = ["Morning (6:00-7:00 AM)", "Evening (5:00-6:00 PM)", "Evening (6:00-7:00 PM)"]
+USAGE_TYPES = ["General Play", "Training Session", "Tournament", "Private Coaching", "Practice Match"]
+PAYMENT_METHODS = ["Cash", "UPI", "Card", "Bank Transfer"]
+FIRST_NAMES = ["Aarav", "Vivaan", "Aditya", "Vihaan", "Arjun", "Sai", "Reyansh", "Krishna", "Ishaan", "Rohan",
+               "Ananya", "Diya", "Saanvi", "Aadhya", "Kavya", "Priya", "Meera", "Lakshmi", "Divya", "Nisha"]
+LAST_NAMES = ["Kumar", "Sharma", "Iyer", "Reddy", "Nair", "Patel", "Rao", "Menon", "Singh", "Pillai",
+              "Gupta", "Das", "Joshi", "Krishnan", "Subramanian"]
+# Check-ins cluster around morning and evening play
+CHECKIN_HOURS = [5, 6, 6, 7, 7, 8, 9, 16, 17, 17, 18, 18, 18, 19, 19, 20, 21]
+
+KIDS_PER_MEMBER = 0.15
+HISTORY_DAYS = 365
+
+def _timestamp(day, hour, minute):
+    return f"{day.isoformat()} {hour:02d}:{minute:02d}:00"
+
+def _pick_membership(rng):
+    roll = rng.random()
+    for membership in MEMBERSHIP_MIX:
+        roll -= membership[1]
+        if roll <= 0:
+            return membership
+    return MEMBERSHIP_MIX[-1]
+
+def generate(db_path, scale='1k', seed=42, anchor_date=None, overwrite=False):
+    """Fill db_path with synthetic data for the given scale and return the row counts"""
+    if scale not in SCALES:
+        raise ValueError(f"Unknown scale {scale!r}, expected one of {', '.join(SCALES)}")
+    
+    if os.path.exists(db_path):
+        if not overwrite:
+            raise FileExistsError(f"{db_path} already exists (pass overwrite=True to replace it)")
+        os.remove(db_path)
+    
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    DatabaseManager(db_path)
+    
+    config = SCALES[scale]
+    rng = random.Random(seed)
+    today = anchor_date or date.today()
+    member_count = config['members']
+    
+    members = []
+    payments = []
+    for member_id in range(1, member_count + 1):
+        membership_type, _, fee, duration = _pick_membership(rng)
+        # Last payment somewhere in the last 1.3 periods, so ~25% are overdue
+        last_payment = today - timedelta(days=rng.randint(0, int(duration * 1.3)))
+        joined = last_payment - timedelta(days=duration * rng.randint(0, max(1, HISTORY_DAYS // duration)))
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {member_id}"
+        email = f"member{member_id}@example.com" if rng.random() < 0.6 else None
+        
+        members.append((member_id, name, f"+91{9000000000 + member_id}", email, membership_type, fee,
+                        last_payment.isoformat(), rng.choice([15, 30]), "",
+                        _timestamp(joined, 10, 0), _timestamp(last_payment, 10, 0)))
+        
+        payment_day = joined
+        while payment_day <= last_payment:
+            payments.append((member_id, fee, payment_day.isoformat(), rng.choice(PAYMENT_METHODS), "",
+                             _timestamp(payment_day, rng.randint(6, 21), rng.randint(0, 59))))
+            payment_day += timedelta(days=duration)
+    
+    kids = []
+    kid_payments = []
+    for kid_id in range(1, int(member_count * KIDS_PER_MEMBER) + 1):
+        start = today - timedelta(days=rng.randint(0, HISTORY_DAYS))
+        parent_index = rng.randint(1, member_count)
+        kids.append((kid_id, f"{rng.choice(FIRST_NAMES)} Jr {kid_id}", f"Parent {parent_index}",
+                     f"+91{8000000000 + parent_index}", rng.randint(4, 16), rng.choice(BATCH_TIMES),
+                     rng.choice([1000.0, 1200.0, 1500.0]), start.isoformat(), "", "", rng.random() > 0.05))
+        
+        # Some families are a month or so behind on fees
+        paid_until = today - timedelta(days=rng.randint(0, 40))
+        payment_day = start
+        while payment_day <= paid_until:
+            kid_payments.append((kid_id, kids[-1][6], payment_day.isoformat(), rng.choice(PAYMENT_METHODS), ""))
+            payment_day += timedelta(days=30)
+    
+    connection = sqlite3.connect(db_path)
+    cursor = connection.cursor()
+    cursor.execute('PRAGMA synchronous = OFF')
+    cursor.execute('PRAGMA journal_mode = MEMORY')
+    
+    cursor.executemany('''
+    INSERT INTO members (id, name, phone, email, membership_type, amount, payment_date, reminder_days,
+                         notes, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', members)
+    cursor.executemany('''
+    INSERT INTO payment_history (member_id, amount, payment_date, payment_method, notes, created_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ''', payments)
+    cursor.executemany('''
+    INSERT INTO kids_training (id, kid_name, parent_name, parent_phone, age, batch_time, monthly_fee,
+                               start_date, emergency_contact, medical_notes, active)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', kids)
+    cursor.executemany('''
+    INSERT INTO kids_payment_history (kid_id, amount, payment_date, payment_method, notes)
+    VALUES (?, ?, ?, ?, ?)
+    ''', kid_payments)
+    
+    def checkin_rows():
+        for _ in range(member_count * config['checkins_per_member']):
+            member = members[rng.randrange(member_count)]
+            day = today - timedelta(days=rng.randint(0, HISTORY_DAYS))
+            hour, minute = rng.choice(CHECKIN_HOURS), rng.randint(0, 59)
+            duration = rng.randint(30, 150)
+            check_in = datetime(day.year, day.month, day.day, hour, minute)
+            check_out = check_in + timedelta(minutes=duration)
+            yield (member[0], member[1], member[2], check_in.strftime('%Y-%m-%d %H:%M:%S'),
+                   check_out.strftime('%Y-%m-%d %H:%M:%S'), duration, rng.choice(USAGE_TYPES), "")
+    
+    cursor.executemany('''
+    INSERT INTO member_checkins (member_id, member_name, phone, check_in_time, check_out_time,
+                                 duration_minutes, court_usage_type, notes)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', checkin_rows())
+    
+    def reminder_rows():
+        for _ in range(member_count * config['reminders_per_member']):
+            member_id = rng.randint(1, member_count)
+            sent = today - timedelta(days=rng.randint(0, HISTORY_DAYS))
+            reminder_type = rng.choice(["payment_reminder", "overdue_reminder", "WhatsApp_Link"])
+            yield (member_id, reminder_type, f"Reminder for member {member_id}",
+                   _timestamp(sent, rng.randint(8, 20), rng.randint(0, 59)), rng.random() > 0.03)
+    
+    cursor.executemany('''
+    INSERT INTO reminder_logs (member_id, reminder_type, message, sent_at, success)
+    VALUES (?, ?, ?, ?, ?)
+    ''', reminder_rows())
+    
+    cursor.executemany('''
+    INSERT INTO bulk_messages_log (message_text, recipient_count, message_type, sent_by, sent_at)
+    VALUES (?, ?, ?, ?, ?)
+    ''', [(f"Announcement {i}", rng.randint(10, member_count), "All Members", "Admin",
+           _timestamp(today - timedelta(days=rng.randint(0, HISTORY_DAYS)), 12, 0))
+          for i in range(config['bulk_messages'])])
+    
+    connection.commit()
+    cursor.execute('ANALYZE')
+    connection.close()
+    
+    return DatabaseManager(db_path).get_database_summary()
+
+def default_db_path(scale):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", f"bench_{scale}.db")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic badminton court database")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="1k")
+    parser.add_argument("--db", help="Target database (default: benchmarks/data/bench_<scale>.db)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--anchor-date", help="Treat this date (YYYY-MM-DD) as today")
+    parser.add_argument("--overwrite", action="store_true", help="Replace the target database if it exists")
+    args = parser.parse_args()
+    
+    anchor = datetime.strptime(args.anchor_date, '%Y-%m-%d').date() if args.anchor_date else None
+    counts = generate(args.db or default_db_path(args.scale), args.scale, args.seed, anchor, args.overwrite)
+    for table, count in counts.items():
+        print(f"{table}: {count}")
@@ -0,0 +1,105 @@
+"""Clocks for everything that depends on the current time.
+
+Time-based code asks a clock for now() and today() instead of calling
+datetime.now(), so due dates, reminder windows, the 3-day reminder rule,
+outbox retries and check-out durations can run against a VirtualClock that
+is set and advanced by hand: a test or simulation jumps months ahead
+instantly. SystemClock reads the real time. DatabaseManager,
+ReminderScheduler, MessageManager, Outbox, SendWindow, EmailProvider and
+FileProvider take a clock argument; without one they follow the installed clock (set_clock /
+use_clock), which is the system clock unless replaced. ArchiveManager and
+StatusBuffer follow the database's clock unless given another, so the
+timestamps they write and the windows DatabaseManager reads agree, and the
+app's due dates, forecasts and check-in durations use the database's clock.
+Module-level functions in utils.py and template_engine.py read the installed
+clock too.
+"""
+
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+# How timestamps are written to the database
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+class SystemClock:
+    """The real time"""
+    
+    def now(self):
+        return datetime.now()
+    
+    def today(self):
+        return self.now().date()
+    
+    def timestamp(self):
+        """now() as stored in the database"""
+        return self.now().strftime(TIMESTAMP_FORMAT)
+
+class VirtualClock(SystemClock):
+    """A clock that only moves when set or advanced; starts at `start` (default the real time)"""
+    
+    def __init__(self, start=None):
+        self.lock = threading.Lock()
+        self._now = self._moment(start or datetime.now())
+    
+    @staticmethod
+    def _moment(value):
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        if not isinstance(value, datetime):
+            # A date means the start of that day
+            value = datetime.combine(value, datetime.min.time())
+        return value
+    
+    def now(self):
+        with self.lock:
+            return self._now
+    
+    def set(self, moment):
+        """Jump to a datetime, a date (its midnight) or an ISO string"""
+        with self.lock:
+            self._now = self._moment(moment)
+    
+    def advance(self, days=0, hours=0, minutes=0, seconds=0):
+        """Move forward by the given amount; returns the new time"""
+        with self.lock:
+            self._now += timedelta(days=days, hours=hours, minutes=minutes, seconds=seconds)
+            return self._now
+
+class _InstalledClock(SystemClock):
+    """Follows whichever clock is installed when it is asked"""
+    
+    def now(self):
+        return _installed.now()
+
+_installed = SystemClock()
+_install_lock = threading.Lock()
+
+# The default for anything that takes a clock argument
+DEFAULT_CLOCK = _InstalledClock()
+
+def get_clock():
+    """The installed clock"""
+    return _installed
+
+def set_clock(clock):
+    """Install a clock for everything using DEFAULT_CLOCK; returns the one it replaced"""
+    global _installed
+    with _install_lock:
+        previous, _installed = _installed, clock or SystemClock()
+    return previous
+
+@contextmanager
+def use_clock(clock):
+    """Install a clock for the duration of a with block"""
+    previous = set_clock(clock)
+    try:
+        yield clock
+    finally:
+        set_clock(previous)
+
+def now():
+    return _installed.now()
+
+def today():
+    return _installed.today()
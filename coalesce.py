@@ -0,0 +1,113 @@
+"""Per-household coalescing of outgoing messages.
+
+Reminders going to the same phone (a parent with several kids in training,
+or a member who is also a parent) are merged into one household message with
+an itemised fee list before they reach the outbox. The merged message keeps
+a log target for every reminder it covers, so when it is sent one
+reminder_logs row is written per kid or member, all sharing the delivery's
+id, and the idempotency key of every reminder it covers, which the outbox
+records with it so none of them is queued again when the household's set of
+reminders changes. Emails are grouped by address instead of phone. Firm and
+final reminders are never merged: each escalates the member's ladder when it
+is logged, so it goes out on its own with its template's wording. Bulk
+announcement recipients are deduplicated by phone the same way.
+"""
+
+import hashlib
+
+from utils import normalize_phone
+from template_engine import COURT_NAME, CONTACT_PHONE
+from email_channel import compose_email
+from outbox import PRIORITY_NORMAL
+from reminder_queue import ESCALATION_LADDER, FIRM, FINAL
+
+HOUSEHOLD_LOG_TYPE = "household_reminder"
+# Reminder types that are sent as they are, never folded into a household message
+UNMERGED_LOG_TYPES = (ESCALATION_LADDER[FIRM], ESCALATION_LADDER[FINAL])
+
+def household_key(phone, channel="SMS"):
+    """Grouping key for a recipient: the email address for Email, otherwise the normalized phone"""
+    if channel == "Email":
+        return phone.strip().lower()
+    return normalize_phone(phone)
+
+def _household_idempotency_key(address, messages):
+    # Same set of reminders -> same key, so a household message is queued once
+    digest = hashlib.sha1("|".join(sorted(message['idempotency_key'] for message in messages)).encode('utf-8'))
+    return f"household:{address}:{digest.hexdigest()[:16]}"
+
+def _format_amount(amount):
+    return f"{amount:,.0f}" if float(amount).is_integer() else f"{amount:,.2f}"
+
+def household_message(recipient_name, items):
+    """One message listing every fee due; items are dicts with label, amount, due_date and overdue.
+    
+    The heading and closing follow the most severe item, so a household with
+    an overdue fee is not told its fees are upcoming. Plain GSM-7 text (Rs.,
+    no emoji) keeps an SMS household message at the cheaper segment size.
+    """
+    overdue = any(item.get('overdue') for item in items)
+    heading = f"Your fees at {COURT_NAME} are overdue:" if overdue else f"Your upcoming fees at {COURT_NAME}:"
+    lines = [f"Hi {recipient_name}!", "", heading]
+    for item in sorted(items, key=lambda item: item['due_date']):
+        when = "overdue since" if item.get('overdue') else "due"
+        lines.append(f"- {item['label']}: Rs.{_format_amount(item['amount'])} {when} {item['due_date'].strftime('%d-%m-%Y')}")
+    lines.append(f"Total: Rs.{_format_amount(sum(item['amount'] for item in items))}")
+    closing = ("Please make the payment as soon as possible to avoid interruption." if overdue
+               else "Please make the payment to continue without interruption.")
+    lines.extend(["", closing, "", "Thank you!", f"Contact: {CONTACT_PHONE}"])
+    return "\n".join(lines)
+
+def coalesce_reminders(messages):
+    """Merge reminder messages that go to the same phone.
+    
+    Each message is an outbox dict (idempotency_key, phone, message, member_id,
+    log_type, ...) with an 'item' dict: recipient_name, label, amount,
+    due_date and overdue. Single messages and firm or final reminders pass
+    through unchanged; groups become one household message whose log_targets
+    lists every (member_id, log_type).
+    """
+    coalesced = []
+    households = {}
+    for message in messages:
+        if message['log_type'] in UNMERGED_LOG_TYPES:
+            coalesced.append(message)
+            continue
+        households.setdefault(household_key(message['phone'], message.get('channel', 'SMS')), []).append(message)
+    
+    for address, group in households.items():
+        if len(group) == 1:
+            coalesced.append(group[0])
+            continue
+        
+        items = [message['item'] for message in group]
+        channel = group[0].get('channel', 'SMS')
+        text = household_message(items[0]['recipient_name'], items)
+        if channel == "Email":
+            overdue = any(item.get('overdue') for item in items)
+            text = compose_email(f"{'Overdue' if overdue else 'Upcoming'} fees at {COURT_NAME}", text)
+        coalesced.append({
+            'idempotency_key': _household_idempotency_key(address, group),
+            'source': group[0]['source'],
+            'member_id': group[0]['member_id'],
+            'log_type': HOUSEHOLD_LOG_TYPE,
+            'log_targets': [(message['member_id'], message['log_type']) for message in group],
+            'covers': [message['idempotency_key'] for message in group],
+            'phone': group[0]['phone'],
+            'message': text,
+            'channel': channel,
+            'priority': min(message.get('priority', PRIORITY_NORMAL) for message in group),
+        })
+    return coalesced
+
+def dedupe_recipients(recipients):
+    """Bulk messaging recipients with one entry per phone (names of merged entries are joined)"""
+    by_phone = {}
+    for recipient in recipients:
+        key = household_key(recipient['phone'])
+        existing = by_phone.get(key)
+        if existing is None:
+            by_phone[key] = dict(recipient)
+        elif recipient['name'] not in existing['name'].split(" / "):
+            existing['name'] = f"{existing['name']} / {recipient['name']}"
+    return list(by_phone.values())
@@ -2,17 +2,69 @@ import sqlite3
 import pandas as pd
 from datetime import datetime, timedelta
 import os
+from archive_manager import attach_archive, archive_select_sql, history_source_sql, list_archive_years
+from records import Member, Payment, Kid, Checkin, ReminderLog, fetch_records, make_row_factory
+from instrumentation import open_connection, instrument_class
+from utils import calculate_next_due_date, MEMBERSHIP_PERIOD_DAYS, DEFAULT_PERIOD_DAYS
+from clock import DEFAULT_CLOCK
+from reminder_queue import ESCALATION_LADDER, NOT_REMINDED, MANUAL_REMINDER_TYPES
+
+# Tables whose row counts are kept in table_counters by triggers
+COUNTED_TABLES = ['members', 'payment_history', 'kids_training', 'kids_payment_history',
+                  'member_checkins', 'reminder_logs', 'bulk_messages_log']
+
+# Delivery statuses (message_status) counted as delivered / undelivered in reminder statistics
+DELIVERED_STATUSES = ('delivered', 'read')
+UNDELIVERED_STATUSES = ('undelivered', 'failed')
+
+# First day of each get_reminder_stats period, from a reminder_stats_daily day (weeks start on Monday)
+STATS_GRANULARITIES = {
+    'day': "day",
+    'week': "date(day, 'weekday 0', '-6 days')",
+    'month': "strftime('%Y-%m-01', day)",
+    'year': "strftime('%Y-01-01', day)",
+}
+STATS_COLUMNS = ['sent', 'successful', 'tracked', 'delivered', 'undelivered']
+
+def _sql_list(values):
+    return "(" + ", ".join(f"'{value}'" for value in values) + ")"
+
+def _log_channel_sql(row):
+    """SQL for the channel of a reminder_logs row; rows from before the channel column are inferred"""
+    return (f"COALESCE({row}.channel, CASE WHEN {row}.message LIKE 'Subject:%' THEN 'Email' "
+            f"WHEN {row}.reminder_type LIKE 'WhatsApp%' THEN 'WhatsApp' ELSE 'SMS' END)")
+
+def _due_date_sql(row):
+    """SQL for the next due date of a members row (NEW/OLD in a trigger), as utils.calculate_next_due_date"""
+    periods = ' '.join(f"WHEN '{membership_type}' THEN {days}"
+                       for membership_type, days in MEMBERSHIP_PERIOD_DAYS.items())
+    period = f"CASE {row}.membership_type {periods} ELSE {DEFAULT_PERIOD_DAYS} END"
+    return f"date({row}.payment_date, '+' || {period} || ' days')"
+
+def _escalation_stage_sql(row):
+    """SQL for the ladder rung a reminder_logs row's type stands for (NULL for other types)"""
+    stages = ' '.join(f"WHEN '{reminder_type}' THEN {stage}" for stage, reminder_type in ESCALATION_LADDER.items())
+    return f"CASE {row}.reminder_type {stages} END"
 
 class DatabaseManager:
-    def __init__(self, db_path="badminton_court.db"):
+    def __init__(self, db_path="badminton_court.db", clock=DEFAULT_CLOCK):
         self.db_path = db_path
+        # Where "now" comes from (clock.py); a VirtualClock lets tests and simulations move time
+        self.clock = clock
         self.init_database()
     
+    def _connect(self):
+        """Open a connection to the database (timed by the query instrumentation)"""
+        return open_connection(self.db_path)
+    
     def init_database(self):
         """Initialize the database with required tables"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
+        # Lets archiving hand freed pages back (only takes effect on a new database file)
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        
         # Members table
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS members (
@@ -88,6 +140,9 @@ class DatabaseManager:
         )
         ''')
         
+        # Bumped on every edit so compiled templates (template_engine.py) can be cached by version
+        self._ensure_column(cursor, 'message_templates', 'version', 'INTEGER NOT NULL DEFAULT 1')
+        
         # Reminder logs table
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS reminder_logs (
@@ -101,6 +156,15 @@ class DatabaseManager:
         )
         ''')
         
+        # Reminders sent as one household message share the delivery's id (coalesce.py)
+        self._ensure_column(cursor, 'reminder_logs', 'delivery_id', 'TEXT')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_reminder_logs_delivery_id ON reminder_logs (delivery_id)')
+        # Twilio message SID, matched against delivery status callbacks in message_status
+        self._ensure_column(cursor, 'reminder_logs', 'provider_sid', 'TEXT')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_reminder_logs_provider_sid ON reminder_logs (provider_sid)')
+        # "SMS", "WhatsApp" or "Email"
+        self._ensure_column(cursor, 'reminder_logs', 'channel', 'TEXT')
+        
         # Member checkins table
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS member_checkins (
@@ -129,11 +193,470 @@ class DatabaseManager:
         )
         ''')
         
+        # Row counters kept up to date by triggers (dashboard and summary metrics)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS table_counters (
+            counter_name TEXT PRIMARY KEY,
+            row_count INTEGER NOT NULL DEFAULT 0
+        )
+        ''')
+        
+        # Number of members per last payment date (active subscription metric)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS member_payment_date_counts (
+            payment_date DATE PRIMARY KEY,
+            member_count INTEGER NOT NULL DEFAULT 0
+        )
+        ''')
+        
+        # Archiving bookkeeping: rows moved out per table and the cutoff they were older than
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archive_state (
+            table_name TEXT PRIMARY KEY,
+            archived_before TIMESTAMP NOT NULL,
+            archived_rows INTEGER NOT NULL DEFAULT 0
+        )
+        ''')
+        
+        # Jobs run by the reminder daemon (reminder_daemon.py): schedule and outcome of the last run
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduler_jobs (
+            job_name TEXT PRIMARY KEY,
+            schedule TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'scheduled',
+            last_run_at TIMESTAMP,
+            next_run_at TIMESTAMP,
+            last_duration_ms INTEGER,
+            last_sent_count INTEGER,
+            last_error TEXT,
+            missed_runs INTEGER NOT NULL DEFAULT 0,
+            run_count INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        
+        # Lease held by the running daemon so two instances never send the same reminders
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduler_lock (
+            lock_name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            acquired_at TIMESTAMP NOT NULL,
+            expires_at TIMESTAMP NOT NULL
+        )
+        ''')
+        
+        # Messages waiting to be sent (outbox.py); idempotency_key makes enqueueing the same reminder a no-op
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            source TEXT NOT NULL,
+            channel TEXT NOT NULL DEFAULT 'SMS',
+            phone TEXT NOT NULL,
+            message TEXT NOT NULL,
+            member_id INTEGER,
+            log_type TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 5,
+            next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            claimed_by TEXT,
+            claimed_at TIMESTAMP,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP
+        )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status, next_attempt_at)')
+        # JSON list of [member_id, log_type] for a household message covering several reminders
+        self._ensure_column(cursor, 'outbox', 'log_targets', 'TEXT')
+        self._ensure_column(cursor, 'outbox', 'provider_sid', 'TEXT')
+        # Claim order (outbox.PRIORITY_*): overdue reminders before upcoming ones
+        self._ensure_column(cursor, 'outbox', 'priority', 'INTEGER NOT NULL DEFAULT 1')
+        # The reminder keys a household outbox row covers, so none of them is queued again on its own
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS outbox_keys (
+            idempotency_key TEXT PRIMARY KEY,
+            outbox_id INTEGER NOT NULL
+        ) WITHOUT ROWID
+        ''')
+        
+        # One row per provider call made by MessageManager.send_message (retries included)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS message_attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            phone TEXT NOT NULL,
+            channel TEXT NOT NULL,
+            attempt INTEGER NOT NULL,
+            outcome TEXT NOT NULL,
+            http_status INTEGER,
+            error_code INTEGER,
+            error_message TEXT,
+            provider_sid TEXT,
+            latency_ms REAL,
+            attempted_at TIMESTAMP NOT NULL
+        )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_message_attempts_attempted_at ON message_attempts (attempted_at)')
+        self._ensure_column(cursor, 'message_attempts', 'provider', 'TEXT')
+        
+        # Latest delivery status per message, from provider status callbacks (status_webhook.py)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS message_status (
+            provider_sid TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            status_rank INTEGER NOT NULL,
+            error_code INTEGER,
+            phone TEXT,
+            updated_at TIMESTAMP NOT NULL
+        )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_message_status_updated_at ON message_status (updated_at)')
+        
+        # Recipients the mail server refused (email_channel.py): hard = 5xx, soft = 4xx
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS email_bounces (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            address TEXT NOT NULL,
+            bounce_type TEXT NOT NULL,
+            smtp_code INTEGER,
+            reason TEXT,
+            bounced_at TIMESTAMP NOT NULL
+        )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_email_bounces_address ON email_bounces (address, bounced_at)')
+        
+        # Reminder outcomes per day, type and channel, kept by triggers on reminder_logs and message_status;
+        # archiving or deleting logs leaves their counts here
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reminder_stats_daily (
+            day DATE NOT NULL,
+            reminder_type TEXT NOT NULL,
+            channel TEXT NOT NULL,
+            sent INTEGER NOT NULL DEFAULT 0,
+            successful INTEGER NOT NULL DEFAULT 0,
+            tracked INTEGER NOT NULL DEFAULT 0,
+            delivered INTEGER NOT NULL DEFAULT 0,
+            undelivered INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, reminder_type, channel)
+        ) WITHOUT ROWID
+        ''')
+        
+        # Keeps MIN/MAX(created_at) in get_database_summary an index lookup
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_members_created_at ON members (created_at)')
+        
+        # Reminder priority queue (reminder_queue.py): one row per member, kept current by triggers
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reminder_queue (
+            member_id INTEGER PRIMARY KEY,
+            due_date DATE NOT NULL,
+            remind_from DATE NOT NULL,
+            escalation_level INTEGER NOT NULL DEFAULT -1,
+            last_reminded_at TIMESTAMP
+        )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_reminder_queue_remind_from ON reminder_queue (remind_from)')
+        
+        self._create_counter_triggers(cursor)
+        self._create_reminder_queue_triggers(cursor)
+        self._create_reminder_stats_triggers(cursor)
+        
+        # Members from before the queue existed: the rung reached since their last payment and their last
+        # reminder come from reminder_logs, so nobody reminded just before the upgrade is reminded again
+        cursor.execute(f'''
+        INSERT OR IGNORE INTO reminder_queue (member_id, due_date, remind_from, escalation_level, last_reminded_at)
+        SELECT m.id, {_due_date_sql('m')}, date({_due_date_sql('m')}, '-' || m.reminder_days || ' days'),
+               COALESCE(MAX(CASE WHEN date(l.sent_at) >= m.payment_date THEN {_escalation_stage_sql('l')} END),
+                        {NOT_REMINDED}),
+               MAX(l.sent_at)
+        FROM members m
+        LEFT JOIN reminder_logs l
+            ON l.member_id = m.id AND l.success
+           AND l.reminder_type IN {_sql_list(tuple(ESCALATION_LADDER.values()) + MANUAL_REMINDER_TYPES)}
+        WHERE m.id NOT IN (SELECT member_id FROM reminder_queue)
+        GROUP BY m.id
+        ''')
+        
+        # Seed the counters the first time (or after a counter was lost)
+        cursor.execute('SELECT COUNT(*) FROM table_counters')
+        if cursor.fetchone()[0] < len(COUNTED_TABLES) + 1:
+            self._repair_table_counters(cursor)
+        
         # Insert default message templates if they don't exist
         self._insert_default_templates(cursor)
         
+        # Logs written before the rollup existed are counted once (after commit: the backfill attaches archives)
+        cursor.execute('''
+        SELECT NOT EXISTS (SELECT 1 FROM reminder_stats_daily) AND EXISTS (SELECT 1 FROM reminder_logs)
+        ''')
+        backfill_stats = cursor.fetchone()[0]
+        
         conn.commit()
         conn.close()
+        
+        if backfill_stats:
+            self.rebuild_reminder_stats()
+    
+    def _ensure_column(self, cursor, table, column, definition):
+        """Add a column to an existing table if it isn't there yet"""
+        cursor.execute(f'PRAGMA table_info({table})')
+        if column not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    
+    def _create_counter_triggers(self, cursor):
+        """Create the triggers that maintain table_counters and member_payment_date_counts"""
+        for table in COUNTED_TABLES:
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_count_insert AFTER INSERT ON {table}
+            BEGIN
+                UPDATE table_counters SET row_count = row_count + 1 WHERE counter_name = '{table}';
+            END
+            ''')
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_count_delete AFTER DELETE ON {table}
+            BEGIN
+                UPDATE table_counters SET row_count = row_count - 1 WHERE counter_name = '{table}';
+            END
+            ''')
+        
+        # Active kids (active = TRUE) counter
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_kids_active_count_insert AFTER INSERT ON kids_training
+        BEGIN
+            UPDATE table_counters SET row_count = row_count + (NEW.active IS 1)
+            WHERE counter_name = 'kids_training_active';
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_kids_active_count_delete AFTER DELETE ON kids_training
+        BEGIN
+            UPDATE table_counters SET row_count = row_count - (OLD.active IS 1)
+            WHERE counter_name = 'kids_training_active';
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_kids_active_count_update AFTER UPDATE OF active ON kids_training
+        BEGIN
+            UPDATE table_counters SET row_count = row_count + (NEW.active IS 1) - (OLD.active IS 1)
+            WHERE counter_name = 'kids_training_active';
+        END
+        ''')
+        
+        # Members per payment date
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_members_payment_date_insert AFTER INSERT ON members
+        BEGIN
+            INSERT INTO member_payment_date_counts (payment_date, member_count)
+            VALUES (date(NEW.payment_date), 1)
+            ON CONFLICT (payment_date) DO UPDATE SET member_count = member_count + 1;
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_members_payment_date_delete AFTER DELETE ON members
+        BEGIN
+            UPDATE member_payment_date_counts SET member_count = member_count - 1
+            WHERE payment_date = date(OLD.payment_date);
+            DELETE FROM member_payment_date_counts
+            WHERE payment_date = date(OLD.payment_date) AND member_count <= 0;
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_members_payment_date_update AFTER UPDATE OF payment_date ON members
+        WHEN date(OLD.payment_date) IS NOT date(NEW.payment_date)
+        BEGIN
+            UPDATE member_payment_date_counts SET member_count = member_count - 1
+            WHERE payment_date = date(OLD.payment_date);
+            DELETE FROM member_payment_date_counts
+            WHERE payment_date = date(OLD.payment_date) AND member_count <= 0;
+            INSERT INTO member_payment_date_counts (payment_date, member_count)
+            VALUES (date(NEW.payment_date), 1)
+            ON CONFLICT (payment_date) DO UPDATE SET member_count = member_count + 1;
+        END
+        ''')
+    
+    def _create_reminder_queue_triggers(self, cursor):
+        """Create the triggers that keep reminder_queue in step with members and reminder_logs"""
+        due_date = _due_date_sql('NEW')
+        remind_from = f"date({due_date}, '-' || NEW.reminder_days || ' days')"
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_members_reminder_queue_insert AFTER INSERT ON members
+        BEGIN
+            INSERT INTO reminder_queue (member_id, due_date, remind_from)
+            VALUES (NEW.id, {due_date}, {remind_from})
+            ON CONFLICT (member_id) DO UPDATE SET
+                due_date = excluded.due_date, remind_from = excluded.remind_from,
+                escalation_level = {NOT_REMINDED}, last_reminded_at = NULL;
+        END
+        ''')
+        # A new due date (a payment arrived) starts the ladder again; the last reminder time is kept
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_members_reminder_queue_update
+        AFTER UPDATE OF payment_date, membership_type, reminder_days ON members
+        BEGIN
+            UPDATE reminder_queue SET
+                escalation_level = CASE WHEN due_date = {due_date} THEN escalation_level ELSE {NOT_REMINDED} END,
+                due_date = {due_date},
+                remind_from = {remind_from}
+            WHERE member_id = NEW.id;
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_members_reminder_queue_delete AFTER DELETE ON members
+        BEGIN
+            DELETE FROM reminder_queue WHERE member_id = OLD.id;
+        END
+        ''')
+        # A logged reminder moves its member up the ladder
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_reminder_logs_escalate AFTER INSERT ON reminder_logs
+        WHEN NEW.success AND NEW.reminder_type IN {_sql_list(ESCALATION_LADDER.values())}
+        BEGIN
+            UPDATE reminder_queue SET
+                escalation_level = MAX(escalation_level, {_escalation_stage_sql('NEW')}),
+                last_reminded_at = NEW.sent_at
+            WHERE member_id = NEW.member_id;
+        END
+        ''')
+        # One sent by hand only counts as the last reminder
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_reminder_logs_manual_reminder AFTER INSERT ON reminder_logs
+        WHEN NEW.success AND NEW.reminder_type IN {_sql_list(MANUAL_REMINDER_TYPES)}
+        BEGIN
+            UPDATE reminder_queue SET last_reminded_at = NEW.sent_at WHERE member_id = NEW.member_id;
+        END
+        ''')
+    
+    def _create_reminder_stats_triggers(self, cursor):
+        """Create the triggers that keep reminder_stats_daily in step with reminder_logs and message_status"""
+        delivered, undelivered = _sql_list(DELIVERED_STATUSES), _sql_list(UNDELIVERED_STATUSES)
+        # A status callback can arrive before its log row is written
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_reminder_logs_stats_insert AFTER INSERT ON reminder_logs
+        BEGIN
+            INSERT INTO reminder_stats_daily
+                (day, reminder_type, channel, sent, successful, tracked, delivered, undelivered)
+            VALUES (
+                date(NEW.sent_at), NEW.reminder_type, {_log_channel_sql('NEW')}, 1,
+                COALESCE(NEW.success = 1, 0),
+                NEW.provider_sid IS NOT NULL,
+                COALESCE((SELECT status IN {delivered} FROM message_status WHERE provider_sid = NEW.provider_sid), 0),
+                COALESCE((SELECT status IN {undelivered} FROM message_status WHERE provider_sid = NEW.provider_sid), 0)
+            )
+            ON CONFLICT (day, reminder_type, channel) DO UPDATE SET
+                sent = sent + 1,
+                successful = successful + excluded.successful,
+                tracked = tracked + excluded.tracked,
+                delivered = delivered + excluded.delivered,
+                undelivered = undelivered + excluded.undelivered;
+        END
+        ''')
+        # A status moves the logs sharing its SID (several for a household message) between buckets
+        for event, old_delivered, old_undelivered, condition in (
+                ('INSERT', '0', '0', f"NEW.status IN {delivered} OR NEW.status IN {undelivered}"),
+                ('UPDATE OF status', f"(OLD.status IN {delivered})", f"(OLD.status IN {undelivered})",
+                 f"(NEW.status IN {delivered}) != (OLD.status IN {delivered}) "
+                 f"OR (NEW.status IN {undelivered}) != (OLD.status IN {undelivered})")):
+            name = event.split()[0].lower()
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_message_status_stats_{name} AFTER {event} ON message_status
+            WHEN {condition}
+            BEGIN
+                UPDATE reminder_stats_daily SET
+                    delivered = delivered + logs.log_count * ((NEW.status IN {delivered}) - {old_delivered}),
+                    undelivered = undelivered + logs.log_count * ((NEW.status IN {undelivered}) - {old_undelivered})
+                FROM (
+                    SELECT date(r.sent_at) AS day, r.reminder_type, {_log_channel_sql('r')} AS channel,
+                           COUNT(*) AS log_count
+                    FROM reminder_logs r
+                    WHERE r.provider_sid = NEW.provider_sid
+                    GROUP BY 1, 2, 3
+                ) AS logs
+                WHERE reminder_stats_daily.day = logs.day
+                  AND reminder_stats_daily.reminder_type = logs.reminder_type
+                  AND reminder_stats_daily.channel = logs.channel;
+            END
+            ''')
+    
+    def _count_table_rows(self, cursor):
+        """Count rows the slow way, for verifying the trigger-maintained counters"""
+        counts = {}
+        for table in COUNTED_TABLES:
+            cursor.execute(f'SELECT COUNT(*) FROM {table}')
+            counts[table] = cursor.fetchone()[0]
+        
+        cursor.execute('SELECT COUNT(*) FROM kids_training WHERE active = TRUE')
+        counts['kids_training_active'] = cursor.fetchone()[0]
+        return counts
+    
+    def _repair_table_counters(self, cursor):
+        """Rebuild table_counters and member_payment_date_counts from the real tables"""
+        for counter_name, count in self._count_table_rows(cursor).items():
+            cursor.execute('''
+            INSERT INTO table_counters (counter_name, row_count) VALUES (?, ?)
+            ON CONFLICT (counter_name) DO UPDATE SET row_count = excluded.row_count
+            ''', (counter_name, count))
+        
+        cursor.execute('DELETE FROM member_payment_date_counts')
+        cursor.execute('''
+        INSERT INTO member_payment_date_counts (payment_date, member_count)
+        SELECT date(payment_date), COUNT(*) FROM members GROUP BY date(payment_date)
+        ''')
+    
+    def verify_table_counters(self, repair=True):
+        """Compare the trigger-maintained counters with real counts.
+        
+        Returns a dict of {counter_name: (stored, actual)} for every counter that
+        was out of sync. Mismatches are fixed in place when repair is True.
+        """
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT counter_name, row_count FROM table_counters')
+            stored = dict(cursor.fetchall())
+            
+            mismatches = {}
+            for counter_name, actual in self._count_table_rows(cursor).items():
+                if stored.get(counter_name) != actual:
+                    mismatches[counter_name] = (stored.get(counter_name), actual)
+            
+            # Per-date member counts must match exactly in both directions
+            cursor.execute('''
+            WITH actual AS (
+                SELECT date(payment_date) AS payment_date, COUNT(*) AS member_count
+                FROM members GROUP BY date(payment_date)
+            )
+            SELECT
+                (SELECT COUNT(*) FROM member_payment_date_counts),
+                (SELECT COUNT(*) FROM actual),
+                (SELECT COUNT(*) FROM (
+                    SELECT payment_date, member_count FROM actual
+                    EXCEPT SELECT payment_date, member_count FROM member_payment_date_counts
+                )),
+                (SELECT COUNT(*) FROM (
+                    SELECT payment_date, member_count FROM member_payment_date_counts
+                    EXCEPT SELECT payment_date, member_count FROM actual
+                ))
+            ''')
+            stored_dates, actual_dates, missing, stale = cursor.fetchone()
+            if missing or stale:
+                mismatches['member_payment_date_counts'] = (stored_dates, actual_dates)
+            
+            if mismatches and repair:
+                self._repair_table_counters(cursor)
+                conn.commit()
+            
+            conn.close()
+            return mismatches
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return {}
+    
+    def _read_counter(self, cursor, counter_name):
+        """Read a single trigger-maintained counter"""
+        cursor.execute('SELECT row_count FROM table_counters WHERE counter_name = ?', (counter_name,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
     
     def _insert_default_templates(self, cursor):
         """Insert default message templates"""
@@ -155,7 +678,38 @@ Please make the payment immediately to continue enjoying our facilities.
 
 For any queries, contact us: {phone}
 
-Thank you!""")
+Thank you!"""),
+            # Last step of the reminder escalation ladder (reminder_queue.py)
+            ("final_reminder", """Dear {member_name},
+
+FINAL NOTICE: your badminton court membership payment of ₹{amount} is now {overdue_days} days overdue.
+
+Please make the payment right away to keep your membership active.
+
+For any queries, contact us: {phone}"""),
+            # HTML versions for the Email channel; the text templates above are sent alongside
+            ("payment_reminder_email", """<div style="font-family: Arial, sans-serif; max-width: 560px;">
+<h2 style="color: #1f6f43;">{court_name}</h2>
+<p>Hi {member_name},</p>
+<p>Your badminton court membership payment of <strong>&#8377;{amount}</strong> is due on <strong>{due_date}</strong>.</p>
+<p>Please make the payment at your earliest convenience.</p>
+<p>Thank you for being a valued member!</p>
+<p style="color: #666666; font-size: 13px;">Contact us: {phone}</p>
+</div>"""),
+            ("overdue_reminder_email", """<div style="font-family: Arial, sans-serif; max-width: 560px;">
+<h2 style="color: #b03a2e;">{court_name}</h2>
+<p>Dear {member_name},</p>
+<p>Your badminton court membership payment of <strong>&#8377;{amount}</strong> is overdue by <strong>{overdue_days} days</strong>.</p>
+<p>Please make the payment immediately to continue enjoying our facilities.</p>
+<p style="color: #666666; font-size: 13px;">For any queries, contact us: {phone}</p>
+</div>"""),
+            ("final_reminder_email", """<div style="font-family: Arial, sans-serif; max-width: 560px;">
+<h2 style="color: #7b241c;">{court_name}</h2>
+<p>Dear {member_name},</p>
+<p>This is a final notice: your badminton court membership payment of <strong>&#8377;{amount}</strong> is now <strong>{overdue_days} days</strong> overdue.</p>
+<p>Please make the payment right away to keep your membership active.</p>
+<p style="color: #666666; font-size: 13px;">For any queries, contact us: {phone}</p>
+</div>""")
         ]
         
         for template_type, message_text in default_templates:
@@ -167,7 +721,7 @@ Thank you!""")
     def add_member(self, name, phone, email, membership_type, amount, payment_date, reminder_days, notes):
         """Add a new member to the database"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -192,36 +746,39 @@ Thank you!""")
     
     def get_all_payments(self, search_term="", membership_filter="All", status_filter="All"):
         """Get all payment records with optional filtering"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        query = '''
-        SELECT m.id, m.name as member_name, m.phone, m.email, m.membership_type, 
-               m.amount, m.payment_date, m.reminder_days, m.notes
-        FROM members m
-        WHERE 1=1
-        '''
-        params = []
-        
-        if search_term:
-            query += " AND (m.name LIKE ? OR m.phone LIKE ?)"
-            params.extend([f"%{search_term}%", f"%{search_term}%"])
-        
-        if membership_filter != "All":
-            query += " AND m.membership_type = ?"
-            params.append(membership_filter)
-        
-        cursor.execute(query, params)
-        columns = [description[0] for description in cursor.description]
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        
-        conn.close()
-        return results
+        return list(self.iter_all_payments(search_term, membership_filter, status_filter))
+    
+    def iter_all_payments(self, search_term="", membership_filter="All", status_filter="All"):
+        """Iterate over payment records as Member records (member_name is an alias of name)"""
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            
+            query = '''
+            SELECT m.id, m.name, m.phone, m.email, m.membership_type,
+                   m.amount, m.payment_date, m.reminder_days, m.notes
+            FROM members m
+            WHERE 1=1
+            '''
+            params = []
+            
+            if search_term:
+                query += " AND (m.name LIKE ? OR m.phone LIKE ?)"
+                params.extend([f"%{search_term}%", f"%{search_term}%"])
+            
+            if membership_filter != "All":
+                query += " AND m.membership_type = ?"
+                params.append(membership_filter)
+            
+            cursor.execute(query, params)
+            yield from fetch_records(cursor, Member)
+        finally:
+            conn.close()
     
     def record_payment(self, member_id, amount, payment_date, payment_method, notes):
         """Record a new payment for a member"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             # Add payment to history
@@ -247,7 +804,7 @@ Thank you!""")
     def add_kid(self, kid_name, parent_name, parent_phone, age, batch_time, monthly_fee, start_date, emergency_contact, medical_notes):
         """Add a new kid to the training program"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -266,23 +823,25 @@ Thank you!""")
     
     def get_all_kids(self):
         """Get all kids in the training program"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        SELECT * FROM kids_training WHERE active = TRUE ORDER BY kid_name
-        ''')
-        
-        columns = [description[0] for description in cursor.description]
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        
-        conn.close()
-        return results
+        return list(self.iter_all_kids())
+    
+    def iter_all_kids(self):
+        """Iterate over active kids as Kid records"""
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+            SELECT * FROM kids_training WHERE active = TRUE ORDER BY kid_name
+            ''')
+            yield from fetch_records(cursor, Kid)
+        finally:
+            conn.close()
     
     def record_kid_payment(self, kid_id, amount, payment_date, payment_method, notes):
         """Record a payment for a kid's training"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -299,7 +858,7 @@ Thank you!""")
     
     def get_last_kid_payment(self, kid_id):
         """Get the last payment record for a kid"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -311,8 +870,7 @@ Thank you!""")
         
         row = cursor.fetchone()
         if row:
-            columns = [description[0] for description in cursor.description]
-            result = dict(zip(columns, row))
+            result = make_row_factory(Payment, cursor.description)(row)
         else:
             result = None
         
@@ -321,7 +879,7 @@ Thank you!""")
     
     def get_message_template(self, template_type):
         """Get a message template by type"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -333,15 +891,29 @@ Thank you!""")
         
         return row[0] if row else ""
     
+    def get_message_template_record(self, template_type):
+        """(message_text, version) of a template, or None if it doesn't exist"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT message_text, version FROM message_templates WHERE template_type = ?
+        ''', (template_type,))
+        
+        row = cursor.fetchone()
+        conn.close()
+        
+        return tuple(row) if row else None
+    
     def update_message_template(self, template_type, message_text):
         """Update a message template"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
             UPDATE message_templates 
-            SET message_text = ?, updated_at = CURRENT_TIMESTAMP
+            SET message_text = ?, version = version + 1, updated_at = CURRENT_TIMESTAMP
             WHERE template_type = ?
             ''', (message_text, template_type))
             
@@ -355,13 +927,13 @@ Thank you!""")
     def log_reminder(self, member_id, reminder_type, message):
         """Log a sent reminder"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
-            INSERT INTO reminder_logs (member_id, reminder_type, message, success)
-            VALUES (?, ?, ?, ?)
-            ''', (member_id, reminder_type, message, True))
+            INSERT INTO reminder_logs (member_id, reminder_type, message, success, sent_at)
+            VALUES (?, ?, ?, ?, ?)
+            ''', (member_id, reminder_type, message, True, self.clock.timestamp()))
             
             conn.commit()
             conn.close()
@@ -370,44 +942,287 @@ Thank you!""")
             print(f"Database error: {e}")
             return False
     
+    def log_reminders_batch(self, rows):
+        """Log many reminders in one transaction; rows are (member_id, reminder_type, message, success),
+        optionally followed by the provider's message SID and the channel.
+        
+        Returns the number of rows written, or False on error.
+        """
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            sent_at = self.clock.timestamp()
+            cursor.executemany('''
+            INSERT INTO reminder_logs (member_id, reminder_type, message, success, provider_sid, channel, sent_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [tuple(row) + (None,) * (6 - len(row)) + (sent_at,) for row in rows])
+            
+            conn.commit()
+            conn.close()
+            return len(rows)
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return False
+    
+    def log_message_attempts(self, rows):
+        """Write per-attempt send outcomes in one transaction.
+        
+        Rows are (phone, channel, attempt, outcome, http_status, error_code,
+        error_message, provider_sid, latency_ms, attempted_at, provider).
+        Returns the number of rows written, or False on error.
+        """
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            cursor.executemany('''
+            INSERT INTO message_attempts (phone, channel, attempt, outcome, http_status, error_code,
+                                          error_message, provider_sid, latency_ms, attempted_at, provider)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            
+            conn.commit()
+            conn.close()
+            return len(rows)
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return False
+    
+    def get_message_attempt_summary(self, days=7):
+        """Attempt counts per provider, channel and outcome over the last `days` days"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            since = (self.clock.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+            cursor.execute('''
+            SELECT COALESCE(provider, 'twilio'), channel, outcome, COUNT(*), AVG(latency_ms)
+            FROM message_attempts
+            WHERE attempted_at >= ?
+            GROUP BY 1, channel, outcome
+            ORDER BY 1, channel, COUNT(*) DESC
+            ''', (since,))
+            
+            summary = [{
+                'provider': row[0],
+                'channel': row[1],
+                'outcome': row[2],
+                'count': row[3],
+                'avg_latency_ms': round(row[4] or 0, 1)
+            } for row in cursor.fetchall()]
+            conn.close()
+            return summary
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return []
+    
+    def record_message_statuses(self, rows):
+        """Upsert delivery statuses in one transaction.
+        
+        Rows are (provider_sid, status, status_rank, error_code, phone,
+        updated_at). A status only replaces one of the same or lower rank, so
+        a late "sent" callback never overwrites "delivered". Returns the
+        number of rows given, or False on error.
+        """
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            cursor.executemany('''
+            INSERT INTO message_status (provider_sid, status, status_rank, error_code, phone, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (provider_sid) DO UPDATE SET
+                status = excluded.status,
+                status_rank = excluded.status_rank,
+                error_code = COALESCE(excluded.error_code, message_status.error_code),
+                phone = COALESCE(excluded.phone, message_status.phone),
+                updated_at = excluded.updated_at
+            WHERE excluded.status_rank >= message_status.status_rank
+            ''', rows)
+            
+            conn.commit()
+            conn.close()
+            return len(rows)
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return False
+    
+    def get_message_status_counts(self, days=7):
+        """{status: messages} for delivery statuses received over the last `days` days"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            since = (self.clock.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+            cursor.execute('''
+            SELECT status, COUNT(*) FROM message_status WHERE updated_at >= ? GROUP BY status
+            ''', (since,))
+            
+            counts = dict(cursor.fetchall())
+            conn.close()
+            return counts
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return {}
+    
+    def rebuild_reminder_stats(self):
+        """Recount reminder_stats_daily from reminder_logs (archives included) and message_status.
+        
+        Backfills the rollup for logs written before it existed. Returns the
+        number of reminder logs counted, or False on error.
+        """
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            source = history_source_sql(conn, self.db_path, 'reminder_logs')
+            cursor.execute('DELETE FROM reminder_stats_daily')
+            cursor.execute(f'''
+            INSERT INTO reminder_stats_daily
+                (day, reminder_type, channel, sent, successful, tracked, delivered, undelivered)
+            SELECT date(r.sent_at), r.reminder_type, {_log_channel_sql('r')},
+                   COUNT(*),
+                   COALESCE(SUM(r.success = 1), 0),
+                   COUNT(r.provider_sid),
+                   COALESCE(SUM(s.status IN {_sql_list(DELIVERED_STATUSES)}), 0),
+                   COALESCE(SUM(s.status IN {_sql_list(UNDELIVERED_STATUSES)}), 0)
+            FROM {source} r
+            LEFT JOIN message_status s ON s.provider_sid = r.provider_sid
+            WHERE r.sent_at IS NOT NULL
+            GROUP BY 1, 2, 3
+            ''')
+            cursor.execute('SELECT COALESCE(SUM(sent), 0) FROM reminder_stats_daily')
+            counted = cursor.fetchone()[0]
+            
+            conn.commit()
+            conn.close()
+            return counted
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return False
+    
+    def get_reminder_stats(self, start_date=None, end_date=None, granularity='day', by=('reminder_type',)):
+        """Reminder outcomes from reminder_stats_daily between two dates (inclusive, default everything).
+        
+        Rows are per period of `granularity` ("day", "week", "month", "year";
+        None for one row over the whole range) and per `by` column
+        (reminder_type and/or channel). Returns a DataFrame with period (the
+        first day of the period), the `by` columns and STATS_COLUMNS.
+        """
+        by = [column for column in by if column in ('reminder_type', 'channel')]
+        keys = ([f"{STATS_GRANULARITIES[granularity]} AS period"] if granularity else []) + by
+        group_by = list(range(1, len(keys) + 1))
+        query = f'''
+        SELECT {', '.join(keys + [f'SUM({column}) AS {column}' for column in STATS_COLUMNS])}
+        FROM reminder_stats_daily
+        WHERE day >= :start_date AND day <= :end_date
+        {'GROUP BY ' + ', '.join(map(str, group_by)) if group_by else ''}
+        {'ORDER BY ' + ', '.join(map(str, group_by)) if group_by else ''}
+        '''
+        params = {
+            'start_date': start_date.isoformat() if start_date else '0000-01-01',
+            'end_date': end_date.isoformat() if end_date else '9999-12-31',
+        }
+        try:
+            conn = self._connect()
+            df = pd.read_sql_query(query, conn, params=params)
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return pd.DataFrame(columns=(['period'] if granularity else []) + by + STATS_COLUMNS)
+        # SUM over no rows (no grouping and nothing in range) is NULL
+        df[STATS_COLUMNS] = df[STATS_COLUMNS].fillna(0).astype(int)
+        return df
+    
+    def log_email_bounces(self, rows):
+        """Record bounced email addresses in one transaction.
+        
+        Rows are (address, bounce_type, smtp_code, reason, bounced_at) with
+        bounce_type "hard" or "soft". Returns the number of rows written, or
+        False on error.
+        """
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            cursor.executemany('''
+            INSERT INTO email_bounces (address, bounce_type, smtp_code, reason, bounced_at)
+            VALUES (lower(?), ?, ?, ?, ?)
+            ''', rows)
+            
+            conn.commit()
+            conn.close()
+            return len(rows)
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return False
+    
+    def get_suppressed_emails(self, soft_limit=3, days=30):
+        """Lower-cased addresses not to email: any hard bounce, or soft_limit soft bounces in the last `days` days"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            since = (self.clock.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+            cursor.execute('''
+            SELECT address FROM email_bounces
+            GROUP BY address
+            HAVING SUM(bounce_type = 'hard') > 0 OR SUM(bounce_type = 'soft' AND bounced_at >= ?) >= ?
+            ''', (since, soft_limit))
+            
+            addresses = {row[0] for row in cursor.fetchall()}
+            conn.close()
+            return addresses
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return set()
+    
+    def get_email_bounce_counts(self, days=7):
+        """{bounce_type: bounces} over the last `days` days"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            since = (self.clock.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+            cursor.execute('''
+            SELECT bounce_type, COUNT(*) FROM email_bounces WHERE bounced_at >= ? GROUP BY bounce_type
+            ''', (since,))
+            
+            counts = dict(cursor.fetchall())
+            conn.close()
+            return counts
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return {}
+    
     def calculate_next_due_date(self, payment_date, membership_type):
         """Calculate the next due date based on membership type"""
-        if isinstance(payment_date, str):
-            payment_date = datetime.strptime(payment_date, '%Y-%m-%d').date()
-        
-        if membership_type == "Monthly Subscriber":
-            return payment_date + timedelta(days=30)
-        elif membership_type == "Quarterly":
-            return payment_date + timedelta(days=90)
-        elif membership_type == "Half Yearly":
-            return payment_date + timedelta(days=180)
-        elif membership_type == "Annual":
-            return payment_date + timedelta(days=365)
-        else:
-            return payment_date + timedelta(days=30)  # Default to monthly
+        return calculate_next_due_date(payment_date, membership_type)
     
     def get_total_members(self):
         """Get total number of members"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT COUNT(*) FROM members')
-        count = cursor.fetchone()[0]
+        count = self._read_counter(cursor, 'members')
         
         conn.close()
         return count
     
     def get_active_subscriptions(self):
         """Get number of active subscriptions (not overdue)"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         # Consider active if next payment due date is in the future
-        today = datetime.now().date()
+        today = self.clock.today()
         
+        # Same rule as date(payment_date, '+30 days') >= today, read from the
+        # per-date counts (at most ~31 rows) instead of scanning members
         cursor.execute('''
-        SELECT COUNT(*) FROM members m
-        WHERE date(m.payment_date, '+30 days') >= date(?)
+        SELECT COALESCE(SUM(member_count), 0) FROM member_payment_date_counts
+        WHERE payment_date >= date(?, '-30 days')
         ''', (today,))
         
         count = cursor.fetchone()[0]
@@ -416,18 +1231,17 @@ Thank you!""")
     
     def get_total_kids(self):
         """Get total number of kids in training"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT COUNT(*) FROM kids_training WHERE active = TRUE')
-        count = cursor.fetchone()[0]
+        count = self._read_counter(cursor, 'kids_training_active')
         
         conn.close()
         return count
     
     def get_recent_payments(self, limit=5):
         """Get recent payments"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -438,52 +1252,54 @@ Thank you!""")
         LIMIT ?
         ''', (limit,))
         
-        columns = [description[0] for description in cursor.description]
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        results = list(fetch_records(cursor, Payment))
         
         conn.close()
         return results
     
     def search_members(self, search_term="", membership_filter="All", sort_by="Name"):
         """Search and filter members"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        query = '''
-        SELECT * FROM members
-        WHERE 1=1
-        '''
-        params = []
-        
-        if search_term:
-            query += " AND (name LIKE ? OR phone LIKE ? OR email LIKE ?)"
-            params.extend([f"%{search_term}%", f"%{search_term}%", f"%{search_term}%"])
-        
-        if membership_filter != "All":
-            query += " AND membership_type = ?"
-            params.append(membership_filter)
-        
-        # Add sorting
-        if sort_by == "Name":
-            query += " ORDER BY name"
-        elif sort_by == "Payment Date":
-            query += " ORDER BY payment_date DESC"
-        elif sort_by == "Amount":
-            query += " ORDER BY amount DESC"
-        elif sort_by == "Due Date":
-            query += " ORDER BY payment_date ASC"
-        
-        cursor.execute(query, params)
-        columns = [description[0] for description in cursor.description]
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        
-        conn.close()
-        return results
+        return list(self.iter_members(search_term, membership_filter, sort_by))
+    
+    def iter_members(self, search_term="", membership_filter="All", sort_by="Name"):
+        """Iterate over matching members as Member records without loading them all at once"""
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            
+            query = '''
+            SELECT * FROM members
+            WHERE 1=1
+            '''
+            params = []
+            
+            if search_term:
+                query += " AND (name LIKE ? OR phone LIKE ? OR email LIKE ?)"
+                params.extend([f"%{search_term}%", f"%{search_term}%", f"%{search_term}%"])
+            
+            if membership_filter != "All":
+                query += " AND membership_type = ?"
+                params.append(membership_filter)
+            
+            # Add sorting
+            if sort_by == "Name":
+                query += " ORDER BY name"
+            elif sort_by == "Payment Date":
+                query += " ORDER BY payment_date DESC"
+            elif sort_by == "Amount":
+                query += " ORDER BY amount DESC"
+            elif sort_by == "Due Date":
+                query += " ORDER BY payment_date ASC"
+            
+            cursor.execute(query, params)
+            yield from fetch_records(cursor, Member)
+        finally:
+            conn.close()
     
     def update_member(self, member_id, name, phone, email, membership_type, amount, reminder_days, notes):
         """Update member information"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -503,7 +1319,7 @@ Thank you!""")
     def delete_member(self, member_id):
         """Delete a member and their payment history"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             # Delete payment history first (foreign key constraint)
@@ -521,8 +1337,9 @@ Thank you!""")
     # Analytics functions
     def get_revenue_analytics(self):
         """Get comprehensive revenue analytics"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
+        today = self.clock.today().isoformat()
         
         # Total revenue from all payments
         cursor.execute('SELECT SUM(amount) FROM payment_history')
@@ -532,10 +1349,10 @@ Thank you!""")
         cursor.execute('''
         SELECT strftime('%Y-%m', payment_date) as month, SUM(amount) as revenue
         FROM payment_history 
-        WHERE payment_date >= date('now', 'start of year')
+        WHERE payment_date >= date(?, 'start of year')
         GROUP BY strftime('%Y-%m', payment_date)
         ORDER BY month
-        ''')
+        ''', (today,))
         monthly_revenue = [dict(zip(['month', 'revenue'], row)) for row in cursor.fetchall()]
         
         # Revenue by membership type
@@ -555,16 +1372,16 @@ Thank you!""")
         # This month's revenue
         cursor.execute('''
         SELECT SUM(amount) FROM payment_history 
-        WHERE payment_date >= date('now', 'start of month')
-        ''')
+        WHERE payment_date >= date(?, 'start of month')
+        ''', (today,))
         this_month_revenue = cursor.fetchone()[0] or 0
         
         # Last month's revenue for comparison
         cursor.execute('''
         SELECT SUM(amount) FROM payment_history 
-        WHERE payment_date >= date('now', 'start of month', '-1 month')
-        AND payment_date < date('now', 'start of month')
-        ''')
+        WHERE payment_date >= date(?, 'start of month', '-1 month')
+        AND payment_date < date(?, 'start of month')
+        ''', (today, today))
         last_month_revenue = cursor.fetchone()[0] or 0
         
         conn.close()
@@ -580,7 +1397,7 @@ Thank you!""")
     
     def get_membership_analytics(self):
         """Get membership analytics"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         # Membership type distribution
@@ -595,12 +1412,12 @@ Thank you!""")
         # New members this month
         cursor.execute('''
         SELECT COUNT(*) FROM members 
-        WHERE created_at >= date('now', 'start of month')
-        ''')
+        WHERE created_at >= date(?, 'start of month')
+        ''', (self.clock.today().isoformat(),))
         new_members_this_month = cursor.fetchone()[0]
         
         # Payment status overview with proper membership type consideration
-        today = datetime.now().date()
+        today = self.clock.today()
         
         # Get all members and calculate their individual due dates
         cursor.execute('''
@@ -644,7 +1461,7 @@ Thank you!""")
     
     def get_kids_analytics(self):
         """Get kids training analytics"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         # Kids by batch time
@@ -690,7 +1507,7 @@ Thank you!""")
     # Bulk messaging functions
     def get_members_for_bulk_messaging(self, membership_filter="All"):
         """Get members list for bulk messaging with filtering options"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         query = '''
@@ -707,22 +1524,24 @@ Thank you!""")
         query += " ORDER BY name"
         
         cursor.execute(query, params)
-        columns = [description[0] for description in cursor.description]
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        results = list(fetch_records(cursor, Member))
         
         conn.close()
         return results
     
     def get_kids_parents_for_messaging(self):
         """Get kids parents list for bulk messaging"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
+        # One row per parent phone, however many kids they have in training
         cursor.execute('''
-        SELECT DISTINCT parent_name as name, parent_phone as phone, kid_name
+        SELECT MIN(parent_name) as name, parent_phone as phone,
+               GROUP_CONCAT(kid_name, ', ') as kid_names, COUNT(*) as kid_count
         FROM kids_training
         WHERE active = TRUE
-        ORDER BY parent_name
+        GROUP BY parent_phone
+        ORDER BY name
         ''')
         
         columns = [description[0] for description in cursor.description]
@@ -734,13 +1553,13 @@ Thank you!""")
     def log_bulk_message(self, message_text, recipient_count, message_type, sent_by="System"):
         """Log bulk message sending for record keeping"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
-            INSERT INTO bulk_messages_log (message_text, recipient_count, message_type, sent_by)
-            VALUES (?, ?, ?, ?)
-            ''', (message_text, recipient_count, message_type, sent_by))
+            INSERT INTO bulk_messages_log (message_text, recipient_count, message_type, sent_by, sent_at)
+            VALUES (?, ?, ?, ?, ?)
+            ''', (message_text, recipient_count, message_type, sent_by, self.clock.timestamp()))
             
             conn.commit()
             conn.close()
@@ -751,7 +1570,7 @@ Thank you!""")
     
     def get_bulk_message_history(self, limit=10):
         """Get history of bulk messages sent"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -771,7 +1590,7 @@ Thank you!""")
     def record_member_checkin(self, member_id, member_name, phone, usage_type="General Play", notes=""):
         """Record a member check-in"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             # Check if member already has an active check-in (no check-out)
@@ -787,9 +1606,9 @@ Thank you!""")
                 return False, "Member already checked in. Please check out first."
             
             cursor.execute('''
-            INSERT INTO member_checkins (member_id, member_name, phone, court_usage_type, notes)
-            VALUES (?, ?, ?, ?, ?)
-            ''', (member_id, member_name, phone, usage_type, notes))
+            INSERT INTO member_checkins (member_id, member_name, phone, court_usage_type, notes, check_in_time)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''', (member_id, member_name, phone, usage_type, notes, self.clock.timestamp()))
             
             conn.commit()
             conn.close()
@@ -801,7 +1620,7 @@ Thank you!""")
     def record_member_checkout(self, member_id):
         """Record a member check-out"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             # Find the active check-in
@@ -820,15 +1639,15 @@ Thank you!""")
             
             # Calculate duration
             check_in_dt = datetime.strptime(check_in_time, '%Y-%m-%d %H:%M:%S')
-            check_out_dt = datetime.now()
+            check_out_dt = self.clock.now().replace(microsecond=0)
             duration_minutes = int((check_out_dt - check_in_dt).total_seconds() / 60)
             
             # Update with checkout time and duration
             cursor.execute('''
             UPDATE member_checkins 
-            SET check_out_time = CURRENT_TIMESTAMP, duration_minutes = ?
+            SET check_out_time = ?, duration_minutes = ?
             WHERE id = ?
-            ''', (duration_minutes, checkin_id))
+            ''', (check_out_dt.strftime('%Y-%m-%d %H:%M:%S'), duration_minutes, checkin_id))
             
             conn.commit()
             conn.close()
@@ -839,81 +1658,155 @@ Thank you!""")
     
     def get_active_checkins(self):
         """Get all currently active check-ins"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        SELECT id, member_id, member_name, phone, check_in_time, court_usage_type, notes
-        FROM member_checkins
-        WHERE check_out_time IS NULL
-        ORDER BY check_in_time DESC
-        ''')
-        
-        columns = [description[0] for description in cursor.description]
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        
-        conn.close()
-        return results
+        return list(self.iter_active_checkins())
     
-    def get_checkin_history(self, limit=20, member_id=None):
-        """Get check-in history"""
-        conn = sqlite3.connect(self.db_path)
+    def iter_active_checkins(self):
+        """Iterate over currently active check-ins as Checkin records"""
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+            SELECT id, member_id, member_name, phone, check_in_time, court_usage_type, notes
+            FROM member_checkins
+            WHERE check_out_time IS NULL
+            ORDER BY check_in_time DESC
+            ''')
+            yield from fetch_records(cursor, Checkin)
+        finally:
+            conn.close()
+    
+    def get_checkin_history(self, limit=20, member_id=None, since=None):
+        """Get check-in history (falls back to the yearly archives when the hot table runs short)"""
+        conn = self._connect()
         cursor = conn.cursor()
         
-        query = '''
-        SELECT id, member_id, member_name, phone, check_in_time, check_out_time, 
-               duration_minutes, court_usage_type, notes
-        FROM member_checkins
-        WHERE 1=1
-        '''
+        columns = ['id', 'member_id', 'member_name', 'phone', 'check_in_time', 'check_out_time',
+                   'duration_minutes', 'court_usage_type', 'notes']
+        where = "WHERE 1=1"
         params = []
         
         if member_id:
-            query += " AND member_id = ?"
+            where += " AND member_id = ?"
             params.append(member_id)
         
-        query += " ORDER BY check_in_time DESC LIMIT ?"
-        params.append(limit)
+        if since:
+            where += " AND check_in_time >= ?"
+            params.append(since.strftime('%Y-%m-%d %H:%M:%S'))
         
-        cursor.execute(query, params)
-        columns = [description[0] for description in cursor.description]
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        cursor.execute(f'''
+        SELECT {', '.join(columns)}
+        FROM member_checkins
+        {where}
+        ORDER BY check_in_time DESC LIMIT ?
+        ''', params + [limit])
+        rows = cursor.fetchall()
+        
+        # Only look in the archives if the hot table could be missing newer rows
+        archived_before = self._get_archived_before(cursor, 'member_checkins')
+        if archived_before and (len(rows) < limit or rows[-1][4] < archived_before):
+            for year in list_archive_years(self.db_path):
+                if since and year < since.year:
+                    break
+                # Every row in this year's archive is older than the rows we already have
+                if len(rows) >= limit and rows[limit - 1][4] >= f"{year + 1}-01-01":
+                    break
+                
+                schema = attach_archive(conn, self.db_path, year)
+                select_sql = archive_select_sql(conn, schema, 'member_checkins', columns) if schema else None
+                if select_sql:
+                    cursor.execute(f'''
+                    SELECT * FROM ({select_sql})
+                    {where}
+                    ORDER BY check_in_time DESC LIMIT ?
+                    ''', params + [limit])
+                    rows.extend(cursor.fetchall())
+                    rows.sort(key=lambda row: row[4] or '', reverse=True)
+                    cursor.execute(f'DETACH DATABASE {schema}')
+            rows = rows[:limit]
+        
+        build = make_row_factory(Checkin, [(column,) for column in columns])
+        results = [build(row) for row in rows]
         
         conn.close()
         return results
     
+    def iter_reminder_logs(self, member_id=None, reminder_type=None, since=None):
+        """Iterate over reminder logs in the hot table as ReminderLog records, newest first"""
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            
+            query = '''
+            SELECT id, member_id, reminder_type, message, sent_at, success, delivery_id, provider_sid
+            FROM reminder_logs
+            WHERE 1=1
+            '''
+            params = []
+            
+            if member_id:
+                query += " AND member_id = ?"
+                params.append(member_id)
+            
+            if reminder_type:
+                query += " AND reminder_type = ?"
+                params.append(reminder_type)
+            
+            if since:
+                query += " AND sent_at >= ?"
+                params.append(since.strftime('%Y-%m-%d %H:%M:%S'))
+            
+            query += " ORDER BY sent_at DESC"
+            
+            cursor.execute(query, params)
+            yield from fetch_records(cursor, ReminderLog)
+        finally:
+            conn.close()
+    
+    def _get_archived_before(self, cursor, table):
+        """Cutoff of the last archive run for a table (None if it was never archived)"""
+        cursor.execute('SELECT archived_before FROM archive_state WHERE table_name = ?', (table,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    
     def get_checkin_analytics(self, days_back=30):
         """Get check-in analytics for the specified period"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
-        cutoff_date = datetime.now() - timedelta(days=days_back)
+        cutoff_date = self.clock.now() - timedelta(days=days_back)
+        
+        # Include archived visits when the period reaches back past the last archive run
+        source = 'member_checkins'
+        archived_before = self._get_archived_before(cursor, 'member_checkins')
+        if archived_before and cutoff_date.strftime('%Y-%m-%d %H:%M:%S') < archived_before:
+            source = history_source_sql(conn, self.db_path, 'member_checkins', since=cutoff_date)
         
         # Total visits
-        cursor.execute('''
-        SELECT COUNT(*) FROM member_checkins
+        cursor.execute(f'''
+        SELECT COUNT(*) FROM {source}
         WHERE check_in_time >= ?
         ''', (cutoff_date,))
         total_visits = cursor.fetchone()[0]
         
         # Unique visitors
-        cursor.execute('''
-        SELECT COUNT(DISTINCT member_id) FROM member_checkins
+        cursor.execute(f'''
+        SELECT COUNT(DISTINCT member_id) FROM {source}
         WHERE check_in_time >= ?
         ''', (cutoff_date,))
         unique_visitors = cursor.fetchone()[0]
         
         # Average duration
-        cursor.execute('''
-        SELECT AVG(duration_minutes) FROM member_checkins
+        cursor.execute(f'''
+        SELECT AVG(duration_minutes) FROM {source}
         WHERE check_in_time >= ? AND duration_minutes IS NOT NULL
         ''', (cutoff_date,))
         avg_duration = cursor.fetchone()[0] or 0
         
         # Peak hours
-        cursor.execute('''
+        cursor.execute(f'''
         SELECT strftime('%H', check_in_time) as hour, COUNT(*) as count
-        FROM member_checkins
+        FROM {source}
         WHERE check_in_time >= ?
         GROUP BY hour
         ORDER BY count DESC
@@ -922,9 +1815,9 @@ Thank you!""")
         peak_hours = [dict(zip(['hour', 'count'], row)) for row in cursor.fetchall()]
         
         # Daily visits
-        cursor.execute('''
+        cursor.execute(f'''
         SELECT DATE(check_in_time) as date, COUNT(*) as visits
-        FROM member_checkins
+        FROM {source}
         WHERE check_in_time >= ?
         GROUP BY DATE(check_in_time)
         ORDER BY date DESC
@@ -933,9 +1826,9 @@ Thank you!""")
         daily_visits = [dict(zip(['date', 'visits'], row)) for row in cursor.fetchall()]
         
         # Most frequent visitors
-        cursor.execute('''
+        cursor.execute(f'''
         SELECT member_name, COUNT(*) as visit_count
-        FROM member_checkins
+        FROM {source}
         WHERE check_in_time >= ?
         GROUP BY member_id, member_name
         ORDER BY visit_count DESC
@@ -956,7 +1849,7 @@ Thank you!""")
     
     def export_members_data(self):
         """Export all members data as DataFrame"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         
         query = '''
         SELECT 
@@ -972,21 +1865,21 @@ Thank you!""")
             m.created_at,
             m.updated_at,
             CASE 
-                WHEN DATE('now') > DATE(m.payment_date, '+1 month') THEN 'Overdue'
-                WHEN DATE('now') > DATE(m.payment_date, '+' || (30 - m.reminder_days) || ' days') THEN 'Due Soon'
+                WHEN DATE(:today) > DATE(m.payment_date, '+1 month') THEN 'Overdue'
+                WHEN DATE(:today) > DATE(m.payment_date, '+' || (30 - m.reminder_days) || ' days') THEN 'Due Soon'
                 ELSE 'Active'
             END as status
         FROM members m
         ORDER BY m.name
         '''
         
-        df = pd.read_sql_query(query, conn)
+        df = pd.read_sql_query(query, conn, params={'today': self.clock.today().isoformat()})
         conn.close()
         return df
     
     def export_payment_history_data(self):
         """Export all payment history data as DataFrame"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         
         query = '''
         SELECT 
@@ -1009,7 +1902,7 @@ Thank you!""")
     
     def export_kids_training_data(self):
         """Export all kids training data as DataFrame"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         
         query = '''
         SELECT 
@@ -1036,7 +1929,7 @@ Thank you!""")
     
     def export_kids_payment_history_data(self):
         """Export all kids payment history data as DataFrame"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         
         query = '''
         SELECT 
@@ -1058,10 +1951,33 @@ Thank you!""")
         conn.close()
         return df
     
-    def export_checkin_data(self):
-        """Export all check-in data as DataFrame"""
-        conn = sqlite3.connect(self.db_path)
+    def _read_history_frame(self, query, table, sort_by):
+        """Run an export query over the hot table and every yearly archive of it.
+        
+        The query uses {source} where the table name goes. Archives are attached one
+        at a time, so any number of archive years can be exported.
+        """
+        conn = self._connect()
         
+        frames = [pd.read_sql_query(query.format(source=f"main.{table}"), conn)]
+        columns = [row[1] for row in conn.execute(f'PRAGMA main.table_info({table})')]
+        
+        for year in list_archive_years(self.db_path):
+            schema = attach_archive(conn, self.db_path, year)
+            select_sql = archive_select_sql(conn, schema, table, columns) if schema else None
+            if select_sql:
+                frames.append(pd.read_sql_query(query.format(source=f"({select_sql})"), conn))
+            if schema:
+                conn.execute(f'DETACH DATABASE {schema}')
+        
+        conn.close()
+        
+        frames = [frame for frame in frames if not frame.empty] or frames[:1]
+        df = pd.concat(frames, ignore_index=True)
+        return df.sort_values(sort_by, ascending=False, ignore_index=True)
+    
+    def export_checkin_data(self):
+        """Export all check-in data (including archived years) as DataFrame"""
         query = '''
         SELECT 
             mc.id,
@@ -1076,77 +1992,103 @@ Thank you!""")
                 WHEN mc.check_out_time IS NULL THEN 'Active'
                 ELSE 'Completed'
             END as status
-        FROM member_checkins mc
-        ORDER BY mc.check_in_time DESC
+        FROM {source} mc
         '''
         
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df
+        return self._read_history_frame(query, 'member_checkins', 'check_in_time')
     
     def export_reminder_logs_data(self):
-        """Export all reminder logs data as DataFrame"""
-        conn = sqlite3.connect(self.db_path)
-        
+        """Export all reminder logs data (including archived years) as DataFrame"""
         query = '''
         SELECT 
             rl.id,
             m.name as member_name,
             m.phone as member_phone,
             rl.reminder_type,
-            rl.sent_date,
-            rl.next_due_date,
-            rl.message_sent,
-            rl.delivery_status,
-            rl.notes
-        FROM reminder_logs rl
-        JOIN members m ON rl.member_id = m.id
-        ORDER BY rl.sent_date DESC
+            rl.sent_at,
+            rl.message,
+            CASE WHEN rl.success THEN 'Sent' ELSE 'Failed' END as status
+        FROM {source} rl
+        LEFT JOIN members m ON rl.member_id = m.id
         '''
         
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df
+        return self._read_history_frame(query, 'reminder_logs', 'sent_at')
     
     def export_bulk_messages_data(self):
-        """Export all bulk messages data as DataFrame"""
-        conn = sqlite3.connect(self.db_path)
-        
+        """Export all bulk messages data (including archived years) as DataFrame"""
         query = '''
         SELECT 
             bml.id,
-            bml.message_content,
+            bml.message_text,
             bml.recipient_count,
-            bml.sent_date,
+            bml.sent_at,
             bml.sent_by,
-            bml.message_type,
-            bml.delivery_status
-        FROM bulk_messages_log bml
-        ORDER BY bml.sent_date DESC
+            bml.message_type
+        FROM {source} bml
         '''
         
-        df = pd.read_sql_query(query, conn)
+        return self._read_history_frame(query, 'bulk_messages_log', 'sent_at')
+    
+    def get_scheduler_jobs(self):
+        """Daemon jobs with their schedule and last run, plus who holds the daemon lock"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT job_name, schedule, status, last_run_at, next_run_at, last_duration_ms,
+               last_sent_count, last_error, missed_runs, run_count
+        FROM scheduler_jobs
+        ORDER BY job_name
+        ''')
+        columns = [description[0] for description in cursor.description]
+        jobs = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        
+        cursor.execute('SELECT owner, expires_at FROM scheduler_lock')
+        lock = cursor.fetchone()
+        for job in jobs:
+            job['lock_owner'] = lock[0] if lock else None
+            job['lock_expires_at'] = lock[1] if lock else None
+        
         conn.close()
-        return df
+        return jobs
+    
+    def request_job_run(self, job_name):
+        """Ask the daemon to run a job at its next poll instead of waiting for the schedule"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+            UPDATE scheduler_jobs
+            SET next_run_at = ?, status = 'requested', updated_at = CURRENT_TIMESTAMP
+            WHERE job_name = ?
+            ''', (self.clock.timestamp(), job_name))
+            updated = cursor.rowcount > 0
+            
+            conn.commit()
+            conn.close()
+            return updated
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return False
     
     def get_database_summary(self):
         """Get summary statistics for export"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         summary = {}
         
-        # Count all tables
-        tables = ['members', 'payment_history', 'kids_training', 'kids_payment_history', 
-                 'member_checkins', 'reminder_logs', 'bulk_messages_log']
+        # Row counts come from the trigger-maintained counters
+        cursor.execute('SELECT counter_name, row_count FROM table_counters')
+        counters = dict(cursor.fetchall())
+        
+        # Archived rows still count towards the totals
+        cursor.execute('SELECT table_name, archived_rows FROM archive_state')
+        summary['archived'] = dict(cursor.fetchall())
         
-        for table in tables:
-            try:
-                cursor.execute(f'SELECT COUNT(*) FROM {table}')
-                count = cursor.fetchone()[0]
-                summary[table] = count
-            except sqlite3.OperationalError:
-                summary[table] = 0
+        for table in COUNTED_TABLES:
+            summary[table] = counters.get(table, 0) + summary['archived'].get(table, 0)
         
         # Calculate date ranges
         cursor.execute('SELECT MIN(created_at), MAX(created_at) FROM members')
@@ -1157,4 +2099,6 @@ Thank you!""")
             summary['date_range'] = {'start': 'No data', 'end': 'No data'}
         
         conn.close()
-        return summary
\ No newline at end of file
+        return summary
+
+instrument_class(DatabaseManager)
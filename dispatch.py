@@ -0,0 +1,130 @@
+"""Parallel, rate-limited sending of reminder messages.
+
+ReminderDispatcher sends through MessageManager.send_message from a bounded
+thread pool, so Twilio round trips overlap instead of running one after
+another. A token bucket per channel keeps the send rate under the provider's
+per-second limit, and reminder_logs rows for successful sends are written in
+batches from the dispatching thread instead of one connection per message.
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from message_retry import SendResult, PERMANENT
+
+# Messages per second allowed per channel (match the Twilio sender's limits)
+RATE_LIMITS = {
+    "SMS": float(os.getenv("DISPATCH_SMS_PER_SECOND", "30")),
+    "WhatsApp": float(os.getenv("DISPATCH_WHATSAPP_PER_SECOND", "50")),
+}
+DEFAULT_WORKERS = int(os.getenv("DISPATCH_WORKERS", "16"))
+LOG_BATCH_SIZE = 100
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts of up to `capacity`"""
+    
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available and take them"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+class ReminderDispatcher:
+    def __init__(self, message_manager, db_manager, max_workers=DEFAULT_WORKERS, rate_limits=None,
+                 log_batch_size=LOG_BATCH_SIZE, total_rate=None):
+        self.message_manager = message_manager
+        self.db_manager = db_manager
+        self.max_workers = max_workers
+        self.log_batch_size = log_batch_size
+        self.buckets = {channel: TokenBucket(rate) for channel, rate in (rate_limits or RATE_LIMITS).items()}
+        # Messages per second across all channels (send_window.py), on top of the per-channel limits
+        self.total_bucket = TokenBucket(total_rate, capacity=1) if total_rate else None
+    
+    def _send(self, reminder):
+        bucket = self.buckets.get(reminder.get('method', 'SMS'))
+        if bucket is not None:
+            bucket.acquire()
+        if self.total_bucket is not None:
+            self.total_bucket.acquire()
+        return self.message_manager.send_message(
+            phone=reminder['phone'],
+            message=reminder['message'],
+            method=reminder.get('method', 'SMS')
+        )
+    
+    def send_all(self, messages):
+        """Send messages in parallel; yields (message, SendResult) as each send finishes"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._send, message): message for message in messages}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Failed to send message: {str(e)}")
+                    result = SendResult(False, error_class=PERMANENT, error=str(e))
+                yield futures[future], result
+    
+    def dispatch(self, reminders):
+        """Send reminders in parallel and log the successful ones.
+        
+        Each reminder is a dict with phone, message, member_id, reminder_type and
+        optionally method ("SMS" or "WhatsApp"). Returns a dict with sent, failed,
+        elapsed_seconds and per-reminder results.
+        """
+        start = time.perf_counter()
+        results = []
+        pending_logs = []
+        logged = 0
+        
+        for reminder, result in self.send_all(reminders):
+            results.append({
+                'member_id': reminder['member_id'],
+                'reminder_type': reminder['reminder_type'],
+                'phone': reminder['phone'],
+                'success': bool(result)
+            })
+            
+            if result:
+                pending_logs.append((reminder['member_id'], reminder['reminder_type'], reminder['message'], True,
+                                     result.sid, reminder.get('method', 'SMS')))
+                if len(pending_logs) >= self.log_batch_size:
+                    logged += self._flush_logs(pending_logs)
+        
+        logged += self._flush_logs(pending_logs)
+        self.message_manager.flush_attempts(self.db_manager)
+        sent = sum(1 for result in results if result['success'])
+        return {
+            'sent': sent,
+            'failed': len(results) - sent,
+            'logged': logged,
+            'elapsed_seconds': round(time.perf_counter() - start, 2),
+            'results': results,
+        }
+    
+    def _flush_logs(self, pending_logs):
+        if not pending_logs:
+            return 0
+        written = self.db_manager.log_reminders_batch(pending_logs)
+        pending_logs.clear()
+        return written or 0
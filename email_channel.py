@@ -0,0 +1,348 @@
+"""Email channel: pooled SMTP sending, HTML/text reminder emails and bounces.
+
+Usage:
+    SMTP_HOST=smtp.example.com SMTP_USERNAME=... SMTP_PASSWORD=... EMAIL_FROM=court@example.com \\
+        streamlit run app.py
+    python email_channel.py --ingest-bounces bounces/*.eml     # record DSN bounce emails
+
+EmailProvider is the "smtp" provider for the Email channel (see
+providers.py). It keeps up to SMTP_POOL_SIZE authenticated connections open
+in an SmtpPool and reuses them across messages, so a bulk send pays the
+connect/TLS/login handshake once per connection instead of once per email;
+when the server advertises PIPELINING, MAIL FROM and RCPT TO go out in one
+round trip. An Email message is either plain text (an optional
+"Subject: ..." first line, as the Bulk Messaging page writes it) or an
+envelope from compose_email with subject, text and HTML parts; reminders use
+the "<type>_email" HTML templates from message_templates next to the text
+template. Recipients the server refuses are recorded as hard (5xx) or soft
+(4xx) bounces in email_bounces, and addresses that keep bouncing are no
+longer emailed (DatabaseManager.get_suppressed_emails).
+"""
+
+import os
+import json
+import html
+import time
+import queue
+import argparse
+import smtplib
+import threading
+import contextlib
+from collections import deque
+from email import message_from_binary_file, policy
+from email.message import EmailMessage
+from email.utils import make_msgid, formataddr
+
+from utils import validate_email
+from template_engine import render_template, template_values
+from providers import MessageProvider
+from message_retry import SendResult, TRANSIENT, INVALID_NUMBER, PERMANENT
+from clock import DEFAULT_CLOCK
+
+SMTP_HOST = os.getenv("SMTP_HOST", "")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME", "")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+# "starttls", "ssl" (implicit TLS, usually port 465) or "none"
+SMTP_SECURITY = os.getenv("SMTP_SECURITY", "starttls")
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "10"))
+EMAIL_FROM = os.getenv("EMAIL_FROM", "")
+EMAIL_FROM_NAME = os.getenv("EMAIL_FROM_NAME", "KJ Badminton Academy")
+# Idle pooled connections are checked with NOOP before reuse after this long
+SMTP_IDLE_CHECK_SECONDS = 30
+# Connections are closed and reopened after this many messages
+SMTP_MESSAGES_PER_CONNECTION = 500
+BOUNCE_BUFFER_SIZE = 10000
+DEFAULT_SUBJECT = "Message from KJ Badminton Academy"
+
+# Subject line per reminder template type (same placeholders as the templates)
+REMINDER_SUBJECTS = {
+    'payment_reminder': "Payment reminder from {court_name}",
+    'overdue_reminder': "Payment overdue at {court_name}",
+    'final_reminder': "Final notice: payment overdue at {court_name}",
+}
+
+def compose_email(subject, text, html_body=None):
+    """Email channel message with a subject and text and (optional) HTML parts"""
+    return json.dumps({'subject': subject, 'text': text, 'html': html_body}, ensure_ascii=False)
+
+def parse_email(message):
+    """(subject, text, html or None) from an Email channel message"""
+    if message.startswith('{'):
+        try:
+            envelope = json.loads(message)
+            return envelope.get('subject') or DEFAULT_SUBJECT, envelope.get('text', ""), envelope.get('html')
+        except ValueError:
+            pass
+    if message.startswith("Subject:"):
+        subject, _, text = message.partition("\n")
+        return subject[len("Subject:"):].strip() or DEFAULT_SUBJECT, text.lstrip("\n"), None
+    return DEFAULT_SUBJECT, message, None
+
+def email_text(message):
+    """The readable text of an Email channel message, e.g. for reminder_logs"""
+    subject, text, _ = parse_email(message)
+    return f"Subject: {subject}\n\n{text}"
+
+def text_to_html(text):
+    """Simple HTML version of a text message: escaped, paragraphs kept"""
+    paragraphs = [html.escape(paragraph).replace("\n", "<br>") for paragraph in text.split("\n\n") if paragraph]
+    return "".join(f"<p>{paragraph}</p>" for paragraph in paragraphs)
+
+def _reply_text(reply):
+    return reply.decode('utf-8', 'replace') if isinstance(reply, bytes) else str(reply)
+
+def build_mime(from_address, to_address, subject, text, html_body=None):
+    message = EmailMessage()
+    message['From'] = formataddr((EMAIL_FROM_NAME, from_address)) if EMAIL_FROM_NAME else from_address
+    message['To'] = to_address
+    message['Subject'] = subject
+    message['Message-ID'] = make_msgid(domain=from_address.partition('@')[2] or None)
+    message.set_content(text)
+    message.add_alternative(html_body or text_to_html(text), subtype='html')
+    return message
+
+class SmtpPool:
+    """Up to `size` open SMTP connections, handed out one at a time and reused"""
+    
+    def __init__(self, host, port, username=None, password=None, security=SMTP_SECURITY, size=SMTP_POOL_SIZE,
+                 timeout=SMTP_TIMEOUT_SECONDS):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.security = security
+        self.timeout = timeout
+        # (connection, messages sent on it, monotonic time it was last used); newest first
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+        self.stats = {'connects': 0, 'reuses': 0, 'discarded': 0}
+        self.lock = threading.Lock()
+    
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+    
+    def _connect(self):
+        if self.security == "ssl":
+            connection = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.ehlo()
+            if self.security == "starttls":
+                connection.starttls()
+                connection.ehlo()
+            if self.username:
+                connection.login(self.username, self.password)
+        except OSError:
+            self._close(connection)
+            raise
+        self._count('connects')
+        return connection
+    
+    def _close(self, connection):
+        try:
+            connection.quit()
+        except OSError:
+            connection.close()
+    
+    def _discard(self, connection):
+        self._count('discarded')
+        connection.close()
+    
+    def _checkout(self):
+        while True:
+            try:
+                connection, sent, last_used = self.idle.get_nowait()
+            except queue.Empty:
+                return self._connect(), 0
+            if time.monotonic() - last_used > SMTP_IDLE_CHECK_SECONDS:
+                try:
+                    if connection.noop()[0] != 250:
+                        raise smtplib.SMTPServerDisconnected("NOOP failed")
+                except OSError:
+                    self._discard(connection)
+                    continue
+            self._count('reuses')
+            return connection, sent
+    
+    @contextlib.contextmanager
+    def connection(self):
+        """A connection for one message; it goes back to the pool unless the server dropped it"""
+        with self.slots:
+            connection, sent = self._checkout()
+            try:
+                yield connection
+            except smtplib.SMTPServerDisconnected:
+                self._discard(connection)
+                raise
+            except smtplib.SMTPException:
+                # A refused message (reset with RSET) leaves the connection usable
+                self.idle.put((connection, sent + 1, time.monotonic()))
+                raise
+            except BaseException:
+                self._discard(connection)
+                raise
+            if sent + 1 >= SMTP_MESSAGES_PER_CONNECTION:
+                self._close(connection)
+            else:
+                self.idle.put((connection, sent + 1, time.monotonic()))
+    
+    def close(self):
+        while True:
+            try:
+                connection, _, _ = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(connection)
+
+def _send_pipelined(connection, from_address, to_address, data):
+    """MAIL FROM and RCPT TO in one round trip (RFC 2920), then DATA"""
+    connection.send(f"MAIL FROM:<{from_address}>\r\nRCPT TO:<{to_address}>\r\n".encode('ascii'))
+    mail_reply = connection.getreply()
+    rcpt_reply = connection.getreply()
+    if mail_reply[0] != 250:
+        connection.rset()
+        raise smtplib.SMTPSenderRefused(mail_reply[0], mail_reply[1], from_address)
+    if rcpt_reply[0] not in (250, 251):
+        connection.rset()
+        raise smtplib.SMTPRecipientsRefused({to_address: rcpt_reply})
+    code, reply = connection.data(data)
+    if code != 250:
+        connection.rset()
+        raise smtplib.SMTPDataError(code, reply)
+
+class EmailProvider(MessageProvider):
+    name = "smtp"
+    channels = ("Email",)
+    
+    def __init__(self, pool, from_address, clock=DEFAULT_CLOCK):
+        self.pool = pool
+        self.from_address = from_address
+        # Bounces are stamped with this clock, which get_suppressed_emails' window follows too
+        self.clock = clock
+        # (address, bounce_type, smtp_code, reason, bounced_at) until MessageManager.flush_attempts
+        self.bounces = deque(maxlen=BOUNCE_BUFFER_SIZE)
+    
+    @classmethod
+    def from_env(cls):
+        pool = SmtpPool(SMTP_HOST, SMTP_PORT, SMTP_USERNAME or None, SMTP_PASSWORD or None) if SMTP_HOST else None
+        return cls(pool, EMAIL_FROM or SMTP_USERNAME)
+    
+    def configured(self):
+        return self.pool is not None and bool(self.from_address)
+    
+    def _bounce(self, address, code, reason):
+        bounce_type = "hard" if code >= 500 else "soft"
+        self.bounces.append((address.lower(), bounce_type, code, reason, self.clock.timestamp()))
+    
+    def drain_bounces(self):
+        rows = []
+        while self.bounces:
+            try:
+                rows.append(self.bounces.popleft())
+            except IndexError:
+                break
+        return rows
+    
+    def send(self, address, message, channel="Email"):
+        subject, text, html_body = parse_email(message)
+        mime = build_mime(self.from_address, address, subject, text, html_body)
+        data = mime.as_bytes(policy=policy.SMTP)
+        try:
+            with self.pool.connection() as connection:
+                if connection.has_extn('pipelining'):
+                    _send_pipelined(connection, self.from_address, address, data)
+                else:
+                    connection.sendmail(self.from_address, [address], data)
+            return SendResult(True, sid=mime['Message-ID']), None
+        except smtplib.SMTPRecipientsRefused as e:
+            code, reply = next(iter(e.recipients.values()))
+            reason = _reply_text(reply)
+            self._bounce(address, code, reason)
+            error_class = INVALID_NUMBER if code >= 500 else TRANSIENT
+            return SendResult(False, error_class=error_class, code=code, error=reason), None
+        except smtplib.SMTPAuthenticationError as e:
+            return SendResult(False, error_class=PERMANENT, code=e.smtp_code, error=_reply_text(e.smtp_error)), None
+        except smtplib.SMTPResponseException as e:
+            error_class = PERMANENT if e.smtp_code >= 500 else TRANSIENT
+            return SendResult(False, error_class=error_class, code=e.smtp_code, error=_reply_text(e.smtp_error)), None
+        except OSError as e:
+            return SendResult(False, error_class=TRANSIENT, error=str(e) or type(e).__name__), None
+    
+    def close(self):
+        if self.pool:
+            self.pool.close()
+
+def reminder_email(template_type, reminder, text, html_template=None):
+    """Email message for a reminder: its rendered text, html_template (the "<type>_email" template) and a subject"""
+    subject = render_template(REMINDER_SUBJECTS.get(template_type, DEFAULT_SUBJECT), reminder)
+    html_body = None
+    if html_template:
+        values = template_values(reminder)
+        html_body = html_template.render({name: html.escape(value) if isinstance(value, str) else value
+                                          for name, value in values.items()})
+    return compose_email(subject, text, html_body)
+
+def email_address(recipient, suppressed=()):
+    """A recipient's email address when it is set, valid and not suppressed, else None"""
+    address = (recipient.get('email') or "").strip()
+    if not address or not validate_email(address) or address.lower() in suppressed:
+        return None
+    return address
+
+def email_recipients(recipients, suppressed=()):
+    """Recipients that can be emailed, one per address, with 'phone' set to the address"""
+    by_address = {}
+    for recipient in recipients:
+        address = email_address(recipient, suppressed)
+        if address:
+            by_address.setdefault(address.lower(), dict(recipient, phone=address))
+    return list(by_address.values())
+
+def parse_bounce(binary_file):
+    """(address, bounce_type, smtp_code, reason) for each failed recipient in a DSN (RFC 3464) email"""
+    report = message_from_binary_file(binary_file, policy=policy.default)
+    bounces = []
+    for part in report.walk():
+        if part.get_content_type() != 'message/delivery-status':
+            continue
+        # The first block is per-message; each later one is a recipient
+        for fields in part.get_payload()[1:]:
+            action = (fields.get('Action') or "").lower()
+            if action not in ("failed", "delayed"):
+                continue
+            recipient = (fields.get('Final-Recipient') or fields.get('Original-Recipient') or "").partition(';')[2]
+            status = fields.get('Status') or ""
+            diagnostic = fields.get('Diagnostic-Code') or status
+            reason = diagnostic.partition(';')[2].strip() or diagnostic
+            # The server's reply code when the diagnostic has one, else from the status class
+            first = reason.split(' ', 1)[0]
+            code = int(first) if first.isdigit() else 550 if status.startswith('5') else 450
+            bounces.append((recipient.strip().lower(), "hard" if status.startswith('5') else "soft", code, reason))
+    return bounces
+
+def main():
+    from database import DatabaseManager
+    
+    parser = argparse.ArgumentParser(description="Email channel tools")
+    parser.add_argument("--db", default="badminton_court.db")
+    parser.add_argument("--ingest-bounces", nargs="+", metavar="EML", help="Record bounces from DSN emails")
+    args = parser.parse_args()
+    
+    if args.ingest_bounces:
+        db_manager = DatabaseManager(args.db)
+        now = db_manager.clock.timestamp()
+        rows = []
+        for path in args.ingest_bounces:
+            with open(path, 'rb') as f:
+                rows.extend(bounce + (now,) for bounce in parse_bounce(f))
+        written = db_manager.log_email_bounces(rows)
+        print(f"Recorded {written or 0} bounces from {len(args.ingest_bounces)} files")
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+"""Timing for DatabaseManager methods and the SQL statements they run.
+
+Connections opened through open_connection() time every statement (including
+the time spent fetching its rows) and count the rows returned. Public methods
+of instrumented classes are timed as well, and each sample is tagged with the
+Streamlit page that triggered it. Statements slower than SLOW_QUERY_MS are kept
+in a slow log together with their EXPLAIN QUERY PLAN.
+
+Set KJ_QUERY_INSTRUMENTATION=0 to turn all of this off.
+"""
+
+import os
+import re
+import time
+import inspect
+import sqlite3
+import functools
+import threading
+import contextvars
+from bisect import bisect_left
+from collections import deque, Counter
+from datetime import datetime
+
+INSTRUMENTATION_ENABLED = os.getenv("KJ_QUERY_INSTRUMENTATION", "1") not in ("0", "false", "False", "")
+SLOW_QUERY_MS = float(os.getenv("KJ_SLOW_QUERY_MS", "100"))
+# Samples kept per method or statement for the rolling histograms
+HISTOGRAM_WINDOW = 1000
+SLOW_LOG_SIZE = 200
+# Upper bounds (ms) of the histogram buckets; the last bucket is open-ended
+BUCKET_BOUNDS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_current_page = contextvars.ContextVar("current_page", default="-")
+_current_method = contextvars.ContextVar("current_method", default=None)
+_method_observer = contextvars.ContextVar("method_observer", default=None)
+
+def set_current_page(page):
+    """Tag everything recorded from this thread with the given page name"""
+    _current_page.set(page)
+
+def get_current_page():
+    return _current_page.get()
+
+def set_method_observer(observer):
+    """Call observer(name, elapsed_ms) for each outermost instrumented call in this thread.
+    
+    Returns a token for reset_method_observer(). Nested calls (a method calling
+    another instrumented method) are only reported as part of the outer call.
+    """
+    return _method_observer.set(observer)
+
+def reset_method_observer(token):
+    _method_observer.reset(token)
+
+def _notify_observer(name, elapsed_ms):
+    observer = _method_observer.get()
+    if observer is not None:
+        observer(name, elapsed_ms)
+
+def normalize_sql(sql):
+    return re.sub(r'\s+', ' ', sql).strip()
+
+class LatencyHistogram:
+    """Lifetime totals plus a rolling window of recent samples"""
+    
+    def __init__(self, window=HISTOGRAM_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+    
+    def add(self, elapsed_ms, rows=0):
+        self.samples.append(elapsed_ms)
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.rows += rows
+        if elapsed_ms > self.max_ms:
+            self.max_ms = elapsed_ms
+    
+    def percentile(self, pct):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+    
+    def bucket_counts(self):
+        """{bucket label: samples in the window} using BUCKET_BOUNDS_MS"""
+        counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        for elapsed_ms in self.samples:
+            counts[bisect_left(BUCKET_BOUNDS_MS, elapsed_ms)] += 1
+        labels = [f"≤{bound} ms" for bound in BUCKET_BOUNDS_MS] + [f">{BUCKET_BOUNDS_MS[-1]} ms"]
+        return dict(zip(labels, counts))
+    
+    def summary(self):
+        return {
+            'calls': self.count,
+            'total_ms': round(self.total_ms, 2),
+            'avg_ms': round(self.total_ms / self.count, 2) if self.count else 0.0,
+            'p50_ms': round(self.percentile(50), 2),
+            'p95_ms': round(self.percentile(95), 2),
+            'p99_ms': round(self.percentile(99), 2),
+            'max_ms': round(self.max_ms, 2),
+            'rows': self.rows,
+        }
+
+class QueryStats:
+    """Process-wide store of method and statement timings"""
+    
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self.lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self.lock:
+            self.methods = {}
+            self.statements = {}
+            self.method_pages = {}
+            self.slow_log = deque(maxlen=SLOW_LOG_SIZE)
+            self.started_at = datetime.now()
+    
+    def record_method(self, name, elapsed_ms, rows=0):
+        page = get_current_page()
+        with self.lock:
+            histogram = self.methods.get(name)
+            if histogram is None:
+                histogram = self.methods[name] = LatencyHistogram()
+                self.method_pages[name] = Counter()
+            histogram.add(elapsed_ms, rows)
+            self.method_pages[name][page] += 1
+    
+    def record_statement(self, sql, elapsed_ms, rows, plan=None):
+        sql = normalize_sql(sql)
+        method = _current_method.get()
+        with self.lock:
+            entry = self.statements.get(sql)
+            if entry is None:
+                entry = self.statements[sql] = {'histogram': LatencyHistogram(), 'methods': Counter()}
+            entry['histogram'].add(elapsed_ms, rows)
+            entry['methods'][method or '-'] += 1
+            
+            if plan is not None:
+                self.slow_log.append({
+                    'at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    'elapsed_ms': round(elapsed_ms, 2),
+                    'rows': rows,
+                    'method': method or '-',
+                    'page': get_current_page(),
+                    'sql': sql,
+                    'plan': plan,
+                })
+    
+    def top_methods(self, limit=20, sort_by='total_ms'):
+        """Method summaries, slowest first"""
+        with self.lock:
+            rows = []
+            for name, histogram in self.methods.items():
+                summary = histogram.summary()
+                summary['method'] = name
+                summary['pages'] = ", ".join(page for page, _ in self.method_pages[name].most_common(3))
+                rows.append(summary)
+        return sorted(rows, key=lambda row: row[sort_by], reverse=True)[:limit]
+    
+    def top_statements(self, limit=20, sort_by='total_ms'):
+        """Statement summaries, slowest first"""
+        with self.lock:
+            rows = []
+            for sql, entry in self.statements.items():
+                summary = entry['histogram'].summary()
+                summary['sql'] = sql
+                summary['methods'] = ", ".join(method for method, _ in entry['methods'].most_common(3))
+                rows.append(summary)
+        return sorted(rows, key=lambda row: row[sort_by], reverse=True)[:limit]
+    
+    def method_histogram(self, name):
+        with self.lock:
+            histogram = self.methods.get(name)
+            return histogram.bucket_counts() if histogram else {}
+    
+    def slow_queries(self):
+        """Slow log entries, newest first"""
+        with self.lock:
+            return list(reversed(self.slow_log))
+
+query_stats = QueryStats()
+
+def _explain(connection, sql, parameters):
+    """EXPLAIN QUERY PLAN for a statement as readable lines ([] when it can't be explained)"""
+    if parameters is None or not re.match(r'\s*(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b', sql, re.IGNORECASE):
+        return []
+    try:
+        # A plain cursor, so explaining a statement isn't itself recorded
+        cursor = sqlite3.Cursor(connection)
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, parameters)
+        plan = [row[3] for row in cursor.fetchall()]
+        cursor.close()
+        return plan
+    except sqlite3.Error as e:
+        return [f"(plan unavailable: {e})"]
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times each statement from execute until the next one (or close)"""
+    
+    _statement = None
+    
+    def _start(self, sql, parameters):
+        self._finish()
+        self._statement = [sql, parameters, 0.0, 0]
+    
+    def _add(self, elapsed, rows):
+        if self._statement is not None:
+            self._statement[2] += elapsed
+            self._statement[3] += rows
+    
+    def _finish(self):
+        statement = self._statement
+        if statement is None:
+            return
+        self._statement = None
+        sql, parameters, elapsed, rows = statement
+        elapsed_ms = elapsed * 1000
+        plan = None
+        if elapsed_ms >= query_stats.slow_query_ms:
+            plan = _explain(self.connection, sql, parameters)
+        query_stats.record_statement(sql, elapsed_ms, rows, plan)
+    
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._add(time.perf_counter() - start, 0)
+    
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql, ())
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._add(time.perf_counter() - start, 0)
+            if self._statement is not None:
+                # executemany rows are written, not returned; keep the count anyway
+                self._statement[3] = max(self.rowcount, 0)
+                # Parameters vary per row, so there is nothing to explain with
+                self._statement[1] = None
+    
+    def executescript(self, sql_script):
+        self._finish()
+        return super().executescript(sql_script)
+    
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._add(time.perf_counter() - start, 0 if row is None else 1)
+        return row
+    
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._add(time.perf_counter() - start, len(rows))
+        return rows
+    
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._add(time.perf_counter() - start, len(rows))
+        return rows
+    
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._add(time.perf_counter() - start, 0)
+            self._finish()
+            raise
+        self._add(time.perf_counter() - start, 1)
+        return row
+    
+    def close(self):
+        self._finish()
+        super().close()
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors are InstrumentedCursors; commits are timed too"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cursors = []
+    
+    def cursor(self, factory=InstrumentedCursor):
+        cursor = super().cursor(factory)
+        self._cursors.append(cursor)
+        return cursor
+    
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+    
+    def _finish_cursors(self):
+        for cursor in self._cursors:
+            if isinstance(cursor, InstrumentedCursor):
+                cursor._finish()
+    
+    def commit(self):
+        # Close out pending statements so their time doesn't include the commit
+        self._finish_cursors()
+        start = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            query_stats.record_statement("COMMIT", (time.perf_counter() - start) * 1000, 0)
+    
+    def close(self):
+        self._finish_cursors()
+        self._cursors = []
+        super().close()
+
+def open_connection(db_path, **kwargs):
+    """sqlite3.connect(), instrumented unless KJ_QUERY_INSTRUMENTATION is off"""
+    if INSTRUMENTATION_ENABLED:
+        kwargs.setdefault('factory', InstrumentedConnection)
+    return sqlite3.connect(db_path, **kwargs)
+
+def _result_rows(result):
+    if isinstance(result, list):
+        return len(result)
+    if hasattr(result, 'shape'):
+        return result.shape[0]
+    return 0
+
+def instrument_method(function, name):
+    """Wrap one method so each call is recorded under `name`"""
+    if inspect.isgeneratorfunction(function):
+        @functools.wraps(function)
+        def generator_wrapper(*args, **kwargs):
+            generator = function(*args, **kwargs)
+            outermost = _current_method.get() is None
+            start = time.perf_counter()
+            rows = 0
+            try:
+                while True:
+                    # Only tag statements while the generator runs, not between items
+                    token = _current_method.set(_current_method.get() or name)
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        return
+                    finally:
+                        _current_method.reset(token)
+                    rows += 1
+                    yield item
+            finally:
+                generator.close()
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                query_stats.record_method(name, elapsed_ms, rows)
+                if outermost:
+                    _notify_observer(name, elapsed_ms)
+        return generator_wrapper
+    
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        # Nested calls (get_all_kids -> iter_all_kids) keep the outer name for statements
+        outer_method = _current_method.get()
+        token = _current_method.set(outer_method or name)
+        start = time.perf_counter()
+        result = None
+        try:
+            result = function(*args, **kwargs)
+            return result
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            query_stats.record_method(name, elapsed_ms, _result_rows(result))
+            _current_method.reset(token)
+            if outer_method is None:
+                _notify_observer(name, elapsed_ms)
+    return wrapper
+
+def instrument_class(cls):
+    """Wrap every public method of cls (no-op when instrumentation is off)"""
+    if not INSTRUMENTATION_ENABLED:
+        return cls
+    for attribute, value in list(vars(cls).items()):
+        if attribute.startswith('_') or not inspect.isfunction(value):
+            continue
+        setattr(cls, attribute, instrument_method(value, f"{cls.__name__}.{attribute}"))
+    return cls
@@ -0,0 +1,208 @@
+"""Segment-aware SMS cost estimates and a GSM-7 template optimizer.
+
+An SMS is billed per segment. Text made only of GSM-7 characters fits 160
+characters in one segment (153 per segment once it is split); a single
+character outside GSM-7, such as ₹ or an emoji, switches the whole message to
+UCS-2, which fits 70 UTF-16 code units in one segment (67 when split).
+segment_info works out the encoding and segment count of a rendered message,
+estimate_cost adds up the real cost of a bulk send, and optimize_template
+suggests a GSM-7 rewrite of a template with the segments it would save.
+WhatsApp messages are not segmented and are billed per message, as are
+emails (EMAIL_MESSAGE_PRICE, close to nothing on most SMTP relays).
+"""
+
+import os
+import re
+import unicodedata
+from functools import lru_cache
+
+from template_engine import render_template
+
+SMS_SEGMENT_PRICE = float(os.getenv("SMS_SEGMENT_PRICE", "0.0075"))
+WHATSAPP_MESSAGE_PRICE = float(os.getenv("WHATSAPP_MESSAGE_PRICE", "0.005"))
+EMAIL_MESSAGE_PRICE = float(os.getenv("EMAIL_MESSAGE_PRICE", "0.0001"))
+CURRENCY = "USD"
+
+GSM7 = "GSM-7"
+UCS2 = "UCS-2"
+
+# (characters in one segment, characters per segment of a split message)
+SEGMENT_SIZES = {GSM7: (160, 153), UCS2: (70, 67)}
+
+GSM7_BASIC = set(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+# Sent as an escape plus the character, so they take two septets
+GSM7_EXTENSION = set("^{}\\[~]|€\f")
+
+# Common characters in our templates and their GSM-7 stand-ins ('' drops the character)
+GSM7_REPLACEMENTS = {
+    '₹': "Rs.",
+    '‘': "'", '’': "'", '‚': "'", '′': "'",
+    '“': '"', '”': '"', '„': '"', '″': '"',
+    '–': "-", '—': "-", '‐': "-", '−': "-",
+    '…': "...",
+    '•': "-", '·': "-",
+    '\u00a0': " ", '\u2009': " ", '\u202f': " ", '\t': " ",
+    '✓': "", '✔': "", '✅': "", '❌': "",
+}
+
+# Sample recipient used to render templates for the optimizer
+SAMPLE_MEMBER = {
+    'member_name': "Member Name",
+    'amount': 1500,
+    'membership_type': "Monthly Subscriber",
+    'payment_date': "2024-01-01",
+}
+
+class SegmentInfo:
+    """Encoding and segment count of one message"""
+    __slots__ = ('encoding', 'length', 'segments', 'non_gsm')
+    
+    def __init__(self, encoding, length, segments, non_gsm):
+        self.encoding = encoding
+        # Septets for GSM-7, UTF-16 code units for UCS-2
+        self.length = length
+        self.segments = segments
+        # Distinct characters that forced UCS-2, in order of appearance
+        self.non_gsm = non_gsm
+    
+    def __repr__(self):
+        return f"SegmentInfo({self.encoding}, length={self.length}, segments={self.segments})"
+
+_NON_GSM7 = re.compile("[^" + "".join(map(re.escape, sorted(GSM7_BASIC | GSM7_EXTENSION))) + "]")
+# Characters taking two units: escaped ones in GSM-7, surrogate pairs in UCS-2
+_DOUBLE_UNITS = {
+    GSM7: re.compile("[" + "".join(map(re.escape, sorted(GSM7_EXTENSION))) + "]"),
+    UCS2: re.compile("[\U00010000-\U0010FFFF]"),
+}
+
+def _count_segments(length, double_offsets, encoding):
+    single, split = SEGMENT_SIZES[encoding]
+    if length <= single:
+        return 1
+    # An escaped character or a surrogate pair is never split across segments:
+    # a segment that would end in the middle of one ends just before it
+    segments, start = 1, 0
+    while length - start > split:
+        end = start + split
+        if end - 1 in double_offsets:
+            end -= 1
+        start = end
+        segments += 1
+    return segments
+
+@lru_cache(maxsize=4096)
+def segment_info(text):
+    """SegmentInfo for a message; cached, so a bulk send of one text is counted once"""
+    non_gsm = tuple(dict.fromkeys(_NON_GSM7.findall(text)))
+    encoding = UCS2 if non_gsm else GSM7
+    # Unit offset of each two-unit character: its index plus one per two-unit character before it
+    double_offsets = {match.start() + rank for rank, match in enumerate(_DOUBLE_UNITS[encoding].finditer(text))}
+    length = len(text) + len(double_offsets)
+    return SegmentInfo(encoding, length, _count_segments(length, double_offsets, encoding), non_gsm)
+
+def message_cost(text, method="SMS"):
+    if method == "WhatsApp":
+        return WHATSAPP_MESSAGE_PRICE
+    if method == "Email":
+        return EMAIL_MESSAGE_PRICE
+    return segment_info(text).segments * SMS_SEGMENT_PRICE
+
+def estimate_cost(messages, method="SMS"):
+    """Total cost of sending each rendered message in `messages` once"""
+    count = 0
+    segments = 0
+    ucs2_messages = 0
+    max_segments = 0
+    for text in messages:
+        count += 1
+        if method == "Email":
+            continue
+        info = segment_info(text)
+        segments += info.segments
+        ucs2_messages += info.encoding == UCS2
+        max_segments = max(max_segments, info.segments)
+    
+    if method == "WhatsApp":
+        total_cost = count * WHATSAPP_MESSAGE_PRICE
+    elif method == "Email":
+        total_cost = count * EMAIL_MESSAGE_PRICE
+    else:
+        total_cost = segments * SMS_SEGMENT_PRICE
+    return {
+        'recipients': count,
+        'method': method,
+        'segments': segments,
+        'max_segments': max_segments,
+        'ucs2_messages': ucs2_messages,
+        'cost_per_message': total_cost / count if count else 0.0,
+        'total_cost': total_cost,
+        'currency': CURRENCY
+    }
+
+def _gsm_equivalent(char):
+    if char in GSM7_REPLACEMENTS:
+        return GSM7_REPLACEMENTS[char]
+    category = unicodedata.category(char)
+    # Emoji, pictographs and the joiners/variation selectors that go with them
+    if category in ('So', 'Sk', 'Cf', 'Mn'):
+        return ""
+    # Accented letters without a GSM-7 form, e.g. á -> a
+    stripped = "".join(c for c in unicodedata.normalize('NFKD', char) if not unicodedata.combining(c))
+    if stripped and all(c in GSM7_BASIC for c in stripped):
+        return stripped
+    return None
+
+def _strip_trailing_spaces(pieces):
+    while pieces and pieces[-1] == " ":
+        pieces.pop()
+
+def gsm_rewrite(text):
+    """GSM-7 version of text. Returns (rewritten text, {character: replacement}, characters left as they were)"""
+    replaced = {}
+    unchanged = []
+    pieces = []
+    # Only the spaces around a dropped emoji are tidied; the template's own spacing is kept
+    after_drop = False
+    for char in text:
+        if after_drop:
+            if char == " ":
+                # A space on both sides of the emoji (or one at the start of a line) becomes one space
+                if pieces and pieces[-1] not in (" ", "\n"):
+                    pieces.append(char)
+                continue
+            if char == "\n":
+                _strip_trailing_spaces(pieces)
+            after_drop = False
+        if char in GSM7_BASIC or char in GSM7_EXTENSION:
+            pieces.append(char)
+            continue
+        replacement = _gsm_equivalent(char)
+        if replacement is None:
+            pieces.append(char)
+            if char not in unchanged:
+                unchanged.append(char)
+        else:
+            if replacement:
+                pieces.append(replacement)
+            replaced[char] = replacement
+            after_drop = not replacement
+    if after_drop:
+        _strip_trailing_spaces(pieces)
+    return "".join(pieces), replaced, unchanged
+
+def optimize_template(text, sample=SAMPLE_MEMBER):
+    """Segments of a template rendered for `sample`, and a GSM-7 rewrite with its savings"""
+    current = segment_info(render_template(text, sample))
+    suggestion, replaced, unchanged = gsm_rewrite(text)
+    suggested = segment_info(render_template(suggestion, sample))
+    return {
+        'current': current,
+        'suggestion': suggestion if replaced else None,
+        'suggested': suggested,
+        'replaced': replaced,
+        'unchanged': unchanged,
+        'segments_saved': current.segments - suggested.segments,
+    }
@@ -0,0 +1,168 @@
+"""Error classification, retry backoff and circuit breaking for message sends.
+
+Every failed send is classified as throttled (429), transient (5xx, network
+errors and timeouts), invalid_number (the provider rejected the recipient) or
+permanent (any other 4xx, e.g. bad credentials). Throttled and transient
+failures are retried with jittered exponential backoff, waiting at least as
+long as a Retry-After header asks; invalid numbers and permanent errors are
+not retried. A CircuitBreaker per channel stops sending for a cool-down when
+the share of throttled/transient failures in the recent window spikes.
+"""
+
+import os
+import time
+import random
+import threading
+from collections import deque
+
+THROTTLED = "throttled"
+TRANSIENT = "transient"
+INVALID_NUMBER = "invalid_number"
+PERMANENT = "permanent"
+CIRCUIT_OPEN = "circuit_open"
+RETRYABLE = {THROTTLED, TRANSIENT, CIRCUIT_OPEN}
+# Failures another route may not have; a rejected recipient (invalid, opted out) is not tried elsewhere
+FAILOVER = {THROTTLED, TRANSIENT, PERMANENT}
+
+# Twilio error codes for a recipient that can never be reached as given
+INVALID_NUMBER_CODES = {
+    21211,  # Invalid 'To' phone number
+    21214,  # 'To' number cannot be reached
+    21217,  # Phone number does not appear to be valid
+    21407,  # This phone number type does not support SMS
+    21408,  # Permission to send to this region is not enabled
+    21610,  # Recipient has opted out (STOP)
+    21612,  # 'To' number is not currently reachable
+    21614,  # 'To' number is not a valid mobile number
+    63003,  # WhatsApp: channel could not find the recipient
+}
+
+MAX_ATTEMPTS = int(os.getenv("MESSAGE_MAX_ATTEMPTS", "4"))
+BACKOFF_BASE_SECONDS = float(os.getenv("MESSAGE_BACKOFF_BASE_SECONDS", "0.5"))
+BACKOFF_MAX_SECONDS = float(os.getenv("MESSAGE_BACKOFF_MAX_SECONDS", "30"))
+# A channel is paused for CIRCUIT_COOLDOWN_SECONDS when this share of recent sends failed
+CIRCUIT_ERROR_RATE = float(os.getenv("MESSAGE_CIRCUIT_ERROR_RATE", "0.5"))
+CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("MESSAGE_CIRCUIT_COOLDOWN_SECONDS", "30"))
+
+def classify_error(status=None, code=None):
+    """Error class for a failed send; status None means no HTTP response (network error, timeout)"""
+    if status == 429 or code == 20429:
+        return THROTTLED
+    if code in INVALID_NUMBER_CODES:
+        return INVALID_NUMBER
+    if status is None or status >= 500:
+        return TRANSIENT
+    return PERMANENT
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds form); None if absent or unparseable"""
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt, retry_after=None, base=BACKOFF_BASE_SECONDS, cap=BACKOFF_MAX_SECONDS, rng=random):
+    """Seconds to wait before retry number `attempt` (1-based): full jitter, at least Retry-After"""
+    delay = rng.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+    if retry_after is not None:
+        # Spread retries after a throttle so they don't all land at once
+        delay = min(retry_after, cap) + rng.uniform(0, base)
+    return delay
+
+class SendResult:
+    """Outcome of one send_message call (truthy when the message was accepted)"""
+    __slots__ = ('success', 'sid', 'error_class', 'status', 'code', 'error', 'attempts')
+    
+    def __init__(self, success, sid=None, error_class=None, status=None, code=None, error=None, attempts=1):
+        self.success = success
+        self.sid = sid
+        self.error_class = error_class
+        self.status = status
+        self.code = code
+        self.error = error
+        self.attempts = attempts
+    
+    def __bool__(self):
+        return self.success
+    
+    @property
+    def retryable(self):
+        return not self.success and self.error_class in RETRYABLE
+    
+    def __repr__(self):
+        if self.success:
+            return f"SendResult(sent, sid={self.sid}, attempts={self.attempts})"
+        return f"SendResult({self.error_class}, status={self.status}, code={self.code}, attempts={self.attempts})"
+
+class CircuitBreaker:
+    """Opens when the failure rate over the last window_seconds passes error_rate.
+    
+    While open, allow() is False until cooldown_seconds have passed; then one
+    trial send is let through (half-open) and its outcome closes or reopens
+    the circuit. allow() returns a permit that is passed back to record():
+    only the permit of the current trial decides, and a trial that never
+    reports back is replaced by a new one after another cooldown. Only
+    throttled/transient failures count.
+    """
+    
+    def __init__(self, window_seconds=60, min_requests=10, error_rate=CIRCUIT_ERROR_RATE,
+                 cooldown_seconds=CIRCUIT_COOLDOWN_SECONDS, clock=time.monotonic):
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.cooldown_seconds = cooldown_seconds
+        self.clock = clock
+        self.events = deque()
+        self.opened_at = None
+        # The permit handed to the half-open trial and when, or None
+        self.trial = None
+        self.trial_started_at = None
+        self.lock = threading.Lock()
+    
+    @property
+    def state(self):
+        with self.lock:
+            return self._state(self.clock())
+    
+    def _state(self, now):
+        if self.opened_at is None:
+            return "closed"
+        if now - self.opened_at >= self.cooldown_seconds:
+            return "half_open"
+        return "open"
+    
+    def allow(self):
+        """A permit to send (truthy), or False while the circuit is open or its trial is out"""
+        with self.lock:
+            now = self.clock()
+            state = self._state(now)
+            if state == "closed":
+                return True
+            if state == "half_open" and (self.trial is None
+                                         or now - self.trial_started_at >= self.cooldown_seconds):
+                self.trial = object()
+                self.trial_started_at = now
+                return self.trial
+            return False
+    
+    def record(self, failed, permit=None):
+        """Record one provider response; failed means throttled or transient, permit is what allow() returned"""
+        with self.lock:
+            now = self.clock()
+            if self.opened_at is not None:
+                # Only the half-open trial decides; late responses from sends let through earlier are ignored
+                if permit is not None and permit is self.trial:
+                    self.trial = None
+                    if failed:
+                        self.opened_at = now
+                    else:
+                        self.opened_at = None
+                        self.events.clear()
+                return
+            
+            self.events.append((now, failed))
+            while self.events and now - self.events[0][0] > self.window_seconds:
+                self.events.popleft()
+            failures = sum(1 for _, event_failed in self.events if event_failed)
+            if len(self.events) >= self.min_requests and failures / len(self.events) >= self.error_rate:
+                self.opened_at = now
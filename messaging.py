@@ -1,80 +1,212 @@
 import os
-from twilio.rest import Client
-from datetime import datetime
+import time
+import asyncio
+import contextlib
+from collections import deque
+from utils import calculate_next_due_date
+from clock import DEFAULT_CLOCK
+from template_engine import render_template
+from message_cost import estimate_cost
+from message_retry import SendResult, backoff_delay, MAX_ATTEMPTS, PERMANENT, CIRCUIT_OPEN, FAILOVER
+from providers import TwilioProvider, ProviderRouter, REQUEST_TIMEOUT_SECONDS
+
+# Concurrent requests (and pooled keep-alive connections) for bulk sends
+ASYNC_SEND_CONCURRENCY = int(os.getenv("TWILIO_ASYNC_CONCURRENCY", "20"))
+# Per-attempt rows kept in memory until flush_attempts writes them to message_attempts
+ATTEMPT_BUFFER_SIZE = 10000
 
 class MessageManager:
-    def __init__(self):
+    def __init__(self, max_attempts=MAX_ATTEMPTS, router=None, clock=DEFAULT_CLOCK):
         self.account_sid = os.getenv("TWILIO_ACCOUNT_SID", "")
         self.auth_token = os.getenv("TWILIO_AUTH_TOKEN", "")
         self.phone_number = os.getenv("TWILIO_PHONE_NUMBER", "")
+        self.max_attempts = max_attempts
+        self.attempts = deque(maxlen=ATTEMPT_BUFFER_SIZE)
+        self.clock = clock
         
-        # Initialize Twilio client if credentials are available
-        if self.account_sid and self.auth_token:
-            self.client = Client(self.account_sid, self.auth_token)
-        else:
-            self.client = None
+        # Twilio is one provider among those MESSAGE_ROUTES names (providers.py)
+        self.twilio = TwilioProvider(self.account_sid, self.auth_token, self.phone_number)
+        self.router = router or ProviderRouter.from_env({'twilio': self.twilio})
+    
+    @property
+    def client(self):
+        """The Twilio SDK client, or None when Twilio isn't configured"""
+        return self.twilio.client
+    
+    @client.setter
+    def client(self, client):
+        self.twilio.client = client
+    
+    @property
+    def api_base_url(self):
+        return self.twilio.api_base_url
+    
+    @api_base_url.setter
+    def api_base_url(self, base_url):
+        self.twilio.api_base_url = base_url.rstrip('/')
+        if self.twilio.client:
+            self.twilio.client.api.base_url = self.twilio.api_base_url
+    
+    @property
+    def status_callback_url(self):
+        return self.twilio.status_callback_url
+    
+    @status_callback_url.setter
+    def status_callback_url(self, url):
+        self.twilio.status_callback_url = url
+    
+    def is_configured(self, method="SMS"):
+        """True when some provider can send on this channel"""
+        return self.router.configured(method)
+    
+    def _not_configured(self, method):
+        return SendResult(False, error_class=PERMANENT, error=f"No messaging provider configured for {method}",
+                          attempts=0)
+    
+    def _circuit_open(self, phone, method, attempt):
+        result = SendResult(False, error_class=CIRCUIT_OPEN, attempts=attempt - 1,
+                            error=f"{method} sending paused after repeated provider errors")
+        self._record_attempt(phone, method, None, attempt, result, 0.0)
+        return result
     
     def send_message(self, phone, message, method="SMS"):
-        """Send SMS or WhatsApp message using Twilio"""
-        if not self.client:
-            print("Twilio client not initialized. Please check your credentials.")
-            return False
+        """Send an SMS, WhatsApp message or email, retrying throttled and transient failures.
         
-        try:
-            # Format phone number for WhatsApp if needed
-            if method == "WhatsApp":
-                if not phone.startswith("whatsapp:"):
-                    phone = f"whatsapp:{phone}"
-                from_number = f"whatsapp:{self.phone_number}"
-            else:
-                from_number = self.phone_number
-            
-            # Send the message
-            message_obj = self.client.messages.create(
-                body=message,
-                from_=from_number,
-                to=phone
-            )
-            
-            print(f"Message sent successfully! SID: {message_obj.sid}")
-            return True
+        Each attempt tries the channel's routes best first (see providers.py),
+        failing over to the next route when one fails on the provider's side
+        (throttled, transient or permanent error); a recipient rejected as
+        invalid or opted out is not tried on another route. Returns a
+        SendResult, which is truthy when a provider accepted the message.
+        """
+        if not self.router.configured(method):
+            print(f"No messaging provider configured for {method}. Please check your credentials.")
+            return self._not_configured(method)
+        
+        attempt = 0
+        while True:
+            attempt += 1
+            result, retry_after = None, None
+            for route in self.router.candidates(method):
+                permit = route.breaker.allow()
+                if not permit:
+                    continue
+                time.sleep(route.pause_remaining())
+                start = time.perf_counter()
+                result, retry_after = route.provider.send(phone, message, route.channel)
+                latency_ms = (time.perf_counter() - start) * 1000
+                result.attempts = attempt
+                route.record(result, latency_ms, retry_after, permit)
+                self._record_attempt(phone, route.channel, route.provider.name, attempt, result, latency_ms)
+                if result or result.error_class not in FAILOVER:
+                    break
             
-        except Exception as e:
-            print(f"Failed to send message: {str(e)}")
-            return False
-    
-    def format_message(self, template, member_data):
-        """Format message template with member data"""
-        # Default values for message formatting
-        court_name = "KJ Badminton Academy"
-        contact_phone = "+91-9876543210"
+            if result is None:
+                result = self._circuit_open(phone, method, attempt)
+                break
+            if result or not result.retryable or attempt >= self.max_attempts:
+                break
+            time.sleep(backoff_delay(attempt, retry_after))
         
-        # Calculate due date
-        payment_date = member_data.get('payment_date', datetime.now().date())
-        if isinstance(payment_date, str):
-            payment_date = datetime.strptime(payment_date, '%Y-%m-%d').date()
+        if result:
+            print(f"Message sent successfully! SID: {result.sid}")
+        else:
+            print(f"Failed to send message ({result.error_class}): {result.error}")
+        return result
+    
+    def _record_attempt(self, phone, method, provider, attempt, result, latency_ms):
+        self.attempts.append((
+            phone, method, attempt, "sent" if result else result.error_class, result.status, result.code,
+            result.error, result.sid, round(latency_ms, 2), self.clock.timestamp(), provider
+        ))
+    
+    def flush_attempts(self, db_manager):
+        """Write buffered per-attempt outcomes to message_attempts (and email bounces); returns the attempts written"""
+        for provider in self.router.providers.values():
+            if hasattr(provider, 'drain_bounces'):
+                bounces = provider.drain_bounces()
+                if bounces:
+                    db_manager.log_email_bounces(bounces)
         
-        # Calculate next due date based on membership type
-        from database import DatabaseManager
-        db = DatabaseManager()
-        due_date = db.calculate_next_due_date(payment_date, member_data.get('membership_type', 'Monthly Subscriber'))
+        rows = []
+        while self.attempts:
+            try:
+                rows.append(self.attempts.popleft())
+            except IndexError:
+                break
+        if not rows:
+            return 0
+        return db_manager.log_message_attempts(rows) or 0
+    
+    async def _post_message(self, sessions, semaphore, phone, message, method):
+        if not self.router.configured(method):
+            return self._not_configured(method)
         
-        # Calculate overdue days
-        today = datetime.now().date()
-        overdue_days = (today - due_date).days if today > due_date else 0
+        attempt = 0
+        while True:
+            attempt += 1
+            result, retry_after = None, None
+            for route in self.router.candidates(method):
+                permit = route.breaker.allow()
+                if not permit:
+                    continue
+                async with semaphore:
+                    await asyncio.sleep(route.pause_remaining())
+                    start = time.perf_counter()
+                    result, retry_after = await route.provider.send_async(sessions[route.provider.name], phone,
+                                                                          message, route.channel)
+                    latency_ms = (time.perf_counter() - start) * 1000
+                result.attempts = attempt
+                route.record(result, latency_ms, retry_after, permit)
+                self._record_attempt(phone, route.channel, route.provider.name, attempt, result, latency_ms)
+                if result or result.error_class not in FAILOVER:
+                    break
+            
+            if result is None:
+                result = self._circuit_open(phone, method, attempt)
+                break
+            if result or not result.retryable or attempt >= self.max_attempts:
+                break
+            # Sleep outside the semaphore so other sends keep going
+            await asyncio.sleep(backoff_delay(attempt, retry_after))
         
-        # Format template with member data
-        formatted_message = template.format(
-            member_name=member_data.get('member_name', 'Member'),
-            amount=member_data.get('amount', 0),
-            due_date=due_date.strftime('%d-%m-%Y'),
-            membership_type=member_data.get('membership_type', 'Monthly Subscriber'),
-            overdue_days=overdue_days,
-            court_name=court_name,
-            phone=contact_phone
-        )
+        if not result:
+            print(f"Failed to send message ({result.error_class}): {result.error}")
+        return result
+    
+    async def _send_messages_async(self, messages, concurrency, timeout):
+        async with contextlib.AsyncExitStack() as stack:
+            # One session per provider for the whole batch (Twilio's keeps connections alive and reuses them)
+            sessions = {}
+            for provider in self.router.providers.values():
+                if provider.configured():
+                    sessions[provider.name] = await stack.enter_async_context(
+                        provider.async_session(concurrency, timeout))
+            semaphore = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(
+                self._post_message(sessions, semaphore, item['phone'], item['message'], item.get('method', 'SMS'))
+                for item in messages
+            ))
+    
+    def send_messages_concurrently(self, messages, concurrency=ASYNC_SEND_CONCURRENCY,
+                                   timeout=REQUEST_TIMEOUT_SECONDS):
+        """Send already formatted messages (dicts with phone, message, method) over pooled sessions.
         
-        return formatted_message
+        Returns one SendResult per message, in order. Blocks until all are done.
+        """
+        if not messages:
+            return []
+        if not any(self.router.configured(item.get('method', 'SMS')) for item in messages):
+            print("No messaging provider configured. Please check your credentials.")
+            return [self._not_configured(item.get('method', 'SMS')) for item in messages]
+        return asyncio.run(self._send_messages_async(messages, concurrency, timeout))
+    
+    def format_message(self, template, member_data, due_date_fn=calculate_next_due_date):
+        """Format message template with member data.
+        
+        template is the template text or a CompiledTemplate; due_date_fn(payment_date,
+        membership_type) gives the due date when member_data has no next_due_date.
+        """
+        return render_template(template, member_data, due_date_fn, self.clock.today())
     
     def send_bulk_messages(self, recipients, message_template, method="SMS"):
         """Send bulk messages to multiple recipients"""
@@ -88,11 +220,28 @@ class MessageManager:
                 'member_id': recipient.get('member_id'),
                 'member_name': recipient.get('member_name'),
                 'phone': recipient.get('phone'),
-                'success': success
+                'success': bool(success)
             })
         
         return results
     
+    def send_bulk_messages_async(self, recipients, message_template, method="SMS",
+                                 concurrency=ASYNC_SEND_CONCURRENCY, timeout=REQUEST_TIMEOUT_SECONDS):
+        """Send bulk messages concurrently; same results as send_bulk_messages"""
+        messages = [{
+            'phone': recipient['phone'],
+            'message': self.format_message(message_template, recipient),
+            'method': method
+        } for recipient in recipients]
+        successes = self.send_messages_concurrently(messages, concurrency, timeout)
+        
+        return [{
+            'member_id': recipient.get('member_id'),
+            'member_name': recipient.get('member_name'),
+            'phone': recipient.get('phone'),
+            'success': bool(success)
+        } for recipient, success in zip(recipients, successes)]
+    
     def test_connection(self):
         """Test Twilio connection"""
         if not self.client:
@@ -105,21 +254,6 @@ class MessageManager:
         except Exception as e:
             return False, f"Connection failed: {str(e)}"
     
-    def get_message_cost_estimate(self, recipients_count, method="SMS"):
-        """Estimate cost for bulk messages"""
-        # Approximate costs (may vary by region)
-        cost_per_sms = 0.0075  # $0.0075 per SMS
-        cost_per_whatsapp = 0.005  # $0.005 per WhatsApp message
-        
-        if method == "WhatsApp":
-            total_cost = recipients_count * cost_per_whatsapp
-        else:
-            total_cost = recipients_count * cost_per_sms
-        
-        return {
-            'recipients': recipients_count,
-            'method': method,
-            'cost_per_message': cost_per_whatsapp if method == "WhatsApp" else cost_per_sms,
-            'total_cost': total_cost,
-            'currency': 'USD'
-        }
+    def get_message_cost_estimate(self, recipients_count, method="SMS", message=None):
+        """Estimate cost for bulk messages, counting the SMS segments `message` takes (one when not given)"""
+        return estimate_cost([message or ""] * recipients_count, method)
@@ -0,0 +1,388 @@
+"""Transactional outbox for outgoing messages.
+
+Messages are first written to the outbox table under an idempotency key
+(for reminders: reminder type, member and due date), so enqueueing the same
+reminder twice is a no-op. A worker claims pending rows in batches, sends
+them through ReminderDispatcher and marks each one sent or failed; the
+reminder_logs row for a sent reminder is written in the same transaction that
+marks it sent (one per kid or member for a household message, see
+coalesce.py). Throttled and transient failures are retried with exponential
+backoff up to max_attempts (invalid numbers are given up on at once), and
+rows claimed by a worker that died are picked up again once the claim times
+out, so sending resumes after a restart without rescanning members.
+Automatic reminders are spread over the send window (send_window.py): each
+row's planned slot is its next_attempt_at, and rows are claimed by priority
+(overdue first) and then slot. Bulk announcements are not shaped: drain_all
+sends them over MessageManager's pooled async path as soon as they are due.
+"""
+
+import os
+import json
+import socket
+import sqlite3
+import hashlib
+from datetime import timedelta
+
+from instrumentation import open_connection
+from dispatch import ReminderDispatcher
+from email_channel import email_text
+from send_window import SEND_WINDOW
+from clock import DEFAULT_CLOCK
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+RETRY_BASE_SECONDS = 60
+# A row stuck in 'sending' this long belongs to a worker that died
+CLAIM_TIMEOUT_SECONDS = int(os.getenv("OUTBOX_CLAIM_TIMEOUT_SECONDS", "600"))
+CLAIM_BATCH_SIZE = 100
+
+# Announcement rows claimed per concurrent send
+ANNOUNCEMENT_BATCH_SIZE = 500
+
+# Claim order: lower first
+PRIORITY_OVERDUE = 0
+PRIORITY_NORMAL = 1
+
+OUTBOX_COLUMNS = ['id', 'idempotency_key', 'source', 'channel', 'phone', 'message', 'member_id', 'log_type',
+                  'log_targets', 'status', 'attempts', 'max_attempts', 'priority', 'next_attempt_at']
+
+def reminder_key(reminder_type, member_id, due_date):
+    """Idempotency key for a payment reminder: one per member, type and due date"""
+    if hasattr(due_date, 'isoformat'):
+        due_date = due_date.isoformat()
+    return f"{reminder_type}:{member_id}:{due_date}"
+
+def announcement_key(message, phone, sent_on=None):
+    """Idempotency key for a bulk announcement: the same text to the same phone once a day"""
+    digest = hashlib.sha1(message.encode('utf-8')).hexdigest()[:16]
+    sent_on = sent_on or DEFAULT_CLOCK.today()
+    return f"announcement:{digest}:{sent_on.isoformat()}:{phone}"
+
+class Outbox:
+    def __init__(self, db_manager, max_attempts=MAX_ATTEMPTS, claim_timeout_seconds=CLAIM_TIMEOUT_SECONDS,
+                 send_window=SEND_WINDOW, clock=None):
+        self.db_manager = db_manager
+        self.db_path = db_manager.db_path
+        self.max_attempts = max_attempts
+        self.claim_timeout_seconds = claim_timeout_seconds
+        # None sends everything as soon as it is due
+        self.send_window = send_window
+        # Slots, retries and claims follow the database's clock unless given another
+        self.clock = clock or db_manager.clock
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    
+    def enqueue(self, messages):
+        """Add messages to the outbox; returns how many were new.
+        
+        Each message is a dict with idempotency_key, source, phone, message and
+        optionally channel ("SMS"/"WhatsApp"/"Email", with the address in
+        phone for Email), member_id, log_type (the reminder_logs type written
+        when it is sent; None for no log row) and priority (PRIORITY_OVERDUE
+        or PRIORITY_NORMAL). A household message lists every (member_id,
+        log_type) it covers in log_targets instead, and the idempotency keys of
+        the reminders it covers in covers; those are recorded in outbox_keys in
+        the same transaction, so queued_keys reports them as queued too.
+        """
+        now = self.clock.timestamp()
+        rows = [(message['idempotency_key'], message['source'], message.get('channel', 'SMS'), message['phone'],
+                 message['message'], message.get('member_id'), message.get('log_type'),
+                 json.dumps(message['log_targets']) if message.get('log_targets') else None,
+                 self.max_attempts, now, message.get('priority', PRIORITY_NORMAL), now)
+                for message in messages]
+        covered = [(key, message['idempotency_key']) for message in messages for key in message.get('covers', ())]
+        try:
+            conn = open_connection(self.db_path)
+            cursor = conn.cursor()
+            before = conn.total_changes
+            cursor.executemany('''
+            INSERT OR IGNORE INTO outbox (idempotency_key, source, channel, phone, message, member_id, log_type,
+                                          log_targets, max_attempts, next_attempt_at, priority, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            added = conn.total_changes - before
+            cursor.executemany('''
+            INSERT OR IGNORE INTO outbox_keys (idempotency_key, outbox_id)
+            SELECT ?, id FROM outbox WHERE idempotency_key = ?
+            ''', covered)
+            conn.commit()
+            conn.close()
+            return added
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return 0
+    
+    def queued_keys(self, keys):
+        """The idempotency keys among `keys` that are already in the outbox, on their own or in a household message"""
+        keys = list(keys)
+        queued = set()
+        try:
+            conn = open_connection(self.db_path)
+            cursor = conn.cursor()
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ', '.join('?' * len(chunk))
+                cursor.execute(f'''
+                SELECT idempotency_key FROM outbox WHERE idempotency_key IN ({placeholders})
+                UNION ALL
+                SELECT idempotency_key FROM outbox_keys WHERE idempotency_key IN ({placeholders})
+                ''', chunk + chunk)
+                queued.update(row[0] for row in cursor.fetchall())
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+        return queued
+    
+    def plan(self, source="reminder", now=None):
+        """Spread pending, not yet attempted rows from `source` over the send window.
+        
+        Rows are given slots in priority order (overdue first), keeping their
+        previous order within a priority, and each slot is stored as the row's
+        next_attempt_at in one transaction. Returns the number of rows planned
+        (0 when there is no send window).
+        """
+        if self.send_window is None:
+            return 0
+        try:
+            conn = open_connection(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('''
+            SELECT id FROM outbox
+            WHERE status = 'pending' AND attempts = 0 AND source = ?
+            ORDER BY priority, next_attempt_at, id
+            ''', (source,))
+            ids = [row[0] for row in cursor.fetchall()]
+            slots = self.send_window.slots(len(ids), now or self.clock.now())
+            cursor.executemany('''
+            UPDATE outbox SET next_attempt_at = ? WHERE id = ? AND status = 'pending'
+            ''', [(slot.strftime(TIMESTAMP_FORMAT), row_id) for slot, row_id in zip(slots, ids)])
+            conn.commit()
+            conn.close()
+            return len(ids)
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return 0
+    
+    def claim_batch(self, limit=CLAIM_BATCH_SIZE, due_by=None, source=None):
+        """Atomically claim up to `limit` rows due by `due_by` (default now) for this worker and return them as dicts.
+        
+        source limits the claim to rows from one source (None: any).
+        """
+        now = self.clock.now()
+        due_by = due_by or now
+        stale_before = (now - timedelta(seconds=self.claim_timeout_seconds)).strftime(TIMESTAMP_FORMAT)
+        try:
+            conn = open_connection(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute(f'''
+            UPDATE outbox
+            SET status = 'sending', claimed_by = ?, claimed_at = ?, attempts = attempts + 1
+            WHERE id IN (
+                SELECT id FROM outbox
+                WHERE ((status = 'pending' AND next_attempt_at <= ?)
+                       OR (status = 'sending' AND claimed_at < ?))
+                  AND (? IS NULL OR source = ?)
+                ORDER BY priority, next_attempt_at, id
+                LIMIT ?
+            )
+            RETURNING {', '.join(OUTBOX_COLUMNS)}
+            ''', (self.worker_id, now.strftime(TIMESTAMP_FORMAT), due_by.strftime(TIMESTAMP_FORMAT), stale_before,
+                  source, source, limit))
+            claimed = [dict(zip(OUTBOX_COLUMNS, row)) for row in cursor.fetchall()]
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return []
+        return sorted(claimed, key=lambda row: (row['priority'], row['next_attempt_at'], row['id']))
+    
+    def mark_sent(self, rows):
+        """Mark rows sent and write their reminder_logs rows in one transaction; False if it failed"""
+        if not rows:
+            return True
+        now = self.clock.timestamp()
+        logs = []
+        for row in rows:
+            if row['log_targets']:
+                targets = json.loads(row['log_targets'])
+            elif row['log_type']:
+                targets = [(row['member_id'], row['log_type'])]
+            else:
+                targets = []
+            # Email rows hold a JSON envelope; the log gets its subject and text
+            message = email_text(row['message']) if row['channel'] == "Email" else row['message']
+            logs.extend((member_id, log_type, message, row['idempotency_key'], row.get('provider_sid'), row['channel'],
+                         now)
+                        for member_id, log_type in targets)
+        
+        try:
+            conn = open_connection(self.db_path)
+            cursor = conn.cursor()
+            cursor.executemany('''
+            UPDATE outbox SET status = 'sent', sent_at = ?, last_error = NULL, provider_sid = ?
+            WHERE id = ? AND claimed_by = ?
+            ''', [(now, row.get('provider_sid'), row['id'], self.worker_id) for row in rows])
+            cursor.executemany('''
+            INSERT INTO reminder_logs (member_id, reminder_type, message, success, delivery_id, provider_sid, channel,
+                                       sent_at)
+            VALUES (?, ?, ?, 1, ?, ?, ?, ?)
+            ''', logs)
+            conn.commit()
+            conn.close()
+            return True
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return False
+    
+    def mark_failed(self, failures):
+        """Schedule retries with exponential backoff for (row, SendResult) pairs.
+        
+        Rows whose error can't be fixed by retrying (invalid number, permanent
+        error) or that reached max_attempts are marked failed. Returns how many
+        were given up on, or None if the update failed.
+        """
+        if not failures:
+            return 0
+        now = self.clock.now()
+        updates = []
+        given_up = 0
+        for row, result in failures:
+            error = f"{result.error_class}: {result.error}"
+            if not result.retryable or row['attempts'] >= row['max_attempts']:
+                updates.append(('failed', None, error, row['id'], self.worker_id))
+                given_up += 1
+            else:
+                retry_at = now + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (row['attempts'] - 1))
+                if self.send_window is not None and row['source'] == "reminder":
+                    retry_at = self.send_window.next_open(retry_at)
+                updates.append(('pending', retry_at.strftime(TIMESTAMP_FORMAT), error, row['id'], self.worker_id))
+        
+        try:
+            conn = open_connection(self.db_path)
+            cursor = conn.cursor()
+            cursor.executemany('''
+            UPDATE outbox
+            SET status = ?, next_attempt_at = COALESCE(?, next_attempt_at), last_error = ?, claimed_by = NULL
+            WHERE id = ? AND claimed_by = ?
+            ''', updates)
+            conn.commit()
+            conn.close()
+            return given_up
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return None
+    
+    def release(self, rows):
+        """Hand claimed rows back unsent: pending again, without counting the attempt"""
+        if not rows:
+            return True
+        try:
+            conn = open_connection(self.db_path)
+            cursor = conn.cursor()
+            cursor.executemany('''
+            UPDATE outbox SET status = 'pending', claimed_by = NULL, attempts = attempts - 1
+            WHERE id = ? AND claimed_by = ? AND status = 'sending'
+            ''', [(row['id'], self.worker_id) for row in rows])
+            conn.commit()
+            conn.close()
+            return True
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return False
+    
+    def drain(self, message_manager, batch_size=CLAIM_BATCH_SIZE, dispatcher=None, use_async=False, source=None):
+        """Send everything that is due, batch by batch. Returns counts of sent, retrying and failed rows.
+        
+        source limits the drain to rows from one source. use_async sends each
+        batch with MessageManager.send_messages_concurrently (one pooled HTTP
+        session) instead of the rate-limited thread pool, which is paced at the
+        send window's rate unless only announcements are drained. Only rows due
+        when the drain starts are sent, so a drain following a dense send plan
+        stops instead of keeping up with it; the next drain continues. If
+        sending or recording a batch fails, its unsent rows are released for the
+        next drain and this one stops.
+        """
+        if dispatcher is None and not use_async:
+            # The send window paces reminders; announcements go out as fast as the providers take them
+            total_rate = (self.send_window.rate_per_second if self.send_window and source in (None, "reminder")
+                          else None)
+            dispatcher = ReminderDispatcher(message_manager, self.db_manager, total_rate=total_rate)
+        totals = {'sent': 0, 'retrying': 0, 'failed': 0}
+        due_by = self.clock.now()
+        
+        while True:
+            batch = self.claim_batch(batch_size, due_by, source)
+            if not batch:
+                break
+            
+            messages = [dict(row, method=row['channel']) for row in batch]
+            sent, failed = [], []
+            try:
+                if use_async:
+                    outcomes = zip(batch, message_manager.send_messages_concurrently(messages))
+                else:
+                    outcomes = dispatcher.send_all(messages)
+                for row, result in outcomes:
+                    if result:
+                        sent.append(dict(row, provider_sid=result.sid))
+                    else:
+                        failed.append((row, result))
+            except Exception:
+                done = {row['id'] for row in sent}
+                self.mark_sent(sent)
+                self.release([row for row in batch if row['id'] not in done])
+                raise
+            
+            if not self.mark_sent(sent):
+                # These went out: leave them claimed rather than send them again on the next drain
+                self.release([row for row, _ in failed])
+                break
+            given_up = self.mark_failed(failed)
+            message_manager.flush_attempts(self.db_manager)
+            if given_up is None:
+                self.release([row for row, _ in failed])
+                break
+            totals['sent'] += len(sent)
+            totals['failed'] += given_up
+            totals['retrying'] += len(failed) - given_up
+        
+        return totals
+    
+    def drain_all(self, message_manager):
+        """Drain reminders through the paced dispatcher, then announcements over the pooled async path"""
+        totals = self.drain(message_manager, source="reminder")
+        announcements = self.drain(message_manager, batch_size=ANNOUNCEMENT_BATCH_SIZE, use_async=True,
+                                   source="announcement")
+        return {key: totals[key] + announcements[key] for key in totals}
+    
+    def get_plan_summary(self):
+        """Pending rows and the first and last time one of them is due (None when nothing is pending)"""
+        try:
+            conn = open_connection(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('''
+            SELECT COUNT(*), SUM(priority = ?), MIN(next_attempt_at), MAX(next_attempt_at)
+            FROM outbox WHERE status = 'pending'
+            ''', (PRIORITY_OVERDUE,))
+            pending, overdue, first_at, last_at = cursor.fetchone()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return None
+        if not pending:
+            return None
+        return {'pending': pending, 'overdue': overdue, 'first_at': first_at, 'last_at': last_at}
+    
+    def get_status_counts(self):
+        """{status: number of rows}"""
+        try:
+            conn = open_connection(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('SELECT status, COUNT(*) FROM outbox GROUP BY status')
+            counts = dict(cursor.fetchall())
+            conn.close()
+            return counts
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return {}
+
@@ -0,0 +1,356 @@
+"""Messaging providers and failover routing.
+
+A provider delivers messages on one or more channels ("SMS", "WhatsApp",
+"Email").
+send() makes a single attempt and returns (SendResult, Retry-After seconds or
+None); retries, backoff and failover are left to MessageManager. Providers
+are registered by name (register_provider) and built from the environment:
+
+    twilio  Twilio Messages API (TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN,
+            TWILIO_PHONE_NUMBER, TWILIO_API_BASE_URL)
+    file    appends each message as a JSON line to MESSAGE_FILE_PATH
+            ("-" for stdout); never sends anything, for local testing
+    smtp    pooled SMTP connections for the Email channel (SMTP_HOST,
+            EMAIL_FROM, ...; see email_channel.py)
+
+MESSAGE_ROUTES lists, per channel, the provider:channel routes to try in
+order, e.g. "WhatsApp=twilio:WhatsApp,twilio:SMS;SMS=twilio:SMS,file:SMS".
+ProviderRouter keeps a health score (moving average of provider errors),
+a latency average and a CircuitBreaker per route, and orders the candidates
+for each send: healthy routes first, in the configured order ("priority")
+or fastest first ("latency", MESSAGE_ROUTING_STRATEGY), with routes whose
+circuit is open left out. A send fails over to the next candidate only
+for provider-side errors, never for an invalid or opted-out recipient.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import threading
+import contextlib
+
+import aiohttp
+from requests.exceptions import RequestException
+from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
+from twilio.base.exceptions import TwilioRestException, TwilioServiceException
+
+from message_retry import (SendResult, CircuitBreaker, classify_error, parse_retry_after,
+                           THROTTLED, TRANSIENT, PERMANENT)
+from clock import DEFAULT_CLOCK
+
+TWILIO_API_BASE_URL = os.getenv("TWILIO_API_BASE_URL", "https://api.twilio.com")
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("TWILIO_REQUEST_TIMEOUT_SECONDS", "10"))
+# Where Twilio posts delivery status updates (status_webhook.py); empty for none
+STATUS_CALLBACK_URL = os.getenv("TWILIO_STATUS_CALLBACK_URL", "")
+
+DEFAULT_ROUTES = "WhatsApp=twilio:WhatsApp,twilio:SMS;SMS=twilio:SMS;Email=smtp:Email"
+ROUTES = os.getenv("MESSAGE_ROUTES", DEFAULT_ROUTES)
+ROUTING_STRATEGY = os.getenv("MESSAGE_ROUTING_STRATEGY", "priority")
+# Weight of the newest outcome in a route's moving averages
+HEALTH_SMOOTHING = 0.2
+# Routes scoring below this are only tried after the healthy ones
+HEALTHY_SCORE = 0.5
+# An unhealthy route is put back in front for one probe send after this long without sends
+HEALTH_PROBE_SECONDS = float(os.getenv("MESSAGE_HEALTH_PROBE_SECONDS", "60"))
+
+class _RetryAfterHttpClient(TwilioHttpClient):
+    """Twilio HTTP client that remembers the Retry-After header of each thread's last response"""
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._local = threading.local()
+    
+    def request(self, *args, **kwargs):
+        self._local.retry_after = None
+        response = super().request(*args, **kwargs)
+        self._local.retry_after = (response.headers or {}).get('Retry-After')
+        return response
+    
+    def last_retry_after(self):
+        return parse_retry_after(getattr(self._local, 'retry_after', None))
+
+class MessageProvider:
+    """Base class for providers; subclasses set name and channels and implement send()"""
+    name = None
+    channels = ("SMS", "WhatsApp")
+    
+    def configured(self):
+        return True
+    
+    def send(self, phone, message, channel):
+        """One delivery attempt; returns (SendResult, Retry-After seconds or None)"""
+        raise NotImplementedError
+    
+    def async_session(self, concurrency, timeout):
+        """Async context manager for whatever send_async shares across a batch"""
+        return contextlib.nullcontext()
+    
+    async def send_async(self, session, phone, message, channel):
+        return await asyncio.to_thread(self.send, phone, message, channel)
+
+class TwilioProvider(MessageProvider):
+    name = "twilio"
+    
+    def __init__(self, account_sid, auth_token, phone_number, api_base_url=TWILIO_API_BASE_URL,
+                 status_callback_url=STATUS_CALLBACK_URL):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.phone_number = phone_number
+        self.api_base_url = api_base_url.rstrip('/')
+        self.status_callback_url = status_callback_url
+        if account_sid and auth_token:
+            self.client = Client(account_sid, auth_token,
+                                 http_client=_RetryAfterHttpClient(timeout=REQUEST_TIMEOUT_SECONDS))
+            # Lets the SDK talk to a local stand-in (twilio_standin.py) instead of api.twilio.com
+            self.client.api.base_url = self.api_base_url
+        else:
+            self.client = None
+    
+    @classmethod
+    def from_env(cls):
+        return cls(os.getenv("TWILIO_ACCOUNT_SID", ""), os.getenv("TWILIO_AUTH_TOKEN", ""),
+                   os.getenv("TWILIO_PHONE_NUMBER", ""))
+    
+    def configured(self):
+        return self.client is not None
+    
+    def _addresses(self, phone, channel):
+        """(to, from) numbers for the channel, with the whatsapp: prefix when needed"""
+        if phone.startswith("whatsapp:"):
+            phone = phone[len("whatsapp:"):]
+        if channel == "WhatsApp":
+            return f"whatsapp:{phone}", f"whatsapp:{self.phone_number}"
+        return phone, self.phone_number
+    
+    def send(self, phone, message, channel):
+        """One Messages API call through the SDK"""
+        to, from_number = self._addresses(phone, channel)
+        options = {'status_callback': self.status_callback_url} if self.status_callback_url else {}
+        try:
+            message_obj = self.client.messages.create(
+                body=message,
+                from_=from_number,
+                to=to,
+                **options
+            )
+            return SendResult(True, sid=message_obj.sid), None
+        except (TwilioRestException, TwilioServiceException) as e:
+            retry_after = self.client.http_client.last_retry_after() if e.status == 429 else None
+            return SendResult(False, error_class=classify_error(e.status, e.code), status=e.status, code=e.code,
+                              error=getattr(e, 'msg', None) or str(e)), retry_after
+        except RequestException as e:
+            return SendResult(False, error_class=TRANSIENT, error=str(e)), None
+        except Exception as e:
+            return SendResult(False, error_class=PERMANENT, error=str(e)), None
+    
+    def async_session(self, concurrency, timeout):
+        # One session for the whole batch: connections are kept alive and reused
+        return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency),
+                                     timeout=aiohttp.ClientTimeout(total=timeout),
+                                     auth=aiohttp.BasicAuth(self.account_sid, self.auth_token))
+    
+    async def send_async(self, session, phone, message, channel):
+        """One Messages API call over the batch's pooled aiohttp session"""
+        to, from_number = self._addresses(phone, channel)
+        url = f"{self.api_base_url}/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+        data = {'To': to, 'From': from_number, 'Body': message}
+        if self.status_callback_url:
+            data['StatusCallback'] = self.status_callback_url
+        try:
+            async with session.post(url, data=data) as response:
+                payload = await response.json(content_type=None)
+                if not isinstance(payload, dict):
+                    payload = {}
+                if response.status >= 400:
+                    code = payload.get('code')
+                    result = SendResult(False, error_class=classify_error(response.status, code),
+                                        status=response.status, code=code,
+                                        error=payload.get('message') or f"HTTP {response.status}")
+                    return result, parse_retry_after(response.headers.get('Retry-After'))
+                return SendResult(True, sid=payload.get('sid')), None
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            return SendResult(False, error_class=TRANSIENT, error=str(e) or type(e).__name__), None
+
+class FileProvider(MessageProvider):
+    """Writes messages as JSON lines to a file (or stdout) instead of sending them"""
+    name = "file"
+    
+    def __init__(self, path="-", clock=DEFAULT_CLOCK):
+        self.path = path
+        self.clock = clock
+        self.lock = threading.Lock()
+    
+    @classmethod
+    def from_env(cls):
+        return cls(os.getenv("MESSAGE_FILE_PATH", "-"))
+    
+    def send(self, phone, message, channel):
+        sid = "FL" + uuid.uuid4().hex
+        line = json.dumps({
+            'sid': sid,
+            'channel': channel,
+            'to': phone,
+            'body': message,
+            'sent_at': self.clock.now().isoformat(timespec='seconds'),
+        }, ensure_ascii=False)
+        try:
+            with self.lock:
+                if self.path == "-":
+                    print(line, file=sys.stdout, flush=True)
+                else:
+                    with open(self.path, 'a', encoding='utf-8') as f:
+                        f.write(line + "\n")
+        except OSError as e:
+            return SendResult(False, error_class=TRANSIENT, error=str(e)), None
+        return SendResult(True, sid=sid), None
+
+def _email_provider():
+    # email_channel imports this module, so it is loaded on first use
+    from email_channel import EmailProvider
+    return EmailProvider.from_env()
+
+PROVIDER_FACTORIES = {
+    'twilio': TwilioProvider.from_env,
+    'file': FileProvider.from_env,
+    'smtp': _email_provider,
+}
+
+def register_provider(name, factory):
+    """Make a provider available to MESSAGE_ROUTES; factory() returns a MessageProvider"""
+    PROVIDER_FACTORIES[name] = factory
+
+def parse_routes(spec):
+    """{channel: [(provider name, provider channel), ...]} from a MESSAGE_ROUTES string"""
+    routes = {}
+    for rule in filter(None, (part.strip() for part in spec.split(';'))):
+        channel, _, targets = rule.partition('=')
+        if not targets:
+            raise ValueError(f"Route rule needs channel=provider:channel,...: {rule!r}")
+        routes[channel.strip()] = []
+        for target in filter(None, (part.strip() for part in targets.split(','))):
+            provider_name, _, provider_channel = target.partition(':')
+            routes[channel.strip()].append((provider_name.strip(), provider_channel.strip() or channel.strip()))
+    return routes
+
+class Route:
+    """One provider and channel to try, with its health"""
+    
+    def __init__(self, provider, channel):
+        self.provider = provider
+        self.channel = channel
+        self.key = f"{provider.name}:{channel}"
+        self.score = 1.0
+        self.latency_ms = None
+        self.sends = 0
+        self.last_send_at = 0.0
+        self.breaker = CircuitBreaker()
+        # Monotonic time before which no send starts (set from Retry-After)
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+    
+    def record(self, result, latency_ms, retry_after=None, permit=None):
+        # Only provider trouble counts against a route, not a bad recipient number
+        failed = result.error_class in (THROTTLED, TRANSIENT, PERMANENT)
+        self.breaker.record(result.error_class in (THROTTLED, TRANSIENT), permit)
+        with self.lock:
+            self.sends += 1
+            self.last_send_at = time.monotonic()
+            self.score += HEALTH_SMOOTHING * ((0.0 if failed else 1.0) - self.score)
+            if result:
+                if self.latency_ms is None:
+                    self.latency_ms = latency_ms
+                else:
+                    self.latency_ms += HEALTH_SMOOTHING * (latency_ms - self.latency_ms)
+            if retry_after:
+                # After a 429 hold every send on the route, not just the one retrying
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+    
+    def healthy(self):
+        with self.lock:
+            if self.score >= HEALTHY_SCORE:
+                return True
+            if time.monotonic() - self.last_send_at >= HEALTH_PROBE_SECONDS:
+                # Give it one more chance; a failure drops it straight back below the line
+                self.score = HEALTHY_SCORE
+                self.last_send_at = time.monotonic()
+                return True
+            return False
+    
+    def pause_remaining(self):
+        return max(self.paused_until - time.monotonic(), 0.0)
+    
+    def snapshot(self):
+        return {
+            'route': self.key,
+            'provider': self.provider.name,
+            'channel': self.channel,
+            'score': round(self.score, 2),
+            'latency_ms': round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            'sends': self.sends,
+            'circuit': self.breaker.state,
+        }
+
+class ProviderRouter:
+    """Orders the routes for a channel by health; see the module docstring"""
+    
+    def __init__(self, providers, routes, strategy=ROUTING_STRATEGY):
+        if strategy not in ("priority", "latency"):
+            raise ValueError(f"Unknown routing strategy: {strategy!r}")
+        self.providers = providers
+        self.strategy = strategy
+        self.routes = {}
+        # One Route per provider:channel, shared by every channel that falls back to it
+        shared = {}
+        for channel, targets in routes.items():
+            self.routes[channel] = []
+            for provider_name, provider_channel in targets:
+                provider = providers.get(provider_name)
+                if provider is None:
+                    print(f"Unknown messaging provider {provider_name!r} in route for {channel}")
+                    continue
+                if provider_channel not in provider.channels:
+                    print(f"Provider {provider_name} does not support {provider_channel}")
+                    continue
+                key = (provider_name, provider_channel)
+                shared.setdefault(key, Route(provider, provider_channel))
+                self.routes[channel].append(shared[key])
+    
+    @classmethod
+    def from_env(cls, providers=None, spec=ROUTES, strategy=ROUTING_STRATEGY):
+        """Router for MESSAGE_ROUTES; providers it names that aren't given are built from the registry"""
+        providers = dict(providers or {})
+        routes = parse_routes(spec)
+        for targets in routes.values():
+            for provider_name, _ in targets:
+                if provider_name not in providers and provider_name in PROVIDER_FACTORIES:
+                    providers[provider_name] = PROVIDER_FACTORIES[provider_name]()
+        return cls(providers, routes, strategy)
+    
+    def configured(self, channel):
+        """True when some route for the channel has a configured provider"""
+        return any(route.provider.configured() for route in self.routes.get(channel, []))
+    
+    def candidates(self, channel):
+        """Routes to try for one send, best first; routes with an open circuit are left out"""
+        routes = [route for route in self.routes.get(channel, [])
+                  if route.provider.configured() and route.breaker.state != "open"]
+        healthy, unhealthy = [], []
+        for route in routes:
+            (healthy if route.healthy() else unhealthy).append(route)
+        if self.strategy == "latency":
+            # Routes without a latency yet go first so every route gets measured
+            healthy.sort(key=lambda route: route.latency_ms if route.latency_ms is not None else -1.0)
+        unhealthy.sort(key=lambda route: -route.score)
+        return healthy + unhealthy
+    
+    def snapshot(self):
+        """Health of every route, for display"""
+        seen = {}
+        for routes in self.routes.values():
+            for route in routes:
+                seen.setdefault(route.key, route)
+        return [route.snapshot() for route in seen.values()]
@@ -0,0 +1,95 @@
+"""Compact, slotted row records returned by DatabaseManager reads.
+
+Records behave like the dicts the app used before (record['name'],
+record.get('email', '')), but store their fields in __slots__ instead of a
+per-row dict. Rows are turned into records by a builder generated once per
+column layout, so building a record is a single tuple unpack.
+"""
+
+class Record:
+    __slots__ = ()
+    
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+    
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+    
+    def __contains__(self, key):
+        return hasattr(self, key)
+    
+    def keys(self):
+        """Names of the fields that were loaded for this record"""
+        return [name for name in self.__slots__ if hasattr(self, name)]
+    
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.keys()}
+    
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+    
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.keys())
+        return f"{type(self).__name__}({fields})"
+
+class Member(Record):
+    __slots__ = ('id', 'name', 'phone', 'email', 'membership_type', 'amount', 'payment_date',
+                 'reminder_days', 'notes', 'created_at', 'updated_at')
+    
+    @property
+    def member_name(self):
+        return self.name
+
+class Payment(Record):
+    __slots__ = ('id', 'member_id', 'kid_id', 'member_name', 'amount', 'payment_date',
+                 'payment_method', 'notes', 'created_at')
+
+class Kid(Record):
+    __slots__ = ('id', 'kid_name', 'parent_name', 'parent_phone', 'age', 'batch_time', 'monthly_fee',
+                 'start_date', 'emergency_contact', 'medical_notes', 'active', 'created_at', 'updated_at')
+
+class Checkin(Record):
+    __slots__ = ('id', 'member_id', 'member_name', 'phone', 'check_in_time', 'check_out_time',
+                 'duration_minutes', 'court_usage_type', 'notes')
+
+class ReminderLog(Record):
+    __slots__ = ('id', 'member_id', 'reminder_type', 'message', 'sent_at', 'success', 'delivery_id', 'provider_sid')
+
+_builders = {}
+
+def make_row_factory(record_class, description):
+    """Return a function turning rows with this cursor.description into records.
+    
+    Columns the record class has no slot for are skipped. Builders are cached
+    per (record class, column names).
+    """
+    columns = tuple(column[0] for column in description)
+    key = (record_class, columns)
+    builder = _builders.get(key)
+    if builder is None:
+        slots = set(record_class.__slots__)
+        targets = ", ".join(f"record.{name}" if name in slots else "_" for name in columns)
+        source = (
+            "def build(row, new=new, record_class=record_class):\n"
+            "    record = new(record_class)\n"
+            f"    {targets}, = row\n"
+            "    return record\n"
+        )
+        namespace = {'new': object.__new__, 'record_class': record_class}
+        exec(source, namespace)
+        builder = _builders[key] = namespace['build']
+    return builder
+
+def fetch_records(cursor, record_class, batch_size=500):
+    """Yield records for every remaining row of an executed cursor"""
+    build = make_row_factory(record_class, cursor.description)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from map(build, rows)
@@ -0,0 +1,366 @@
+"""Long-running reminder service.
+
+Runs ReminderScheduler.schedule_automatic_reminders on a cron-like schedule,
+outside the Streamlit process, and drains the message outbox every minute.
+Job state (last/next run, status, duration, messages sent) is kept in the
+scheduler_jobs table, runs missed while the service was down are caught up
+once on start, and a lease in scheduler_lock makes sure only one instance
+sends at a time. The reminders job spreads what it queues over the send
+window (send_window.py); the outbox job sends each reminder when its slot
+comes up.
+
+Usage:
+    python reminder_daemon.py                 # run until stopped
+    python reminder_daemon.py --once          # run due jobs once (for an external cron)
+    python reminder_daemon.py --list          # show job state
+"""
+
+import os
+import time
+import uuid
+import signal
+import socket
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from instrumentation import open_connection
+from outbox import Outbox
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+LOCK_NAME = "reminder_daemon"
+LEASE_SECONDS = int(os.getenv("REMINDER_DAEMON_LEASE_SECONDS", "300"))
+POLL_SECONDS = int(os.getenv("REMINDER_DAEMON_POLL_SECONDS", "30"))
+# Missed runs counted at most this far back when catching up
+MAX_MISSED_COUNT = 1000
+
+def _format_time(value):
+    return value.strftime(TIMESTAMP_FORMAT)
+
+def _parse_time(value):
+    return datetime.strptime(value, TIMESTAMP_FORMAT) if value else None
+
+class CronSchedule:
+    """Five-field cron expression: minute hour day-of-month month day-of-week.
+    
+    Fields accept *, numbers, ranges (1-5), lists (1,15) and steps (*/15, 8-18/2).
+    Day-of-week is 0-6 with Sunday as 0 (7 is also Sunday). As in cron, when both
+    day fields are restricted a day matching either one is used.
+    """
+    
+    FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+    
+    def __init__(self, expression):
+        self.expression = expression
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields, got {len(fields)}: {expression!r}")
+        
+        parsed = [self._parse_field(field, low, high) for field, (low, high) in zip(fields, self.FIELD_RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        # Sunday may be written as 7; datetime.weekday() counts Monday as 0
+        self.weekdays = {(day - 1) % 7 for day in weekdays}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+    
+    @staticmethod
+    def _parse_field(field, low, high):
+        values = set()
+        for part in field.split(','):
+            step = 1
+            if '/' in part:
+                part, step_text = part.split('/', 1)
+                step = int(step_text)
+                if step < 1:
+                    raise ValueError(f"Invalid step in {field!r}")
+            
+            if part == '*':
+                start, end = low, high
+            elif '-' in part:
+                start, end = (int(value) for value in part.split('-', 1))
+            else:
+                start = int(part)
+                end = high if step > 1 else start
+            
+            if start < low or end > high or start > end:
+                raise ValueError(f"Value out of range {low}-{high} in {field!r}")
+            values.update(range(start, end + 1, step))
+        return sorted(values)
+    
+    def _day_matches(self, day):
+        day_ok = day.day in self.days
+        weekday_ok = day.weekday() in self.weekdays
+        if self.any_day and self.any_weekday:
+            return True
+        if self.any_day:
+            return weekday_ok
+        if self.any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+    
+    def next_after(self, moment):
+        """First scheduled time strictly after moment"""
+        start = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.date()
+        # Eight years covers any valid expression (e.g. 29 February)
+        for _ in range(366 * 8):
+            if day.month in self.months and self._day_matches(day):
+                same_day = day == start.date()
+                for hour in self.hours:
+                    if same_day and hour < start.hour:
+                        continue
+                    for minute in self.minutes:
+                        if same_day and hour == start.hour and minute < start.minute:
+                            continue
+                        return datetime(day.year, day.month, day.day, hour, minute)
+            day += timedelta(days=1)
+        raise ValueError(f"Cron expression never matches: {self.expression!r}")
+    
+    def runs_between(self, after, until, limit=MAX_MISSED_COUNT):
+        """Number of scheduled times in (after, until], counting at most limit"""
+        count = 0
+        moment = self.next_after(after)
+        while moment <= until and count < limit:
+            count += 1
+            moment = self.next_after(moment)
+        return count
+
+def _run_automatic_reminders(daemon):
+    return daemon.scheduler.schedule_automatic_reminders(daemon.db_manager, daemon.message_manager)
+
+def _drain_outbox(daemon):
+    return Outbox(daemon.db_manager).drain_all(daemon.message_manager)['sent']
+
+# Job name -> (schedule, function(daemon) returning the number of messages sent)
+DEFAULT_JOBS = {
+    'automatic_reminders': (os.getenv("REMINDER_SCHEDULE", "0 9 * * *"), _run_automatic_reminders),
+    # Bulk announcements queued from the app and retries of failed sends
+    'outbox': (os.getenv("OUTBOX_SCHEDULE", "* * * * *"), _drain_outbox),
+}
+
+class ReminderDaemon:
+    def __init__(self, db_manager, message_manager=None, scheduler=None, jobs=None,
+                 lease_seconds=LEASE_SECONDS, poll_seconds=POLL_SECONDS):
+        if message_manager is None:
+            from messaging import MessageManager
+            message_manager = MessageManager()
+        if scheduler is None:
+            from reminder_scheduler import ReminderScheduler
+            scheduler = ReminderScheduler()
+        
+        self.db_manager = db_manager
+        self.db_path = db_manager.db_path
+        # Job times follow the database's clock
+        self.clock = db_manager.clock
+        self.message_manager = message_manager
+        self.scheduler = scheduler
+        self.jobs = {name: (CronSchedule(expression), function)
+                     for name, (expression, function) in (jobs or DEFAULT_JOBS).items()}
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.stop_event = threading.Event()
+    
+    def sync_jobs(self, now=None):
+        """Create missing job rows and pick up schedule changes"""
+        now = now or self.clock.now()
+        conn = open_connection(self.db_path)
+        cursor = conn.cursor()
+        
+        for name, (schedule, _) in self.jobs.items():
+            cursor.execute('SELECT schedule FROM scheduler_jobs WHERE job_name = ?', (name,))
+            row = cursor.fetchone()
+            next_run = _format_time(schedule.next_after(now))
+            if row is None:
+                cursor.execute('''
+                INSERT INTO scheduler_jobs (job_name, schedule, next_run_at) VALUES (?, ?, ?)
+                ''', (name, schedule.expression, next_run))
+            elif row[0] != schedule.expression:
+                cursor.execute('''
+                UPDATE scheduler_jobs
+                SET schedule = ?, next_run_at = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE job_name = ?
+                ''', (schedule.expression, next_run, name))
+        
+        conn.commit()
+        conn.close()
+    
+    def acquire_lease(self, now=None):
+        """Take or renew the daemon lock; False while another live instance holds it"""
+        now = now or self.clock.now()
+        conn = None
+        try:
+            conn = open_connection(self.db_path, isolation_level=None)
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('''
+            INSERT INTO scheduler_lock (lock_name, owner, acquired_at, expires_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (lock_name) DO UPDATE SET
+                acquired_at = CASE WHEN scheduler_lock.owner = excluded.owner
+                                   THEN scheduler_lock.acquired_at ELSE excluded.acquired_at END,
+                owner = excluded.owner,
+                expires_at = excluded.expires_at
+            WHERE scheduler_lock.owner = excluded.owner OR scheduler_lock.expires_at < excluded.acquired_at
+            ''', (LOCK_NAME, self.owner, _format_time(now),
+                  _format_time(now + timedelta(seconds=self.lease_seconds))))
+            cursor.execute('SELECT owner FROM scheduler_lock WHERE lock_name = ?', (LOCK_NAME,))
+            holder = cursor.fetchone()[0]
+            cursor.execute('COMMIT')
+            return holder == self.owner
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return False
+        finally:
+            if conn is not None:
+                # Don't keep the write lock after a failure part-way through
+                if conn.in_transaction:
+                    conn.rollback()
+                conn.close()
+    
+    def release_lease(self):
+        try:
+            conn = open_connection(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM scheduler_lock WHERE lock_name = ? AND owner = ?', (LOCK_NAME, self.owner))
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+    
+    def _due_jobs(self, now):
+        conn = open_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+        SELECT job_name, next_run_at, status FROM scheduler_jobs
+        WHERE next_run_at <= ?
+        ORDER BY next_run_at
+        ''', (_format_time(now),))
+        due = [row for row in cursor.fetchall() if row[0] in self.jobs]
+        conn.close()
+        return due
+    
+    def _update_job(self, name, **fields):
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        conn = open_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(f'''
+        UPDATE scheduler_jobs SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE job_name = ?
+        ''', list(fields.values()) + [name])
+        conn.commit()
+        conn.close()
+    
+    def run_job(self, name, scheduled_for=None, now=None, requested=False):
+        """Run one job now and record the outcome; returns (status, sent count)"""
+        schedule, function = self.jobs[name]
+        now = now or self.clock.now()
+        # Every scheduled time after the one that came due also passed while we were down
+        missed = 0 if requested or scheduled_for is None else schedule.runs_between(scheduled_for, now)
+        
+        self._update_job(name, status='running', last_run_at=_format_time(now))
+        start = time.perf_counter()
+        sent_count = None
+        error = None
+        try:
+            sent_count = function(self)
+            status = 'success'
+        except Exception as e:
+            status = 'failed'
+            error = str(e)
+            print(f"Job {name} failed: {error}")
+        duration_ms = int((time.perf_counter() - start) * 1000)
+        
+        # Missed runs are caught up by this one run, not replayed one by one
+        next_run = schedule.next_after(max(now, self.clock.now()))
+        conn = open_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+        UPDATE scheduler_jobs
+        SET status = ?, last_duration_ms = ?, last_sent_count = ?, last_error = ?, missed_runs = ?,
+            next_run_at = ?, run_count = run_count + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE job_name = ?
+        ''', (status, duration_ms, sent_count, error, missed, _format_time(next_run), name))
+        conn.commit()
+        conn.close()
+        return status, sent_count
+    
+    def run_pending(self, now=None):
+        """Run every job that is due, if this instance holds the lock. Returns {job: (status, sent)}"""
+        now = now or self.clock.now()
+        if not self.acquire_lease(now):
+            return {}
+        
+        results = {}
+        for name, next_run_at, status in self._due_jobs(now):
+            # Renew before each job so a long run doesn't outlive the lease
+            if not self.acquire_lease():
+                break
+            results[name] = self.run_job(name, _parse_time(next_run_at), now, requested=(status == 'requested'))
+        return results
+    
+    def seconds_until_next_run(self, now=None):
+        now = now or self.clock.now()
+        conn = open_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('SELECT MIN(next_run_at) FROM scheduler_jobs')
+        next_run = _parse_time(cursor.fetchone()[0])
+        conn.close()
+        if next_run is None:
+            return self.poll_seconds
+        return max((next_run - now).total_seconds(), 0)
+    
+    def _heartbeat(self):
+        """Keep the lease alive while a long job runs"""
+        while not self.stop_event.wait(self.lease_seconds / 3):
+            self.acquire_lease()
+    
+    def stop(self, *_):
+        self.stop_event.set()
+    
+    def run_forever(self):
+        """Run jobs as they come due until stopped (SIGINT/SIGTERM)"""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        
+        self.sync_jobs()
+        heartbeat = threading.Thread(target=self._heartbeat, daemon=True)
+        heartbeat.start()
+        print(f"Reminder daemon {self.owner} started with jobs: {', '.join(self.jobs)}")
+        
+        try:
+            while not self.stop_event.is_set():
+                # Missed runs show up as due on the first pass and are caught up here
+                for name, (status, sent_count) in self.run_pending().items():
+                    print(f"{_format_time(self.clock.now())} {name}: {status}, {sent_count or 0} sent")
+                self.stop_event.wait(max(min(self.poll_seconds, self.seconds_until_next_run()), 1))
+        finally:
+            self.stop_event.set()
+            self.release_lease()
+            print(f"Reminder daemon {self.owner} stopped")
+
+if __name__ == "__main__":
+    import argparse
+    from database import DatabaseManager
+    
+    parser = argparse.ArgumentParser(description="Send payment reminders on a schedule")
+    parser.add_argument("--db", default="badminton_court.db", help="Path to the database")
+    parser.add_argument("--once", action="store_true", help="Run due jobs once and exit")
+    parser.add_argument("--list", action="store_true", help="Show job state and exit")
+    args = parser.parse_args()
+    
+    daemon = ReminderDaemon(DatabaseManager(args.db))
+    if args.list:
+        daemon.sync_jobs()
+        for job in daemon.db_manager.get_scheduler_jobs():
+            print(f"{job['job_name']} [{job['schedule']}] {job['status']} last {job['last_run_at'] or '-'} "
+                  f"next {job['next_run_at']} sent {job['last_sent_count'] or 0} lock {job['lock_owner'] or '-'}")
+    elif args.once:
+        daemon.sync_jobs()
+        results = daemon.run_pending()
+        daemon.release_lease()
+        for name, (status, sent_count) in results.items():
+            print(f"{name}: {status}, {sent_count or 0} sent")
+        if not results:
+            print("Nothing due (or another instance holds the lock)")
+    else:
+        daemon.run_forever()
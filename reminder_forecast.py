@@ -0,0 +1,117 @@
+"""Vectorised forecast of automatic reminders.
+
+simulate_reminders runs ReminderScheduler's rules forward one day at a time
+against a virtual clock, for every member and kid at once as numpy arrays:
+each member climbs the escalation ladder of reminder_queue.py once per due
+date (a gentle payment reminder inside reminder_days of the due date, a firm
+overdue reminder after it and a final notice FINAL_NOTICE_DAYS after it,
+skipping rungs that were missed), kids get one kids_payment_reminder from 15
+days before, and nobody is reminded again within RECENT_REMINDER_DAYS. Under
+a budget each day sends the reminders select_within_budget picks. Members
+are assumed to renew payment_delay_days after each due date; anyone already
+further overdue than that is assumed not to pay during the forecast and only
+gets their overdue reminders. Nothing is sent or written. Household
+coalescing (coalesce.py) is not modelled, so a parent with several kids
+counts one message per kid: the forecast is an upper bound.
+"""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from reminder_queue import (reminder_priority, select_within_budget, GENTLE, FIRM, FINAL, NOT_REMINDED,
+                            FINAL_NOTICE_DAYS, RECENT_REMINDER_DAYS)
+
+EPOCH = date(1970, 1, 1)
+# Day number for "never"
+NO_DAY = np.iinfo(np.int64).min // 2
+
+FORECAST_COLUMNS = ['payment_reminders', 'overdue_reminders', 'final_notices', 'kids_reminders', 'messages', 'sms',
+                    'emails', 'segments', 'cost']
+
+def day_number(day):
+    """Days since 1970-01-01 for a date (the simulation's clock)"""
+    return (day - EPOCH).days
+
+def simulate_reminders(subjects, start_day, days, payment_delay_days=0, final_notice_days=FINAL_NOTICE_DAYS,
+                       budget=None):
+    """Per-day reminder counts, segments and cost for `days` days from day number start_day.
+    
+    subjects is a dict of equal-length arrays, one entry per member or kid:
+    due (day number of the next due date), period (days a payment covers),
+    window (days before the due date reminders start), kid (bool), email
+    (bool, reminded by email), amount (float), segments and cost (float,
+    N x 3: the gentle, firm and final reminder), level (int, the rung already
+    sent or queued for the current due date, or NOT_REMINDED) and last_sent
+    (int, day of the last reminder, or NO_DAY). budget caps each day's cost
+    (None for no cap). Returns a DataFrame with a date column and
+    FORECAST_COLUMNS.
+    """
+    due = subjects['due'].astype(np.int64)
+    period = subjects['period']
+    window = subjects['window']
+    kid = subjects['kid']
+    email = subjects['email']
+    amount = subjects['amount']
+    segments = subjects['segments']
+    cost = subjects['cost']
+    level = subjects['level'].copy()
+    last_sent = subjects['last_sent'].copy()
+    subject_index = np.arange(len(due))
+    
+    # Further overdue than the assumed delay already: not expected to pay during the forecast
+    renews = due + payment_delay_days >= start_day
+    rows = np.zeros((days, len(FORECAST_COLUMNS)))
+    
+    for offset in range(days):
+        today = start_day + offset
+        paying = renews & (due + payment_delay_days == today)
+        due[paying] = today + period[paying]
+        level[paying] = NOT_REMINDED
+        
+        remaining = due - today
+        # Kids have a single rung
+        stage = np.where(remaining >= 0, GENTLE, np.where(-remaining < final_notice_days, FIRM, FINAL))
+        stage[kid] = GENTLE
+        send = (remaining <= window) & (stage > level) & (today - last_sent > RECENT_REMINDER_DAYS)
+        
+        stage_segments = segments[subject_index, stage]
+        stage_cost = cost[subject_index, stage]
+        if budget is not None:
+            candidates = np.flatnonzero(send)
+            if stage_cost[candidates].sum() > budget:
+                scores = reminder_priority(amount[candidates], -remaining[candidates])
+                chosen = candidates[select_within_budget(scores, stage_cost[candidates], budget)]
+                send = np.zeros_like(send)
+                send[chosen] = True
+        
+        level[send] = stage[send]
+        last_sent[send] = today
+        
+        kids = np.count_nonzero(send & kid)
+        members = send & ~kid
+        payment = np.count_nonzero(members & (stage == GENTLE))
+        overdue = np.count_nonzero(members & (stage == FIRM))
+        final = np.count_nonzero(members & (stage == FINAL))
+        messages = payment + overdue + final + kids
+        emails = np.count_nonzero(send & email)
+        rows[offset] = (payment, overdue, final, kids, messages, messages - emails, emails,
+                        stage_segments @ send, stage_cost @ send)
+    
+    forecast = pd.DataFrame(rows, columns=FORECAST_COLUMNS)
+    counts = [column for column in FORECAST_COLUMNS if column != 'cost']
+    forecast[counts] = forecast[counts].astype(np.int64)
+    dates = np.arange(start_day, start_day + days).astype('datetime64[D]')
+    forecast.insert(0, 'date', pd.to_datetime(dates).date)
+    return forecast
+
+def forecast_totals(forecast):
+    """Column totals of a forecast plus its busiest day ({} for an empty forecast)"""
+    if forecast.empty:
+        return {}
+    totals = {column: forecast[column].sum().item() for column in FORECAST_COLUMNS}
+    busiest = forecast['messages'].idxmax()
+    totals['busiest_date'] = forecast.at[busiest, 'date']
+    totals['busiest_messages'] = int(forecast.at[busiest, 'messages'])
+    return totals
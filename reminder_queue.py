@@ -0,0 +1,177 @@
+"""Persistent priority queue of member reminders with an escalation ladder.
+
+reminder_queue holds one row per member: the due date of the current
+membership period, the day reminders for it start, the rung of the ladder
+last sent for it and when the member was last reminded. Triggers on members
+keep the rows current as members are added, edited, removed or renew (a
+new due date puts the member back at the bottom of the ladder), and a
+trigger on reminder_logs moves a member up when a reminder is logged, so
+nothing is recomputed from scratch. Reminders sent by hand from a WhatsApp
+link sheet (MANUAL_REMINDER_TYPES) count as the last reminder but don't
+climb the ladder. Members from before the queue existed are seeded from
+their reminder_logs. The ladder is gentle (payment_reminder,
+inside the reminder window), firm (overdue_reminder, once overdue) and final
+(final_reminder, FINAL_NOTICE_DAYS after the due date); each rung is sent at
+most once per due date, a missed rung is skipped, and no member gets two
+reminders within RECENT_REMINDER_DAYS. Reminders are ranked by
+reminder_priority, and when a run has a budget (REMINDER_BUDGET, in
+message_cost's currency) select_within_budget sends the most valuable ones
+that fit; the rest wait for the next run, when they rank higher.
+"""
+
+import os
+import sqlite3
+from datetime import date, timedelta
+
+import numpy as np
+
+from instrumentation import open_connection
+from clock import TIMESTAMP_FORMAT
+
+# The ladder: rung -> reminder (template) type
+GENTLE = 0
+FIRM = 1
+FINAL = 2
+NOT_REMINDED = -1
+ESCALATION_LADDER = {
+    GENTLE: "payment_reminder",
+    FIRM: "overdue_reminder",
+    FINAL: "final_reminder",
+}
+ESCALATION_NAMES = {NOT_REMINDED: "none", GENTLE: "gentle", FIRM: "firm", FINAL: "final"}
+# reminder_logs types of reminders sent by hand from a WhatsApp link sheet
+MANUAL_REMINDER_TYPES = ("WhatsApp_Link", "WhatsApp_Manual")
+
+# Days after the due date the final notice goes out
+FINAL_NOTICE_DAYS = int(os.getenv("FINAL_NOTICE_DAYS", "14"))
+# A reminder sent this many days ago or less blocks another one
+RECENT_REMINDER_DAYS = 3
+# Most an automatic reminder run may spend; empty for no limit
+REMINDER_BUDGET = float(os.getenv("REMINDER_BUDGET")) if os.getenv("REMINDER_BUDGET", "").strip() else None
+
+# Overdue reminders are worth one more amount for every PRIORITY_OVERDUE_STEP_DAYS overdue, counting at most
+# PRIORITY_MAX_OVERDUE_DAYS; upcoming ones lose half their worth every PRIORITY_UPCOMING_STEP_DAYS before the due date
+PRIORITY_OVERDUE_STEP_DAYS = 30
+PRIORITY_MAX_OVERDUE_DAYS = 90
+PRIORITY_UPCOMING_STEP_DAYS = 7
+
+def escalation_stage(days_remaining, final_notice_days=FINAL_NOTICE_DAYS):
+    """The rung due for a member this many days before (negative: after) their due date"""
+    if days_remaining >= 0:
+        return GENTLE
+    if -days_remaining < final_notice_days:
+        return FIRM
+    return FINAL
+
+def reminder_priority(amount, days_overdue):
+    """How valuable a reminder is: the amount at stake, weighted by how overdue it is.
+    
+    Up to 4x the amount once long overdue, half of it a week before the due
+    date. Works on numbers and numpy arrays alike.
+    """
+    days_overdue = np.asarray(days_overdue, dtype=float)
+    weight = np.where(days_overdue > 0,
+                      1 + np.minimum(days_overdue, PRIORITY_MAX_OVERDUE_DAYS) / PRIORITY_OVERDUE_STEP_DAYS,
+                      1 / (1 - np.minimum(days_overdue, 0) / PRIORITY_UPCOMING_STEP_DAYS))
+    return np.asarray(amount, dtype=float) * weight
+
+def select_within_budget(scores, costs, budget):
+    """Indices of the reminders to send, most valuable first.
+    
+    Reminders are taken by descending score (ties keep their order) while
+    their cost still fits what is left of the budget; one that doesn't fit is
+    skipped, so cheaper ones further down still use up the budget. budget None
+    takes everything.
+    """
+    order = np.argsort(-np.asarray(scores, dtype=float), kind='stable').tolist()
+    if budget is None:
+        return order
+    chosen = []
+    left = budget
+    for index in order:
+        if costs[index] <= left:
+            chosen.append(index)
+            left -= costs[index]
+    return chosen
+
+class ReminderQueue:
+    def __init__(self, db_manager, clock=None, final_notice_days=FINAL_NOTICE_DAYS):
+        self.db_path = db_manager.db_path
+        self.clock = clock or db_manager.clock
+        self.final_notice_days = final_notice_days
+    
+    def due_reminders(self):
+        """Members who are due the next rung of the ladder today, highest priority first.
+        
+        Each is a dict with the member's details, next_due_date,
+        days_remaining, reminder_type (the rung's template), escalation (its
+        name) and priority_score.
+        """
+        today = self.clock.today()
+        recent_cutoff = (self.clock.now() - timedelta(days=RECENT_REMINDER_DAYS)).strftime(TIMESTAMP_FORMAT)
+        try:
+            conn = open_connection(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('''
+            SELECT q.member_id, m.name, m.phone, m.email, m.membership_type, m.amount, m.payment_date,
+                   m.reminder_days, q.due_date
+            FROM reminder_queue q
+            JOIN members m ON m.id = q.member_id
+            WHERE q.remind_from <= :today
+              AND q.escalation_level < CASE WHEN q.due_date >= :today THEN :gentle
+                                            WHEN q.due_date > :final_from THEN :firm
+                                            ELSE :final END
+              AND (q.last_reminded_at IS NULL OR q.last_reminded_at < :recent_cutoff)
+            ''', {
+                'today': today.isoformat(),
+                'final_from': (today - timedelta(days=self.final_notice_days)).isoformat(),
+                'recent_cutoff': recent_cutoff,
+                'gentle': GENTLE,
+                'firm': FIRM,
+                'final': FINAL,
+            })
+            rows = cursor.fetchall()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return []
+        
+        reminders = []
+        for member_id, name, phone, email, membership_type, amount, payment_date, reminder_days, due_date in rows:
+            next_due_date = date.fromisoformat(due_date)
+            days_remaining = (next_due_date - today).days
+            stage = escalation_stage(days_remaining, self.final_notice_days)
+            reminders.append({
+                'member_id': member_id,
+                'member_name': name,
+                'phone': phone,
+                'email': email,
+                'membership_type': membership_type,
+                'amount': amount,
+                'payment_date': date.fromisoformat(payment_date),
+                'next_due_date': next_due_date,
+                'days_remaining': days_remaining,
+                'reminder_type': ESCALATION_LADDER[stage],
+                'reminder_days': reminder_days,
+                'escalation': ESCALATION_NAMES[stage],
+                'priority_score': float(reminder_priority(amount or 0, -days_remaining))
+            })
+        reminders.sort(key=lambda reminder: (-reminder['priority_score'], reminder['member_name']))
+        return reminders
+    
+    def get_escalation_counts(self):
+        """{rung name: members whose current due date has reached that rung} for members reminded at least once"""
+        try:
+            conn = open_connection(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('''
+            SELECT escalation_level, COUNT(*) FROM reminder_queue
+            WHERE escalation_level > ?
+            GROUP BY escalation_level
+            ''', (NOT_REMINDED,))
+            counts = {ESCALATION_NAMES[level]: count for level, count in cursor.fetchall()}
+            conn.close()
+            return counts
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return {}
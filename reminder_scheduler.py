@@ -1,77 +1,47 @@
-from datetime import datetime, timedelta
-import sqlite3
+import json
+from datetime import date, datetime, timedelta
+import numpy as np
+from instrumentation import open_connection, instrument_class
+from outbox import Outbox, reminder_key, PRIORITY_OVERDUE, PRIORITY_NORMAL
+from template_engine import TemplateEngine, render_template
+from coalesce import coalesce_reminders
+from email_channel import reminder_email, email_address
+from message_cost import message_cost, segment_info, GSM7_BASIC
+from utils import calculate_membership_duration
+from clock import DEFAULT_CLOCK
+from reminder_forecast import simulate_reminders, day_number, NO_DAY
+from reminder_queue import (ReminderQueue, reminder_priority, select_within_budget, ESCALATION_LADDER, GENTLE, FIRM,
+                            FINAL, NOT_REMINDED, FINAL_NOTICE_DAYS, RECENT_REMINDER_DAYS, REMINDER_BUDGET)
+
+# Days a kids training payment covers and how long before the due date its reminder starts
+KIDS_PAYMENT_DAYS = 30
+KIDS_REMINDER_DAYS = 15
+# Days covered by forecast_reminders when no end date is given
+FORECAST_DAYS = 30
+
+def kids_reminder_message(reminder):
+    """Reminder text for a kids training fee"""
+    return f"""Hi {reminder['parent_name']}! 🏸
+
+Your child {reminder['kid_name']}'s badminton training fee of ₹{reminder['amount']} is due on {reminder['next_due_date'].strftime('%d-%m-%Y')}.
+
+Please make the payment to continue the training sessions.
+
+Thank you!
+Contact: +91-9876543210"""
 
 class ReminderScheduler:
-    def __init__(self):
-        pass
+    def __init__(self, clock=DEFAULT_CLOCK):
+        # Decides what "today" is for due dates, reminder windows and the recent-reminder check
+        self.clock = clock
     
     def get_pending_reminders(self, db_manager):
-        """Get list of members who need payment reminders"""
-        conn = sqlite3.connect(db_manager.db_path)
-        cursor = conn.cursor()
-        
-        today = datetime.now().date()
-        pending_reminders = []
-        
-        # Get all members
-        cursor.execute('''
-        SELECT id, name, phone, email, membership_type, amount, payment_date, reminder_days
-        FROM members
-        ORDER BY name
-        ''')
-        
-        members = cursor.fetchall()
-        
-        for member in members:
-            member_id, name, phone, email, membership_type, amount, payment_date, reminder_days = member
-            
-            # Convert payment_date string to date object
-            if isinstance(payment_date, str):
-                payment_date = datetime.strptime(payment_date, '%Y-%m-%d').date()
-            
-            # Calculate next due date
-            next_due_date = db_manager.calculate_next_due_date(payment_date, membership_type)
-            
-            # Calculate days until due date
-            days_remaining = (next_due_date - today).days
-            
-            # Check if reminder should be sent
-            should_remind = False
-            reminder_type = "payment_reminder"
-            
-            if days_remaining < 0:
-                # Overdue
-                should_remind = True
-                reminder_type = "overdue_reminder"
-            elif days_remaining <= reminder_days:
-                # Within reminder window
-                should_remind = True
-                reminder_type = "payment_reminder"
-            
-            # Check if reminder was already sent recently (within last 3 days)
-            if should_remind:
-                recent_reminder = self._check_recent_reminder(cursor, member_id, reminder_type)
-                if not recent_reminder:
-                    pending_reminders.append({
-                        'member_id': member_id,
-                        'member_name': name,
-                        'phone': phone,
-                        'email': email,
-                        'membership_type': membership_type,
-                        'amount': amount,
-                        'payment_date': payment_date,
-                        'next_due_date': next_due_date,
-                        'days_remaining': days_remaining,
-                        'reminder_type': reminder_type,
-                        'reminder_days': reminder_days
-                    })
-        
-        conn.close()
-        return pending_reminders
+        """Get list of members who need payment reminders, highest priority first (see reminder_queue.py)"""
+        return ReminderQueue(db_manager, clock=self.clock).due_reminders()
     
-    def _check_recent_reminder(self, cursor, member_id, reminder_type, days_back=3):
+    def _check_recent_reminder(self, cursor, member_id, reminder_type, days_back=RECENT_REMINDER_DAYS):
         """Check if a reminder was sent recently"""
-        cutoff_date = datetime.now() - timedelta(days=days_back)
+        cutoff_date = self.clock.now() - timedelta(days=days_back)
         
         cursor.execute('''
         SELECT COUNT(*) FROM reminder_logs
@@ -93,10 +63,10 @@ class ReminderScheduler:
     
     def get_kids_pending_reminders(self, db_manager):
         """Get kids training payments that need reminders"""
-        conn = sqlite3.connect(db_manager.db_path)
+        conn = open_connection(db_manager.db_path)
         cursor = conn.cursor()
         
-        today = datetime.now().date()
+        today = self.clock.today()
         pending_reminders = []
         
         # Get all active kids
@@ -124,18 +94,18 @@ class ReminderScheduler:
             
             if last_payment:
                 last_payment_date = datetime.strptime(last_payment[0], '%Y-%m-%d').date()
-                next_due_date = last_payment_date + timedelta(days=30)  # Monthly payment
+                next_due_date = last_payment_date + timedelta(days=KIDS_PAYMENT_DAYS)  # Monthly payment
             else:
                 # No payments yet, use start date + 30 days
                 if isinstance(start_date, str):
                     start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-                next_due_date = start_date + timedelta(days=30)
+                next_due_date = start_date + timedelta(days=KIDS_PAYMENT_DAYS)
             
             # Calculate days remaining
             days_remaining = (next_due_date - today).days
             
             # Check if reminder needed (within 15 days or overdue)
-            if days_remaining <= 15:
+            if days_remaining <= KIDS_REMINDER_DAYS:
                 # Check for recent reminders
                 recent_reminder = self._check_recent_reminder(cursor, kid_id, "kids_payment_reminder")
                 if not recent_reminder:
@@ -147,86 +117,302 @@ class ReminderScheduler:
                         'amount': monthly_fee,
                         'next_due_date': next_due_date,
                         'days_remaining': days_remaining,
-                        'reminder_type': "kids_payment_reminder"
+                        'reminder_type': "kids_payment_reminder",
+                        'priority_score': float(reminder_priority(monthly_fee or 0, -days_remaining))
                     })
         
         conn.close()
         return pending_reminders
     
-    def schedule_automatic_reminders(self, db_manager, message_manager):
-        """Schedule and send automatic reminders (can be called by a cron job)"""
+    def schedule_automatic_reminders(self, db_manager, message_manager, budget=REMINDER_BUDGET):
+        """Schedule and send automatic reminders (can be called by a cron job).
+        
+        With a budget (in message_cost's currency) only the most valuable
+        reminders that fit are queued this run; the rest come up again next run.
+        """
         # Get pending reminders
         pending_member_reminders = self.get_pending_reminders(db_manager)
         pending_kids_reminders = self.get_kids_pending_reminders(db_manager)
         
-        sent_count = 0
+        outgoing = []
+        templates = {}
+        template_engine = TemplateEngine(db_manager)
         
-        # Send member reminders
+        # Members with a working email address are reminded by email instead of SMS
+        use_email = message_manager.is_configured("Email")
+        suppressed = db_manager.get_suppressed_emails() if use_email else set()
+        
+        # Member reminders
         for reminder in pending_member_reminders:
             template_type = reminder['reminder_type']
-            message_template = db_manager.get_message_template(template_type)
+            if template_type not in templates:
+                templates[template_type] = template_engine.get(template_type)
+                templates[f"{template_type}_email"] = template_engine.get(f"{template_type}_email")
+            message_template = templates[template_type]
             
             if message_template:
-                formatted_message = message_manager.format_message(message_template, reminder)
-                success = message_manager.send_message(
-                    phone=reminder['phone'],
-                    message=formatted_message,
-                    method="SMS"
-                )
-                
-                if success:
-                    db_manager.log_reminder(reminder['member_id'], template_type, formatted_message)
-                    sent_count += 1
-        
-        # Send kids reminders
+                message = message_manager.format_message(message_template, reminder)
+                address = email_address(reminder, suppressed) if use_email else None
+                if address:
+                    message = reminder_email(template_type, reminder, message, templates[f"{template_type}_email"])
+                outgoing.append({
+                    'idempotency_key': reminder_key(template_type, reminder['member_id'], reminder['next_due_date']),
+                    'source': "reminder",
+                    'member_id': reminder['member_id'],
+                    'log_type': template_type,
+                    'phone': address or reminder['phone'],
+                    'message': message,
+                    'channel': "Email" if address else "SMS",
+                    'priority': PRIORITY_OVERDUE if reminder['days_remaining'] < 0 else PRIORITY_NORMAL,
+                    'priority_score': reminder['priority_score'],
+                    'item': {
+                        'recipient_name': reminder['member_name'],
+                        'label': f"{reminder['member_name']} - {reminder['membership_type']}",
+                        'amount': reminder['amount'],
+                        'due_date': reminder['next_due_date'],
+                        'overdue': reminder['days_remaining'] < 0
+                    }
+                })
+        
+        # Kids reminders
         for reminder in pending_kids_reminders:
-            # Use parent reminder template or create a custom one
-            message_template = f"""Hi {reminder['parent_name']}! 🏸
-
-Your child {reminder['kid_name']}'s badminton training fee of ₹{reminder['amount']} is due on {reminder['next_due_date'].strftime('%d-%m-%Y')}.
-
-Please make the payment to continue the training sessions.
-
-Thank you!
-Contact: +91-9876543210"""
+            message_template = kids_reminder_message(reminder)
             
-            success = message_manager.send_message(
-                phone=reminder['phone'],
-                message=message_template,
-                method="SMS"
-            )
-            
-            if success:
-                # Log reminder for kids (using kid_id as member_id)
-                db_manager.log_reminder(reminder['kid_id'], "kids_payment_reminder", message_template)
-                sent_count += 1
+            # Log reminder for kids (using kid_id as member_id)
+            outgoing.append({
+                'idempotency_key': reminder_key("kids_payment_reminder", reminder['kid_id'], reminder['next_due_date']),
+                'source': "reminder",
+                'member_id': reminder['kid_id'],
+                'log_type': "kids_payment_reminder",
+                'phone': reminder['phone'],
+                'message': message_template,
+                'channel': "SMS",
+                'priority': PRIORITY_OVERDUE if reminder['days_remaining'] < 0 else PRIORITY_NORMAL,
+                'priority_score': reminder['priority_score'],
+                'item': {
+                    'recipient_name': reminder['parent_name'],
+                    'label': f"{reminder['kid_name']} - kids training",
+                    'amount': reminder['amount'],
+                    'due_date': reminder['next_due_date'],
+                    'overdue': reminder['days_remaining'] < 0
+                }
+            })
+        
+        # A reminder already queued for this due date is not queued again, so it takes none of the budget
+        outbox = Outbox(db_manager, clock=self.clock)
+        queued = outbox.queued_keys(message['idempotency_key'] for message in outgoing)
+        outgoing = [message for message in outgoing if message['idempotency_key'] not in queued]
+        
+        # Most valuable first; under a budget whatever doesn't fit waits for the next run
+        costs = [message_cost(message['message'], message['channel']) for message in outgoing]
+        outgoing = [outgoing[index] for index in
+                    select_within_budget([message['priority_score'] for message in outgoing], costs, budget)]
         
-        return sent_count
+        # A parent with several kids (or a member who is also a parent) gets one itemised message;
+        # firm and final reminders still go out on their own
+        outgoing = coalesce_reminders(outgoing)
+        
+        # Queue first, then send. Everything still waiting is spread over the send window (overdue
+        # first); this drain sends what is due now and the reminder service's outbox job sends the
+        # rest as their slots come up
+        outbox.enqueue(outgoing)
+        outbox.plan()
+        return outbox.drain(message_manager, source="reminder")['sent']
     
-    def get_reminder_statistics(self, db_manager, days_back=30):
-        """Get statistics about sent reminders"""
-        conn = sqlite3.connect(db_manager.db_path)
+    def forecast_reminders(self, db_manager, start_date=None, end_date=None, message_manager=None,
+                           payment_delay_days=0, budget=REMINDER_BUDGET):
+        """Per-day forecast of automatic reminders from start_date to end_date (default the next 30 days).
+        
+        Runs the rules of schedule_automatic_reminders forward from today's
+        data without sending or writing anything (see reminder_forecast.py),
+        with budget as the limit of each day's run. When message_manager can
+        send email, members with a working address are counted as emails.
+        Returns a DataFrame with a date column and FORECAST_COLUMNS.
+        """
+        today = self.clock.today()
+        start_date = max(start_date or today, today)
+        end_date = end_date or start_date + timedelta(days=FORECAST_DAYS - 1)
+        use_email = message_manager is not None and message_manager.is_configured("Email")
+        
+        subjects = self._forecast_subjects(db_manager, today, use_email)
+        days = max((end_date - today).days + 1, 0)
+        forecast = simulate_reminders(subjects, day_number(today), days, payment_delay_days, budget=budget)
+        return forecast[forecast['date'] >= start_date].reset_index(drop=True)
+    
+    def _forecast_subjects(self, db_manager, today, use_email):
+        """simulate_reminders input for every member and active kid, with what was already queued and sent"""
+        conn = open_connection(db_manager.db_path)
         cursor = conn.cursor()
         
-        cutoff_date = datetime.now() - timedelta(days=days_back)
+        # Members with their place on the escalation ladder, in the scheduler's order (it breaks
+        # priority ties by name, which decides who fits under a budget)
+        cursor.execute('''
+        SELECT m.id, m.name, m.phone, m.email, m.membership_type, m.amount, m.reminder_days,
+               q.due_date, q.escalation_level, q.last_reminded_at
+        FROM members m
+        JOIN reminder_queue q ON q.member_id = m.id
+        ORDER BY m.name
+        ''')
+        members = cursor.fetchall()
+        
+        # Due dates count from the last payment, or the start date before the first one
+        cursor.execute('''
+        SELECT k.id, k.kid_name, k.parent_name, k.monthly_fee, COALESCE(MAX(p.payment_date), k.start_date)
+        FROM kids_training k
+        LEFT JOIN kids_payment_history p ON p.kid_id = k.id
+        WHERE k.active = TRUE
+        GROUP BY k.id
+        ORDER BY k.kid_name
+        ''')
+        kids = cursor.fetchall()
+        
+        cursor.execute('''
+        SELECT member_id, MAX(sent_at) FROM reminder_logs
+        WHERE success = 1 AND sent_at >= ? AND reminder_type = 'kids_payment_reminder'
+        GROUP BY member_id
+        ''', ((today - timedelta(days=RECENT_REMINDER_DAYS + 1)).isoformat(),))
+        kids_last_sent = {kid_id: sent_at for kid_id, sent_at in cursor.fetchall()}
         
-        # Get reminder stats
+        # Reminders covered by a household message count as queued under their own keys too
+        cursor.execute('SELECT idempotency_key FROM outbox_keys')
+        queued = {row[0] for row in cursor.fetchall()}
         cursor.execute('''
-        SELECT reminder_type, COUNT(*) as count, SUM(success) as successful
-        FROM reminder_logs
-        WHERE sent_at >= ?
-        GROUP BY reminder_type
-        ''', (cutoff_date,))
+        SELECT idempotency_key, log_targets, created_at FROM outbox WHERE source = 'reminder'
+        ''')
+        # Household messages queued before outbox_keys only have their log targets: (member_id, log_type) -> day
+        # it was last queued
+        household_queued = {}
+        for idempotency_key, log_targets, created_at in cursor.fetchall():
+            queued.add(idempotency_key)
+            if log_targets:
+                created = day_number(date.fromisoformat(created_at[:10]))
+                for member_id, log_type in json.loads(log_targets):
+                    household_queued[(member_id, log_type)] = max(household_queued.get((member_id, log_type), NO_DAY),
+                                                                  created)
+        conn.close()
+        
+        template_engine = TemplateEngine(db_manager)
+        ladder_templates = {stage: template_engine.get(reminder_type)
+                            for stage, reminder_type in ESCALATION_LADDER.items()}
+        suppressed = db_manager.get_suppressed_emails() if use_email else set()
+        email_cost = message_cost("", "Email")
+        email_prices = ((0, 0, 0), (email_cost, email_cost, email_cost))
+        
+        def prices(texts):
+            """(segments, cost) of the gentle, firm and final texts"""
+            texts = list(texts)
+            return tuple(segment_info(text).segments for text in texts), tuple(message_cost(text) for text in texts)
+        
+        columns = {name: [] for name in ('due', 'period', 'window', 'kid', 'email', 'amount', 'segments', 'cost',
+                                         'level', 'last_sent')}
+        # Each simulated run happens at the current time of day, and a reminder blocks others until that
+        # time RECENT_REMINDER_DAYS later: count it on the day it was sent as seen from that time
+        run_time = self.clock.now() - datetime.combine(today, datetime.min.time())
+        
+        def add(subject_id, due_date, period, window, kid, amount, email, subject_prices, level, last_sent, rungs):
+            """rungs: (rung, reminder type, first day it can be sent for this due date) for each rung"""
+            # A rung already queued in the outbox won't be queued again for this due date
+            for stage, reminder_type, first_day in rungs:
+                if (reminder_key(reminder_type, subject_id, due_date) in queued
+                        or household_queued.get((subject_id, reminder_type), NO_DAY) >= first_day):
+                    level = max(level, stage)
+            columns['due'].append(day_number(due_date))
+            columns['period'].append(period)
+            columns['window'].append(window)
+            columns['kid'].append(kid)
+            columns['email'].append(email)
+            columns['amount'].append(amount or 0)
+            columns['segments'].append(subject_prices[0])
+            columns['cost'].append(subject_prices[1])
+            columns['level'].append(level)
+            columns['last_sent'].append(day_number((datetime.fromisoformat(last_sent) - run_time).date())
+                                        if last_sent else NO_DAY)
+        
+        # Texts only differ in the values filled in, so members whose values have the same lengths (and
+        # whose names are plain GSM-7) share segment counts: render and price one set of texts per shape
+        shape_prices = {}
+        
+        for (member_id, name, phone, email, membership_type, amount, reminder_days, due_date, escalation_level,
+             last_reminded_at) in members:
+            next_due_date = date.fromisoformat(due_date)
+            reminder = {
+                'member_id': member_id,
+                'member_name': name,
+                'phone': phone,
+                'email': email,
+                'membership_type': membership_type,
+                'amount': amount,
+                'next_due_date': next_due_date
+            }
+            address = email_address(reminder, suppressed) if use_email else None
+            due = day_number(next_due_date)
+            rungs = ((GENTLE, due - reminder_days), (FIRM, due + 1), (FINAL, due + FINAL_NOTICE_DAYS))
+            subject_prices = email_prices
+            if not address:
+                # Later due dates only change digits, not the segment count
+                rendered_on = [max(today, next_due_date + timedelta(days=first_day - due)) for _, first_day in rungs]
+                shape = None
+                if set(name) <= GSM7_BASIC:
+                    shape = (len(name), str(amount), membership_type,
+                             tuple(len(str((day - next_due_date).days)) for day in rendered_on))
+                subject_prices = shape_prices.get(shape)
+                if subject_prices is None:
+                    subject_prices = prices(render_template(ladder_templates[stage], reminder, today=day)
+                                            for (stage, _), day in zip(rungs, rendered_on))
+                    if shape:
+                        shape_prices[shape] = subject_prices
+            add(member_id, next_due_date, calculate_membership_duration(membership_type), reminder_days, False,
+                amount, bool(address), subject_prices, escalation_level, last_reminded_at,
+                [(stage, ESCALATION_LADDER[stage], first_day) for stage, first_day in rungs])
+        
+        for kid_id, kid_name, parent_name, monthly_fee, paid_from in kids:
+            next_due_date = date.fromisoformat(paid_from[:10]) + timedelta(days=KIDS_PAYMENT_DAYS)
+            text = kids_reminder_message({'parent_name': parent_name, 'kid_name': kid_name, 'amount': monthly_fee,
+                                          'next_due_date': next_due_date})
+            (segments,), (cost,) = prices([text])
+            add(kid_id, next_due_date, KIDS_PAYMENT_DAYS, KIDS_REMINDER_DAYS, True, monthly_fee, False,
+                ((segments,) * 3, (cost,) * 3), NOT_REMINDED, kids_last_sent.get(kid_id),
+                [(GENTLE, "kids_payment_reminder", day_number(next_due_date) - KIDS_REMINDER_DAYS)])
+        
+        return {
+            'due': np.array(columns['due'], dtype=np.int64),
+            'period': np.array(columns['period'], dtype=np.int64),
+            'window': np.array(columns['window'], dtype=np.int64),
+            'kid': np.array(columns['kid'], dtype=bool),
+            'email': np.array(columns['email'], dtype=bool),
+            'amount': np.array(columns['amount'], dtype=float),
+            'segments': np.array(columns['segments'], dtype=float).reshape(-1, 3),
+            'cost': np.array(columns['cost'], dtype=float).reshape(-1, 3),
+            'level': np.array(columns['level'], dtype=np.int64),
+            'last_sent': np.array(columns['last_sent'], dtype=np.int64),
+        }
+    
+    def get_reminder_statistics(self, db_manager, days_back=30):
+        """Get statistics about sent reminders, with delivery rates from status callbacks.
+        
+        Read from the daily rollup (reminder_stats_daily), so the last
+        days_back days are counted in whole days up to today.
+        """
+        start_date = self.clock.today() - timedelta(days=days_back)
+        totals = db_manager.get_reminder_stats(start_date, granularity=None)
         
         stats = {}
-        for row in cursor.fetchall():
-            reminder_type, count, successful = row
-            stats[reminder_type] = {
+        # Only reminders sent through Twilio have a SID to match callbacks against
+        for row in totals.to_dict('records'):
+            count, successful, tracked, delivered, undelivered = (
+                int(row[column]) for column in ('sent', 'successful', 'tracked', 'delivered', 'undelivered'))
+            stats[row['reminder_type']] = {
                 'total_sent': count,
                 'successful': successful,
                 'failed': count - successful,
-                'success_rate': (successful / count * 100) if count > 0 else 0
+                'success_rate': (successful / count * 100) if count > 0 else 0,
+                'tracked': tracked,
+                'delivered': delivered,
+                'undelivered': undelivered,
+                'awaiting_status': tracked - delivered - undelivered,
+                'delivery_rate': (delivered / tracked * 100) if tracked > 0 else None
             }
         
-        conn.close()
         return stats
+
+instrument_class(ReminderScheduler)
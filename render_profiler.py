@@ -0,0 +1,219 @@
+"""Per-rerun render profiler for the Streamlit app.
+
+A RenderProfiler times one rerun of app.main as a tree of sections: the page
+function is a section, and page code can split itself further with
+mark_section("...") (lasts until the next mark or the end of the section) or
+`with profile_section("...")`. DatabaseManager and ReminderScheduler calls are
+grouped under the section they ran in (via the query instrumentation), and the
+rerun can optionally run under cProfile.
+
+Nothing here touches Streamlit; the panel lives in app.py.
+"""
+
+import io
+import os
+import html
+import time
+import pstats
+import cProfile
+import contextlib
+import contextvars
+from datetime import datetime
+
+from instrumentation import set_method_observer, reset_method_observer
+
+PROFILER_HISTORY_SIZE = int(os.getenv("KJ_PROFILER_HISTORY", "20"))
+CPROFILE_TOP_N = 30
+
+_active_profiler = contextvars.ContextVar("active_profiler", default=None)
+
+class ProfileNode:
+    __slots__ = ('name', 'kind', 'start', 'elapsed_ms', 'children', 'db_calls')
+    
+    def __init__(self, name, kind='section'):
+        self.name = name
+        self.kind = kind
+        self.start = time.perf_counter()
+        self.elapsed_ms = 0.0
+        self.children = []
+        # {method name: [calls, ms]}
+        self.db_calls = {}
+    
+    def stop(self):
+        self.elapsed_ms = (time.perf_counter() - self.start) * 1000
+    
+    def db_ms(self):
+        """DB time in this node and everything below it"""
+        return (sum(ms for _, ms in self.db_calls.values())
+                + sum(child.db_ms() for child in self.children))
+    
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'ms': round(self.elapsed_ms, 2),
+            'db': {name: [calls, round(ms, 2)] for name, (calls, ms) in self.db_calls.items()},
+            'children': [child.to_dict() for child in self.children],
+        }
+
+class RenderProfiler:
+    def __init__(self, use_cprofile=False):
+        self.root = ProfileNode("Rerun", kind='rerun')
+        self.stack = [self.root]
+        self.page = "-"
+        self.started_at = datetime.now()
+        self.profile = cProfile.Profile() if use_cprofile else None
+        self.cprofile_text = None
+        self._tokens = None
+    
+    def start(self):
+        self._tokens = (_active_profiler.set(self), set_method_observer(self._on_db_call))
+        if self.profile is not None:
+            try:
+                self.profile.enable()
+            except ValueError:
+                # Another profiler is already running in this process
+                self.profile = None
+    
+    def stop(self):
+        if self.profile is not None:
+            self.profile.disable()
+            output = io.StringIO()
+            pstats.Stats(self.profile, stream=output).sort_stats('cumulative').print_stats(CPROFILE_TOP_N)
+            self.cprofile_text = output.getvalue()
+            self.profile = None
+        
+        while len(self.stack) > 1:
+            self.stack.pop().stop()
+        self.root.stop()
+        
+        if self._tokens is not None:
+            profiler_token, observer_token = self._tokens
+            reset_method_observer(observer_token)
+            _active_profiler.reset(profiler_token)
+            self._tokens = None
+    
+    def _on_db_call(self, name, elapsed_ms):
+        entry = self.stack[-1].db_calls.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed_ms
+    
+    def _close_mark(self):
+        if self.stack[-1].kind == 'mark':
+            self.stack.pop().stop()
+    
+    def _open(self, name, kind):
+        node = ProfileNode(name, kind)
+        self.stack[-1].children.append(node)
+        self.stack.append(node)
+        return node
+    
+    @contextlib.contextmanager
+    def section(self, name):
+        self._close_mark()
+        node = self._open(name, 'section')
+        try:
+            yield node
+        finally:
+            # Marks opened inside the section end with it
+            while self.stack[-1] is not node:
+                self.stack.pop().stop()
+            self.stack.pop().stop()
+    
+    def mark(self, name):
+        self._close_mark()
+        self._open(name, 'mark')
+    
+    def to_entry(self):
+        """Summary of the finished rerun for the history"""
+        total_ms = self.root.elapsed_ms
+        db_ms = self.root.db_ms()
+        db_calls = {}
+        for node in _walk(self.root):
+            for name, (calls, ms) in node.db_calls.items():
+                entry = db_calls.setdefault(name, [0, 0.0])
+                entry[0] += calls
+                entry[1] += ms
+        return {
+            'at': self.started_at.strftime('%H:%M:%S'),
+            'page': self.page,
+            'total_ms': round(total_ms, 2),
+            'db_ms': round(db_ms, 2),
+            'other_ms': round(max(total_ms - db_ms, 0.0), 2),
+            'db_calls': sum(calls for calls, _ in db_calls.values()),
+            'db_breakdown': {name: [calls, round(ms, 2)] for name, (calls, ms) in db_calls.items()},
+            'tree': self.root.to_dict(),
+            'cprofile': self.cprofile_text,
+        }
+
+def _walk(node):
+    yield node
+    for child in node.children:
+        yield from _walk(child)
+
+def start_rerun_profile(use_cprofile=False):
+    profiler = RenderProfiler(use_cprofile)
+    profiler.start()
+    return profiler
+
+@contextlib.contextmanager
+def profile_section(name):
+    """Time a block as a section of the current rerun (no-op when not profiling)"""
+    profiler = _active_profiler.get()
+    if profiler is None:
+        yield None
+        return
+    with profiler.section(name) as node:
+        yield node
+
+def mark_section(name):
+    """Start a section that lasts until the next mark or the end of the enclosing section"""
+    profiler = _active_profiler.get()
+    if profiler is not None:
+        profiler.mark(name)
+
+def flatten_sections(tree, depth=0):
+    """Rows of (depth, name, ms, db ms) for a serialized tree, in render order"""
+    db_ms = sum(ms for _, ms in tree['db'].values())
+    rows = []
+    for child in tree['children']:
+        rows.extend(flatten_sections(child, depth + 1))
+    child_db_ms = sum(row[3] for row in rows if row[0] == depth + 1)
+    return [(depth, tree['name'], tree['ms'], round(db_ms + child_db_ms, 2))] + rows
+
+# Flame-style (icicle) colours per node kind
+FLAME_COLORS = {
+    'rerun': '#5c6bc0',
+    'section': '#1f77b4',
+    'mark': '#4c9ed9',
+    'db': '#ff7f0e',
+    'other': '#b0b0b0',
+}
+
+def _flame_node_html(name, kind, ms, parent_ms, children):
+    width = 100 * ms / parent_ms if parent_ms else 100
+    label = html.escape(f"{name} ({ms:.1f} ms)")
+    markup = (f'<div style="flex: 0 0 {width:.3f}%; min-width: 0; box-sizing: border-box; padding: 1px;">'
+              f'<div title="{label}" style="background: {FLAME_COLORS[kind]}; color: white; font-size: 0.75rem; '
+              f'padding: 2px 4px; white-space: nowrap; overflow: hidden; text-overflow: ellipsis; '
+              f'border-radius: 2px;">{label}</div>')
+    if children:
+        markup += '<div style="display: flex;">' + "".join(children) + '</div>'
+    return markup + '</div>'
+
+def _flame_children(tree):
+    ms = tree['ms']
+    children = [_flame_html(child, ms) for child in tree['children']]
+    children += [_flame_node_html(f"DB {name.split('.')[-1]} ×{calls}", 'db', db_ms, ms, [])
+                 for name, (calls, db_ms) in sorted(tree['db'].items(), key=lambda item: -item[1][1])]
+    accounted = sum(child['ms'] for child in tree['children']) + sum(db_ms for _, db_ms in tree['db'].values())
+    if children and ms - accounted > 0.05 * ms:
+        children.append(_flame_node_html("widgets & python", 'other', ms - accounted, ms, []))
+    return children
+
+def _flame_html(tree, parent_ms):
+    return _flame_node_html(tree['name'], tree['kind'], tree['ms'], parent_ms, _flame_children(tree))
+
+def flame_html(tree):
+    """HTML icicle chart of a serialized rerun tree; widths are shares of the parent"""
+    return '<div style="display: flex; width: 100%;">' + _flame_html(tree, tree['ms']) + '</div>'
@@ -0,0 +1,166 @@
+"""Send-window shaping for automatic reminders.
+
+Reminders are not sent in one burst when the daily job runs. The job queues
+them in the outbox and SendWindow.slots spreads the pending reminders evenly
+over what is left of the day's send window (SEND_WINDOW, e.g. "09:00-20:00"),
+skipping quiet hours (QUIET_HOURS, e.g. "13:00-14:00,22:00-07:00") and never
+closer together than SEND_RATE_PER_MINUTE allows; whatever doesn't fit today
+continues in the next window. Overdue reminders get the earliest slots. Each
+row's slot is stored as its outbox next_attempt_at, so the plan survives a
+restart and the reminder service's minute-by-minute outbox drain sends rows
+as their slots come up, paced at the same rate. Retries of reminders are
+moved out of quiet hours too. SEND_WINDOW="" turns shaping off, and so does
+a configuration that can't be used (a malformed range, or quiet hours that
+cover the whole window): the problem is printed and reminders are sent
+without shaping rather than stopping the app from starting.
+"""
+
+import os
+from datetime import datetime, timedelta, time as dt_time
+
+from clock import DEFAULT_CLOCK
+
+SEND_WINDOW_SPEC = os.getenv("SEND_WINDOW", "09:00-20:00")
+QUIET_HOURS_SPEC = os.getenv("QUIET_HOURS", "")
+SEND_RATE_PER_MINUTE = float(os.getenv("SEND_RATE_PER_MINUTE", "30"))
+# How far ahead next_open and slots look for an open window
+MAX_LOOKAHEAD_DAYS = 14
+
+def parse_time_range(spec):
+    """(start, end) times from "HH:MM-HH:MM"; end <= start means the range runs past midnight"""
+    start_text, separator, end_text = spec.partition('-')
+    if not separator:
+        raise ValueError(f"Time range needs HH:MM-HH:MM: {spec!r}")
+    start = datetime.strptime(start_text.strip(), '%H:%M').time()
+    end = datetime.strptime(end_text.strip(), '%H:%M').time()
+    return start, end
+
+def _on_day(day, time_range):
+    """The datetimes a time range covers when it starts on `day`"""
+    start, end = time_range
+    start_at = datetime.combine(day, start)
+    end_at = datetime.combine(day, end)
+    if end_at <= start_at:
+        end_at += timedelta(days=1)
+    return start_at, end_at
+
+def _subtract(interval, cut):
+    start, end = interval
+    cut_start, cut_end = cut
+    if cut_end <= start or cut_start >= end:
+        return [interval]
+    pieces = []
+    if cut_start > start:
+        pieces.append((start, cut_start))
+    if cut_end < end:
+        pieces.append((cut_end, end))
+    return pieces
+
+class SendWindow:
+    """Daily send window minus quiet hours, with a maximum send rate; slots start from `clock`'s now by default"""
+    
+    def __init__(self, window=(dt_time(9), dt_time(20)), quiet_hours=(), rate_per_minute=SEND_RATE_PER_MINUTE,
+                 clock=DEFAULT_CLOCK):
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute must be positive")
+        self.window = window
+        self.quiet_hours = list(quiet_hours)
+        self.rate_per_minute = rate_per_minute
+        self.clock = clock
+        if not self.open_intervals(self.clock.today()):
+            raise ValueError("Quiet hours cover the whole send window")
+    
+    @classmethod
+    def from_env(cls):
+        """The window configured by SEND_WINDOW, QUIET_HOURS and SEND_RATE_PER_MINUTE; None when SEND_WINDOW is empty"""
+        if not SEND_WINDOW_SPEC.strip():
+            return None
+        quiet_hours = [parse_time_range(part) for part in QUIET_HOURS_SPEC.split(',') if part.strip()]
+        return cls(parse_time_range(SEND_WINDOW_SPEC), quiet_hours, SEND_RATE_PER_MINUTE)
+    
+    @property
+    def min_spacing_seconds(self):
+        return 60 / self.rate_per_minute
+    
+    @property
+    def rate_per_second(self):
+        return self.rate_per_minute / 60
+    
+    def describe(self):
+        start, end = self.window
+        text = f"{start:%H:%M}-{end:%H:%M}"
+        if self.quiet_hours:
+            text += " (quiet " + ", ".join(f"{a:%H:%M}-{b:%H:%M}" for a, b in self.quiet_hours) + ")"
+        return f"{text}, at most {self.rate_per_minute:g} per minute"
+    
+    def open_intervals(self, day):
+        """[(start, end), ...] datetimes when sending is allowed in the window that starts on `day`"""
+        intervals = [_on_day(day, self.window)]
+        for quiet in self.quiet_hours:
+            # A quiet range from the previous day can run into this window, one from this day past midnight
+            for quiet_day in (day - timedelta(days=1), day, day + timedelta(days=1)):
+                cut = _on_day(quiet_day, quiet)
+                intervals = [piece for interval in intervals for piece in _subtract(interval, cut)]
+        return intervals
+    
+    def _intervals_from(self, moment):
+        """(window day, start, end) for each open interval ending after moment, in order"""
+        # A window running past midnight may have started the day before
+        day = moment.date() - timedelta(days=1)
+        for _ in range(MAX_LOOKAHEAD_DAYS + 1):
+            for start, end in self.open_intervals(day):
+                if end > moment:
+                    yield day, max(start, moment), end
+            day += timedelta(days=1)
+    
+    def next_open(self, moment):
+        """moment itself when sending is allowed then, otherwise the start of the next open interval"""
+        for _, start, _ in self._intervals_from(moment):
+            return start
+        return moment
+    
+    def is_open(self, moment):
+        return self.next_open(moment) == moment
+    
+    def slots(self, count, start=None):
+        """Send times for `count` messages from `start`, evenly spread over the rest of the first open window.
+        
+        Messages are spaced by the open time left in that window divided by
+        count, but at least min_spacing_seconds apart; when they don't all fit,
+        the rest continue at the same spacing in the following windows.
+        """
+        if count <= 0:
+            return []
+        start = (start or self.clock.now()).replace(microsecond=0)
+        intervals = list(self._intervals_from(start))
+        if not intervals:
+            return [start] * count
+        
+        first_day = intervals[0][0]
+        available = sum((end - begin).total_seconds() for day, begin, end in intervals if day == first_day)
+        spacing = max(self.min_spacing_seconds, available / count)
+        
+        slots = []
+        offset = 0.0
+        for _, begin, end in intervals:
+            length = (end - begin).total_seconds()
+            while offset < length and len(slots) < count:
+                slots.append(begin + timedelta(seconds=int(offset)))
+                offset += spacing
+            if len(slots) == count:
+                return slots
+            offset -= length
+        # Lookahead exhausted (only with a very low rate): the rest follow at the same spacing
+        last = slots[-1] if slots else start
+        slots.extend(last + timedelta(seconds=int(spacing * (index + 1))) for index in range(count - len(slots)))
+        return slots
+
+def load_send_window():
+    """SendWindow.from_env(), or None (no shaping) when the configuration is invalid"""
+    try:
+        return SendWindow.from_env()
+    except ValueError as e:
+        print(f"Invalid send window configuration, sending without one: {e}")
+        return None
+
+SEND_WINDOW = load_send_window()
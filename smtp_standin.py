@@ -0,0 +1,278 @@
+"""Local stand-in SMTP server for the Email channel.
+
+Usage:
+    python smtp_standin.py --port 8025 --latency-ms 40 --connect-latency-ms 150
+    SMTP_HOST=127.0.0.1 SMTP_PORT=8025 SMTP_SECURITY=none EMAIL_FROM=court@example.com \\
+        streamlit run app.py
+
+Speaks enough ESMTP for EmailProvider: EHLO (advertising PIPELINING and
+AUTH PLAIN), AUTH, MAIL, RCPT, DATA, RSET, NOOP and QUIT. Every reply that
+the client had to wait for costs latency_ms, and a new connection costs
+connect_latency_ms before the greeting (standing in for TCP and TLS setup),
+so pooled and pipelined sending can be compared with one connection per
+message. Recipients whose address starts with "bounce" are refused with 550
+(a hard bounce) and those starting with "defer" with 451 (a soft bounce).
+Accepted messages are kept in memory (the last 1000); nothing is delivered.
+"""
+
+import time
+import base64
+import socket
+import argparse
+import threading
+import socketserver
+from collections import deque
+from email import message_from_bytes, policy
+
+MAX_LINE = 8192
+KEPT_MESSAGES = 1000
+
+class SmtpStandinConfig:
+    def __init__(self, latency_ms=20, connect_latency_ms=100, username=None, password=None):
+        # Added before each reply the client waits for (one round trip)
+        self.latency_ms = latency_ms
+        # Added before the greeting of each new connection
+        self.connect_latency_ms = connect_latency_ms
+        # When set, MAIL requires AUTH PLAIN with these credentials
+        self.username = username
+        self.password = password
+
+class SmtpStandin:
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or SmtpStandinConfig()
+        self.server = _SmtpServer((host, port), _make_handler(self))
+        self.lock = threading.Lock()
+        self.messages = deque(maxlen=KEPT_MESSAGES)
+        self.reset_stats()
+        self._thread = None
+    
+    @property
+    def address(self):
+        return self.server.server_address[:2]
+    
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {
+                'connections': 0,
+                'open_connections': 0,
+                'max_open_connections': 0,
+                'round_trips': 0,
+                'messages': 0,
+                'rejected_recipients': 0,
+                'auth_failures': 0,
+            }
+            self.messages.clear()
+    
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats)
+    
+    def _count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+            if key == 'open_connections':
+                self.stats['max_open_connections'] = max(self.stats['max_open_connections'],
+                                                         self.stats['open_connections'])
+    
+    def _accept(self, sender, recipients, data):
+        message = message_from_bytes(data, policy=policy.default)
+        with self.lock:
+            self.stats['messages'] += 1
+            self.messages.append({
+                'from': sender,
+                'to': list(recipients),
+                'subject': message['Subject'],
+                'message_id': message['Message-ID'],
+                'content_types': [part.get_content_type() for part in message.walk()],
+            })
+    
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc_info):
+        self.stop()
+
+class _SmtpServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+def _recipient_reply(address):
+    local_part = address.partition('@')[0].lower()
+    if local_part.startswith("bounce"):
+        return "550 5.1.1 Recipient address rejected: user unknown"
+    if local_part.startswith("defer"):
+        return "451 4.2.0 Mailbox temporarily unavailable, try again later"
+    return None
+
+def _address(argument):
+    # "FROM:<a@b.c> SIZE=123" -> "a@b.c"
+    value = argument.partition(':')[2].strip()
+    if value.startswith('<'):
+        value = value[1:value.find('>')]
+    return value.split()[0] if value else ""
+
+def _make_handler(standin):
+    config = standin.config
+    
+    class Handler(socketserver.BaseRequestHandler):
+        def setup(self):
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.buffer = b""
+            # True when input was read from the socket since the last reply, i.e. the client is waiting
+            self.waiting = False
+            self.authenticated = not config.username
+            self.reset()
+        
+        def reset(self):
+            self.sender = None
+            self.recipients = []
+        
+        def readline(self):
+            while b"\r\n" not in self.buffer:
+                chunk = self.request.recv(65536)
+                if not chunk:
+                    return None
+                self.buffer += chunk
+                self.waiting = True
+                if len(self.buffer) > MAX_LINE and b"\r\n" not in self.buffer:
+                    return None
+            line, self.buffer = self.buffer.split(b"\r\n", 1)
+            return line
+        
+        def reply(self, text):
+            if self.waiting:
+                standin._count('round_trips')
+                time.sleep(config.latency_ms / 1000)
+                self.waiting = False
+            self.request.sendall(text.encode('utf-8') + b"\r\n")
+        
+        def handle(self):
+            standin._count('connections')
+            standin._count('open_connections')
+            try:
+                time.sleep(config.connect_latency_ms / 1000)
+                self.request.sendall(b"220 smtp-standin ESMTP ready\r\n")
+                while True:
+                    line = self.readline()
+                    if line is None:
+                        return
+                    command, _, argument = line.decode('utf-8', 'replace').partition(' ')
+                    if not self.dispatch(command.upper(), argument):
+                        return
+            except OSError:
+                return
+            finally:
+                standin._count('open_connections', -1)
+        
+        def dispatch(self, command, argument):
+            """Handle one command; returns False when the connection should close"""
+            if command in ("EHLO", "HELO"):
+                self.reset()
+                if command == "HELO":
+                    self.reply("250 smtp-standin")
+                else:
+                    self.reply("250-smtp-standin\r\n250-PIPELINING\r\n250-8BITMIME\r\n250-SIZE 10485760\r\n"
+                               "250 AUTH PLAIN")
+            elif command == "AUTH":
+                self.auth(argument)
+            elif command == "MAIL":
+                if not self.authenticated:
+                    self.reply("530 5.7.0 Authentication required")
+                else:
+                    self.reset()
+                    self.sender = _address(argument)
+                    self.reply("250 2.1.0 OK")
+            elif command == "RCPT":
+                if self.sender is None:
+                    self.reply("503 5.5.1 MAIL first")
+                    return True
+                recipient = _address(argument)
+                refusal = _recipient_reply(recipient)
+                if refusal:
+                    standin._count('rejected_recipients')
+                    self.reply(refusal)
+                else:
+                    self.recipients.append(recipient)
+                    self.reply("250 2.1.5 OK")
+            elif command == "DATA":
+                if not self.recipients:
+                    self.reply("503 5.5.1 RCPT first")
+                    return True
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    line = self.readline()
+                    if line is None:
+                        return False
+                    if line == b".":
+                        break
+                    lines.append(line[1:] if line.startswith(b".") else line)
+                standin._accept(self.sender, self.recipients, b"\r\n".join(lines) + b"\r\n")
+                self.reset()
+                self.reply("250 2.0.0 Queued")
+            elif command == "RSET":
+                self.reset()
+                self.reply("250 2.0.0 OK")
+            elif command == "NOOP":
+                self.reply("250 2.0.0 OK")
+            elif command == "QUIT":
+                self.reply("221 2.0.0 Bye")
+                return False
+            else:
+                self.reply("502 5.5.2 Command not recognized")
+            return True
+        
+        def auth(self, argument):
+            mechanism, _, initial = argument.partition(' ')
+            if mechanism.upper() != "PLAIN":
+                self.reply("504 5.5.4 Unrecognized authentication type")
+                return
+            if not initial:
+                self.reply("334 ")
+                initial = (self.readline() or b"").decode('ascii', 'replace')
+            try:
+                _, username, password = base64.b64decode(initial).decode('utf-8').split('\0')
+            except ValueError:
+                self.reply("501 5.5.2 Cannot decode AUTH parameter")
+                return
+            if config.username and (username, password) != (config.username, config.password):
+                standin._count('auth_failures')
+                self.reply("535 5.7.8 Authentication credentials invalid")
+                return
+            self.authenticated = True
+            self.reply("235 2.7.0 Authentication successful")
+    
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SMTP stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency-ms", type=float, default=20, help="Delay per round trip")
+    parser.add_argument("--connect-latency-ms", type=float, default=100, help="Delay before each greeting")
+    parser.add_argument("--username", help="Require AUTH PLAIN with this username")
+    parser.add_argument("--password", default="")
+    args = parser.parse_args()
+    
+    config = SmtpStandinConfig(args.latency_ms, args.connect_latency_ms, args.username, args.password)
+    standin = SmtpStandin(config, args.host, args.port).start()
+    host, port = standin.address
+    print(f"SMTP stand-in listening on {host}:{port} (set SMTP_HOST={host} SMTP_PORT={port} SMTP_SECURITY=none)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        standin.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""Receiver for Twilio message status callbacks.
+
+Usage:
+    python status_webhook.py --port 8098
+    TWILIO_STATUS_CALLBACK_URL=https://example.com/twilio/status streamlit run app.py
+
+Twilio posts each message's status (queued, sent, delivered, undelivered,
+failed, read for WhatsApp) to the StatusCallback URL MessageManager passes
+when TWILIO_STATUS_CALLBACK_URL is set. Request handlers only put the update
+into an in-memory StatusBuffer, which keeps the furthest status per message
+SID, and a flusher thread writes the buffer to message_status in one
+transaction every FLUSH_INTERVAL_SECONDS or FLUSH_BATCH_SIZE updates. A
+callback burst after a large announcement therefore costs a few short write
+transactions instead of one per callback. When an auth token is configured,
+callbacks without a valid X-Twilio-Signature are rejected.
+"""
+
+import os
+import json
+import time
+import argparse
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from twilio.request_validator import RequestValidator
+
+from database import DatabaseManager
+
+STATUS_PATH = "/twilio/status"
+FLUSH_BATCH_SIZE = int(os.getenv("STATUS_WEBHOOK_BATCH_SIZE", "500"))
+FLUSH_INTERVAL_SECONDS = float(os.getenv("STATUS_WEBHOOK_FLUSH_SECONDS", "2"))
+
+# Callbacks can arrive out of order; a status only replaces one of the same or lower rank
+STATUS_RANKS = {
+    'accepted': 0,
+    'scheduled': 0,
+    'queued': 1,
+    'sending': 2,
+    'sent': 3,
+    'delivered': 4,
+    'undelivered': 4,
+    'failed': 4,
+    'canceled': 4,
+    'read': 5,
+}
+
+class _CallbackServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Twilio opens many connections at once during a burst; the default backlog of 5 resets them
+    request_queue_size = 256
+
+def _error_code(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+class StatusBuffer:
+    """Status updates keyed by message SID, flushed to message_status in batches"""
+    
+    def __init__(self, db_manager, batch_size=FLUSH_BATCH_SIZE, flush_interval=FLUSH_INTERVAL_SECONDS, clock=None):
+        self.db_manager = db_manager
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # updated_at follows the database's clock, like get_message_status_counts' window
+        self.clock = clock or db_manager.clock
+        # provider_sid -> (provider_sid, status, status_rank, error_code, phone, updated_at)
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.stats = {'received': 0, 'flushed': 0, 'flushes': 0, 'failed_flushes': 0}
+    
+    def add(self, sid, status, error_code=None, phone=None):
+        """Buffer one callback; returns False for a status we don't know"""
+        status = (status or "").lower()
+        rank = STATUS_RANKS.get(status)
+        if rank is None:
+            return False
+        row = (sid, status, rank, _error_code(error_code), phone, self.clock.timestamp())
+        with self.lock:
+            self.stats['received'] += 1
+            self._merge(row)
+            full = len(self.pending) >= self.batch_size
+        if full:
+            self.wake.set()
+        return True
+    
+    def _merge(self, row):
+        existing = self.pending.get(row[0])
+        if existing is None or row[2] >= existing[2]:
+            self.pending[row[0]] = row
+    
+    def flush(self):
+        """Write everything buffered in one transaction; returns the number of messages written"""
+        with self.flush_lock:
+            with self.lock:
+                rows, self.pending = list(self.pending.values()), {}
+            if not rows:
+                return 0
+            written = self.db_manager.record_message_statuses(rows)
+            with self.lock:
+                self.stats['flushes'] += 1
+                if written is False:
+                    # Keep the updates for the next flush, behind anything newer that arrived meanwhile
+                    self.stats['failed_flushes'] += 1
+                    for row in rows:
+                        self._merge(row)
+                    return 0
+                self.stats['flushed'] += written
+            return written
+    
+    def _run(self):
+        while not self.stopping.is_set():
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+    
+    def start(self):
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, name="status-flush", daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        """Stop the flusher and write what is left"""
+        self.stopping.set()
+        self.wake.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        self.flush()
+    
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats, pending=len(self.pending))
+
+class StatusWebhook:
+    """HTTP receiver for status callbacks, feeding a StatusBuffer"""
+    
+    def __init__(self, db_manager, host="127.0.0.1", port=0, auth_token=None, public_url=None,
+                 batch_size=FLUSH_BATCH_SIZE, flush_interval=FLUSH_INTERVAL_SECONDS, clock=None):
+        self.buffer = StatusBuffer(db_manager, batch_size, flush_interval, clock)
+        self.validator = RequestValidator(auth_token) if auth_token else None
+        self.server = _CallbackServer((host, port), _make_handler(self))
+        # The URL Twilio posts to, which the signature covers (differs from base_url behind a proxy)
+        self.public_url = (public_url or self.base_url).rstrip('/')
+        self.rejected = 0
+        self._thread = None
+    
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    @property
+    def callback_url(self):
+        return f"{self.public_url}{STATUS_PATH}"
+    
+    def start(self):
+        self.buffer.start()
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.buffer.stop()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc_info):
+        self.stop()
+    
+    def _reject(self):
+        with self.buffer.lock:
+            self.rejected += 1
+    
+    def handle(self, method, path, headers, form):
+        """Route one request; returns (status, body dict or None)"""
+        if method == 'GET' and path == '/health':
+            return 200, dict(self.buffer.snapshot(), rejected=self.rejected)
+        if path != STATUS_PATH:
+            return 404, {'error': "Not found"}
+        if method != 'POST':
+            return 405, {'error': "Method not allowed"}
+        
+        if self.validator and not self.validator.validate(f"{self.public_url}{STATUS_PATH}", form,
+                                                          headers.get('X-Twilio-Signature', '')):
+            self._reject()
+            return 403, {'error': "Invalid signature"}
+        
+        sid = form.get('MessageSid') or form.get('SmsSid')
+        status = form.get('MessageStatus') or form.get('SmsStatus')
+        if not sid or not self.buffer.add(sid, status, form.get('ErrorCode'), form.get('To')):
+            self._reject()
+            return 400, {'error': "MessageSid and a known MessageStatus are required"}
+        return 204, None
+
+def _make_handler(webhook):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        
+        def _respond(self, method):
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length).decode('utf-8') if length else ""
+            form = dict(urllib.parse.parse_qsl(raw, keep_blank_values=True))
+            path = urllib.parse.urlsplit(self.path).path
+            
+            status, body = webhook.handle(method, path, self.headers, form)
+            payload = json.dumps(body).encode('utf-8') if body is not None else b""
+            self.send_response(status)
+            if payload:
+                self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        
+        def do_GET(self):
+            self._respond('GET')
+        
+        def do_POST(self):
+            self._respond('POST')
+        
+        def log_message(self, format, *args):
+            pass
+    
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Receive Twilio status callbacks into message_status")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8098)
+    parser.add_argument("--db", default="badminton_court.db")
+    parser.add_argument("--public-url", help="Externally visible base URL Twilio posts to (for signatures)")
+    parser.add_argument("--no-validate", action="store_true", help="Accept callbacks without a valid signature")
+    parser.add_argument("--batch-size", type=int, default=FLUSH_BATCH_SIZE)
+    parser.add_argument("--flush-seconds", type=float, default=FLUSH_INTERVAL_SECONDS)
+    args = parser.parse_args()
+    
+    auth_token = None if args.no_validate else os.getenv("TWILIO_AUTH_TOKEN") or None
+    webhook = StatusWebhook(DatabaseManager(args.db), args.host, args.port, auth_token, args.public_url,
+                            args.batch_size, args.flush_seconds).start()
+    print(f"Status webhook listening on {webhook.base_url}; set TWILIO_STATUS_CALLBACK_URL={webhook.callback_url}")
+    if not auth_token:
+        print("Signature validation is off (no TWILIO_AUTH_TOKEN)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        webhook.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Compiled message templates.
+
+A template from message_templates is parsed once into literal text and
+placeholder fields, checked against the variables reminders provide, and
+cached: by text (compile_template) and by template type and version
+(TemplateEngine), so editing a template in Message Settings bumps its
+version and the next render picks up the new text. Rendering only fills in
+values; the due date comes from a function passed in by the caller, so no
+database work happens per recipient.
+"""
+
+import string
+import threading
+from functools import lru_cache
+from datetime import datetime
+
+import clock
+from utils import calculate_next_due_date
+
+COURT_NAME = "KJ Badminton Academy"
+CONTACT_PHONE = "+91-9876543210"
+
+# Placeholder -> description, as listed on the Message Settings page
+TEMPLATE_VARIABLES = {
+    'member_name': "Member's full name",
+    'amount': "Payment amount",
+    'due_date': "Next payment due date",
+    'membership_type': "Type of membership",
+    'overdue_days': "Number of days overdue",
+    'court_name': "Your badminton court name",
+    'phone': "Your contact phone number",
+}
+
+_formatter = string.Formatter()
+
+class TemplateError(ValueError):
+    """A template that can't be rendered; errors lists every problem found"""
+    
+    def __init__(self, errors):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+def validate_template(text):
+    """Problems with a template's placeholders, as messages for the user (empty when valid)"""
+    try:
+        parsed = list(_formatter.parse(text))
+    except ValueError as e:
+        return [f"Unbalanced braces: {e}. Write {{{{ and }}}} for literal braces."]
+    
+    errors = []
+    for _, field, format_spec, _ in parsed:
+        if field is None:
+            continue
+        name = field.split('.')[0].split('[')[0]
+        if name == "" or name.isdigit():
+            errors.append("Placeholders need a name, e.g. {member_name}; {} and {0} are not allowed.")
+        elif name not in TEMPLATE_VARIABLES:
+            errors.append(f"Unknown placeholder {{{field}}}. Available: "
+                          + ", ".join(f"{{{variable}}}" for variable in TEMPLATE_VARIABLES))
+        elif name != field:
+            errors.append(f"{{{field}}}: attribute and index lookups are not allowed.")
+        elif format_spec and ('{' in format_spec):
+            errors.append(f"{{{field}}}: nested placeholders in format specs are not allowed.")
+    return errors
+
+class CompiledTemplate:
+    __slots__ = ('text', 'parts', 'fields')
+    
+    def __init__(self, text):
+        errors = validate_template(text)
+        if errors:
+            raise TemplateError(errors)
+        self.text = text
+        # (literal text, field name or None, format spec, conversion)
+        self.parts = tuple(_formatter.parse(text))
+        self.fields = frozenset(field for _, field, _, _ in self.parts if field is not None)
+    
+    def render(self, values):
+        pieces = []
+        for literal, field, format_spec, conversion in self.parts:
+            pieces.append(literal)
+            if field is None:
+                continue
+            value = values[field]
+            if conversion == 'r':
+                value = repr(value)
+            elif conversion in ('s', 'a'):
+                value = str(value) if conversion == 's' else ascii(value)
+            pieces.append(format(value, format_spec))
+        return "".join(pieces)
+
+@lru_cache(maxsize=256)
+def compile_template(text):
+    """Parse and validate a template once per distinct text; raises TemplateError"""
+    return CompiledTemplate(text)
+
+def template_values(member_data, due_date_fn=calculate_next_due_date, today=None):
+    """Placeholder values for one recipient; due_date_fn(payment_date, membership_type) gives the due date"""
+    membership_type = member_data.get('membership_type', 'Monthly Subscriber')
+    today = today or clock.today()
+    
+    due_date = member_data.get('next_due_date')
+    if due_date is None:
+        payment_date = member_data.get('payment_date', today)
+        if isinstance(payment_date, str):
+            payment_date = datetime.strptime(payment_date, '%Y-%m-%d').date()
+        due_date = due_date_fn(payment_date, membership_type)
+    
+    return {
+        'member_name': member_data.get('member_name', 'Member'),
+        'amount': member_data.get('amount', 0),
+        'due_date': due_date.strftime('%d-%m-%Y'),
+        'membership_type': membership_type,
+        'overdue_days': (today - due_date).days if today > due_date else 0,
+        'court_name': COURT_NAME,
+        'phone': CONTACT_PHONE,
+    }
+
+def render_template(template, member_data, due_date_fn=calculate_next_due_date, today=None):
+    """Render a template (text or CompiledTemplate) for one recipient"""
+    if not isinstance(template, CompiledTemplate):
+        template = compile_template(template)
+    return template.render(template_values(member_data, due_date_fn, today))
+
+class TemplateEngine:
+    """Compiled templates from message_templates, cached by template type and version"""
+    
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self.lock = threading.Lock()
+        # template_type -> (version, CompiledTemplate)
+        self.cache = {}
+    
+    def get(self, template_type):
+        """The compiled current version of a template, or None when it is missing or invalid"""
+        record = self.db_manager.get_message_template_record(template_type)
+        if record is None:
+            return None
+        text, version = record
+        
+        with self.lock:
+            cached = self.cache.get(template_type)
+            if cached and cached[0] == version:
+                return cached[1]
+        try:
+            compiled = compile_template(text)
+        except TemplateError as e:
+            print(f"Template {template_type} (version {version}) is invalid: {e}")
+            return None
+        with self.lock:
+            self.cache[template_type] = (version, compiled)
+        return compiled
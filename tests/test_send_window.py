@@ -0,0 +1,93 @@
+"""Send-window slots, quiet hours and the outbox's use of them.
+
+Run with `python -m unittest discover tests` (or pytest) from the project root.
+"""
+
+import io
+import os
+import sqlite3
+import tempfile
+import unittest
+import contextlib
+from datetime import datetime, time
+
+from clock import VirtualClock
+from database import DatabaseManager
+from message_retry import SendResult, TRANSIENT
+from outbox import Outbox, PRIORITY_OVERDUE, PRIORITY_NORMAL
+from send_window import SendWindow
+
+START = datetime(2031, 1, 1, 9, 0)
+
+class SendWindowTest(unittest.TestCase):
+    def test_slots_spread_evenly_over_the_rest_of_the_window(self):
+        window = SendWindow((time(9), time(20)), rate_per_minute=30)
+        slots = window.slots(4, datetime(2031, 1, 1, 16, 0))
+        self.assertEqual(slots, [datetime(2031, 1, 1, 16, 0), datetime(2031, 1, 1, 17, 0),
+                                 datetime(2031, 1, 1, 18, 0), datetime(2031, 1, 1, 19, 0)])
+    
+    def test_quiet_hours_split_the_window(self):
+        window = SendWindow((time(9), time(20)), [(time(13), time(14))], rate_per_minute=30)
+        slots = window.slots(4, datetime(2031, 1, 1, 12, 0))
+        # Seven open hours (12-13 and 14-20), so slots are 1h45m apart and skip the quiet hour
+        self.assertEqual(slots, [datetime(2031, 1, 1, 12, 0), datetime(2031, 1, 1, 14, 45),
+                                 datetime(2031, 1, 1, 16, 30), datetime(2031, 1, 1, 18, 15)])
+        self.assertTrue(all(window.is_open(slot) for slot in slots))
+    
+    def test_overflow_continues_in_the_next_window(self):
+        # One a minute, ten minutes left today: ten go out today, the rest from 09:00 tomorrow
+        window = SendWindow((time(9), time(20)), rate_per_minute=1)
+        slots = window.slots(12, datetime(2031, 1, 1, 19, 50))
+        self.assertEqual(slots[:10], [datetime(2031, 1, 1, 19, 50 + minute) for minute in range(10)])
+        self.assertEqual(slots[10:], [datetime(2031, 1, 2, 9, 0), datetime(2031, 1, 2, 9, 1)])
+    
+    def test_start_defaults_to_the_clock(self):
+        window = SendWindow((time(9), time(20)), clock=VirtualClock(datetime(2031, 1, 1, 21, 0)))
+        self.assertEqual(window.slots(1), [datetime(2031, 1, 2, 9, 0)])
+
+class OutboxSendWindowTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.clock = VirtualClock(START)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.db = DatabaseManager(os.path.join(self.directory.name, "court.db"), clock=self.clock)
+        self.window = SendWindow((time(9), time(20)), [(time(13), time(14))], rate_per_minute=30, clock=self.clock)
+        self.outbox = Outbox(self.db, send_window=self.window, clock=self.clock)
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def _reminder(self, key, priority):
+        return {'idempotency_key': key, 'source': "reminder", 'phone': "+919876500001", 'message': "Please pay",
+                'priority': priority}
+    
+    def _next_attempts(self):
+        conn = sqlite3.connect(self.db.db_path)
+        rows = dict(conn.execute('SELECT idempotency_key, next_attempt_at FROM outbox').fetchall())
+        conn.close()
+        return rows
+    
+    def test_plan_gives_overdue_rows_the_first_slots(self):
+        self.outbox.enqueue([self._reminder("upcoming-1", PRIORITY_NORMAL),
+                             self._reminder("upcoming-2", PRIORITY_NORMAL),
+                             self._reminder("overdue", PRIORITY_OVERDUE)])
+        self.assertEqual(self.outbox.plan(), 3)
+        
+        planned = self._next_attempts()
+        self.assertEqual(planned["overdue"], "2031-01-01 09:00:00")
+        self.assertLess(planned["overdue"], planned["upcoming-1"])
+        self.assertLess(planned["upcoming-1"], planned["upcoming-2"])
+    
+    def test_retry_in_quiet_hours_moves_to_the_end_of_them(self):
+        self.clock.set(datetime(2031, 1, 1, 12, 59, 30))
+        self.outbox.enqueue([self._reminder("retried", PRIORITY_NORMAL)])
+        rows = self.outbox.claim_batch()
+        self.assertEqual(len(rows), 1)
+        
+        # The backoff would retry at 13:00:30, inside the quiet hour
+        self.assertEqual(self.outbox.mark_failed([(rows[0], SendResult(False, error_class=TRANSIENT,
+                                                                        error="timeout"))]), 0)
+        self.assertEqual(self._next_attempts()["retried"], "2031-01-01 14:00:00")
+
+if __name__ == "__main__":
+    unittest.main()
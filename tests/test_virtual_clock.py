@@ -0,0 +1,107 @@
+"""Reminders, bounces, delivery statuses and archiving on a VirtualClock.
+
+Run with `python -m unittest discover tests` (or pytest) from the project root.
+"""
+
+import io
+import os
+import sqlite3
+import tempfile
+import unittest
+import contextlib
+from datetime import date, datetime
+
+from clock import VirtualClock
+from database import DatabaseManager
+from messaging import MessageManager
+from providers import ProviderRouter, MessageProvider
+from message_retry import SendResult
+from reminder_scheduler import ReminderScheduler
+from outbox import Outbox
+from email_channel import EmailProvider
+from status_webhook import StatusBuffer
+from archive_manager import ArchiveManager
+
+# Far enough from the real date that a datetime.now() slipping through lands outside every window
+START = datetime(2031, 1, 1, 9, 0)
+
+class RecordingProvider(MessageProvider):
+    name = "recording"
+    
+    def __init__(self):
+        self.sent = []
+    
+    def send(self, phone, message, channel):
+        self.sent.append(phone)
+        return SendResult(True, sid=f"SM{len(self.sent)}"), None
+
+class VirtualClockTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.clock = VirtualClock(START)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.db = DatabaseManager(os.path.join(self.directory.name, "court.db"), clock=self.clock)
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def test_daily_reminders_match_forecast(self):
+        members = [("Monthly Subscriber", "2030-12-20", 7), ("Quarterly", "2030-11-01", 10),
+                   ("Annual", "2030-02-01", 30), ("Monthly Subscriber", "2030-10-01", 5)]
+        for index, (membership_type, payment_date, reminder_days) in enumerate(members):
+            self.db.add_member(f"Member {index}", f"+9198765000{index:02d}", "", membership_type, 1000 + index,
+                               payment_date, reminder_days, "")
+        provider = RecordingProvider()
+        message_manager = MessageManager(router=ProviderRouter({'recording': provider},
+                                                               {'SMS': [('recording', 'SMS')]}), clock=self.clock)
+        scheduler = ReminderScheduler(clock=self.clock)
+        forecast = scheduler.forecast_reminders(self.db, end_date=date(2031, 3, 31), payment_delay_days=1000,
+                                                budget=None)
+        
+        outbox = Outbox(self.db, clock=self.clock)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(90):
+                scheduler.schedule_automatic_reminders(self.db, message_manager, budget=None)
+                # Whatever the send window planned for later in the day goes out before the next run
+                self.clock.advance(hours=14)
+                outbox.drain(message_manager)
+                self.clock.advance(hours=10)
+        
+        conn = sqlite3.connect(self.db.db_path)
+        queued = dict(conn.execute('SELECT date(created_at), COUNT(*) FROM outbox GROUP BY 1').fetchall())
+        conn.close()
+        predicted = {row.date.isoformat(): row.messages for row in forecast.itertuples() if row.messages}
+        self.assertTrue(predicted)
+        self.assertEqual(queued, predicted)
+        self.assertEqual(len(provider.sent), sum(predicted.values()))
+    
+    def test_soft_bounces_count_in_the_clock_window(self):
+        provider = EmailProvider(None, "court@example.com", clock=self.clock)
+        for _ in range(3):
+            provider._bounce("Parent@Example.com", 450, "Mailbox busy")
+        self.db.log_email_bounces(provider.drain_bounces())
+        self.assertEqual(self.db.get_suppressed_emails(), {"parent@example.com"})
+        
+        self.clock.advance(days=31)
+        self.assertEqual(self.db.get_suppressed_emails(), set())
+    
+    def test_status_updates_count_in_the_clock_window(self):
+        buffer = StatusBuffer(self.db)
+        buffer.add("SM1", "delivered")
+        buffer.add("SM2", "undelivered", error_code=30003)
+        buffer.flush()
+        self.assertEqual(self.db.get_message_status_counts(days=7), {'delivered': 1, 'undelivered': 1})
+        
+        self.clock.advance(days=8)
+        self.assertEqual(self.db.get_message_status_counts(days=7), {})
+    
+    def test_archive_cutoff_follows_the_clock(self):
+        self.db.log_reminder(1, "payment_reminder", "Please pay")
+        archive = ArchiveManager(self.db, horizon_days=365)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(archive.archive_old_rows()['reminder_logs'], 0)
+            self.clock.advance(days=400)
+            self.assertEqual(archive.archive_old_rows()['reminder_logs'], 1)
+
+if __name__ == "__main__":
+    unittest.main()
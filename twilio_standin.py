@@ -0,0 +1,367 @@
+"""Local stand-in for the parts of the Twilio REST API that MessageManager uses.
+
+Usage:
+    python twilio_standin.py --port 8099 --latency-ms 150 --failure-rate 0.02 --rate-limit 50
+    TWILIO_API_BASE_URL=http://127.0.0.1:8099 TWILIO_ACCOUNT_SID=ACtest TWILIO_AUTH_TOKEN=test \\
+        TWILIO_PHONE_NUMBER=+15005550006 streamlit run app.py
+
+Endpoints (all under /2010-04-01):
+    POST /Accounts/{AccountSid}/Messages.json          create a message
+    GET  /Accounts/{AccountSid}/Messages/{Sid}.json    fetch a message
+    GET  /Accounts/{AccountSid}.json                   fetch the account (test_connection)
+
+Requests get the configured latency, a share of them fail with a 500, and
+above the rate limit they are rejected with 429 and a Retry-After header,
+like Twilio's 20429 error. When a message has a StatusCallback (or the server
+has a default callback URL) the stand-in posts "sent" and then "delivered" or
+"undelivered" to it in the background (signed with the auth token, if one is
+configured). GET /_standin/stats returns request
+counters and POST /_standin/reset clears them. Nothing is ever sent.
+"""
+
+import re
+import json
+import time
+import uuid
+import queue
+import base64
+import random
+import argparse
+import threading
+import urllib.parse
+import urllib.request
+from collections import deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from twilio.request_validator import RequestValidator
+
+API_VERSION = "2010-04-01"
+ACCOUNT_PATH = re.compile(r'^/2010-04-01/Accounts/(?P<account>AC\w+)\.json$')
+MESSAGES_PATH = re.compile(r'^/2010-04-01/Accounts/(?P<account>AC\w+)/Messages\.json$')
+MESSAGE_PATH = re.compile(r'^/2010-04-01/Accounts/(?P<account>AC\w+)/Messages/(?P<sid>SM\w+)\.json$')
+PHONE_NUMBER = re.compile(r'^(whatsapp:)?\+[1-9]\d{6,14}$')
+
+class StandinConfig:
+    def __init__(self, latency_ms=100, latency_jitter_ms=20, failure_rate=0.0, rate_limit=0,
+                 retry_after_seconds=1, auth_token=None, callback_url=None, callback_delay_ms=200,
+                 undelivered_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        # Share of create requests answered with a 500
+        self.failure_rate = failure_rate
+        # Accepted create requests per second (0 = unlimited); the rest get 429
+        self.rate_limit = rate_limit
+        self.retry_after_seconds = retry_after_seconds
+        # When set, the Basic auth password must match
+        self.auth_token = auth_token
+        # Default StatusCallback for messages created without one
+        self.callback_url = callback_url
+        self.callback_delay_ms = callback_delay_ms
+        # Share of messages whose final callback is "undelivered"
+        self.undelivered_rate = undelivered_rate
+        self.random = random.Random(seed)
+
+def _twilio_time(moment=None):
+    return (moment or datetime.now(timezone.utc)).strftime('%a, %d %b %Y %H:%M:%S +0000')
+
+def _error(status, code, message, headers=None):
+    """(status, Twilio-style error body, headers)"""
+    return status, {
+        'code': code,
+        'message': message,
+        'more_info': f"https://www.twilio.com/docs/errors/{code}",
+        'status': status,
+    }, headers or {}
+
+class TwilioStandin:
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or StandinConfig()
+        self.messages = {}
+        self.lock = threading.Lock()
+        self.accepted_times = deque()
+        self.callbacks = queue.Queue()
+        self.stats = {}
+        self.reset_stats()
+        self.server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.server.daemon_threads = True
+        self._threads = []
+    
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {
+                'requests': 0,
+                'created': 0,
+                'failed': 0,
+                'throttled': 0,
+                'rejected': 0,
+                'unauthorized': 0,
+                'callbacks_sent': 0,
+                'callbacks_failed': 0,
+            }
+    
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats, messages=len(self.messages))
+    
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+    
+    def start(self):
+        """Serve in background threads; returns self so it can be used inline"""
+        for target in (self.server.serve_forever, self._deliver_callbacks):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+    
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.callbacks.put(None)
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc_info):
+        self.stop()
+    
+    def _sleep_latency(self):
+        config = self.config
+        delay_ms = config.latency_ms + config.random.uniform(-config.latency_jitter_ms, config.latency_jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+    
+    def _throttled(self):
+        """True when accepting one more create request would exceed the rate limit"""
+        if not self.config.rate_limit:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            while self.accepted_times and now - self.accepted_times[0] >= 1:
+                self.accepted_times.popleft()
+            if len(self.accepted_times) >= self.config.rate_limit:
+                return True
+            self.accepted_times.append(now)
+            return False
+    
+    def _authorized(self, headers, account_sid):
+        header = headers.get('Authorization', '')
+        if not header.startswith('Basic '):
+            return False
+        try:
+            username, _, password = base64.b64decode(header[6:]).decode('utf-8').partition(':')
+        except ValueError:
+            return False
+        if username != account_sid:
+            return False
+        return self.config.auth_token is None or password == self.config.auth_token
+    
+    def handle(self, method, path, headers, form):
+        """Route one request; returns (status, body dict, extra headers)"""
+        self._count('requests')
+        if path == '/_standin/stats' and method == 'GET':
+            return 200, self.snapshot(), {}
+        if path == '/_standin/reset' and method == 'POST':
+            self.reset_stats()
+            return 200, self.snapshot(), {}
+        
+        match = MESSAGES_PATH.match(path) or MESSAGE_PATH.match(path) or ACCOUNT_PATH.match(path)
+        if not match:
+            return _error(404, 20404, "The requested resource was not found")
+        if not self._authorized(headers, match.group('account')):
+            self._count('unauthorized')
+            return _error(401, 20003, "Authentication Error - invalid username")
+        
+        self._sleep_latency()
+        account_sid = match.group('account')
+        if match.re is ACCOUNT_PATH and method == 'GET':
+            return 200, {
+                'sid': account_sid,
+                'friendly_name': "Local Twilio stand-in",
+                'status': "active",
+                'type': "Trial",
+            }, {}
+        if match.re is MESSAGE_PATH and method == 'GET':
+            with self.lock:
+                message = self.messages.get(match.group('sid'))
+            if message is None:
+                return _error(404, 20404, "The requested resource was not found")
+            return 200, message, {}
+        if match.re is MESSAGES_PATH and method == 'POST':
+            return self._create_message(account_sid, form)
+        return _error(405, 20004, "Method not allowed")
+    
+    def _create_message(self, account_sid, form):
+        if self._throttled():
+            self._count('throttled')
+            return _error(429, 20429, "Too Many Requests", {'Retry-After': str(self.config.retry_after_seconds)})
+        
+        to, from_number, body = form.get('To', ''), form.get('From', ''), form.get('Body', '')
+        if not to:
+            self._count('rejected')
+            return _error(400, 21604, "A 'To' phone number is required.")
+        if not PHONE_NUMBER.match(to):
+            self._count('rejected')
+            return _error(400, 21211, f"The 'To' number {to} is not a valid phone number.")
+        if not body:
+            self._count('rejected')
+            return _error(400, 21602, "Message body is required.")
+        if self.config.random.random() < self.config.failure_rate:
+            self._count('failed')
+            return _error(500, 20500, "Internal Server Error")
+        
+        sid = "SM" + uuid.uuid4().hex
+        now = _twilio_time()
+        message = {
+            'sid': sid,
+            'account_sid': account_sid,
+            'to': to,
+            'from': from_number,
+            'body': body,
+            'status': "queued",
+            'num_segments': "1",
+            'direction': "outbound-api",
+            'api_version': API_VERSION,
+            'date_created': now,
+            'date_updated': now,
+            'date_sent': None,
+            'error_code': None,
+            'error_message': None,
+            'price': None,
+            'price_unit': "USD",
+            'uri': f"/{API_VERSION}/Accounts/{account_sid}/Messages/{sid}.json",
+        }
+        with self.lock:
+            self.messages[sid] = message
+            self.stats['created'] += 1
+        
+        callback_url = form.get('StatusCallback') or self.config.callback_url
+        if callback_url:
+            self.callbacks.put((time.monotonic() + self.config.callback_delay_ms / 1000, callback_url, sid))
+        return 201, message, {}
+    
+    def _deliver_callbacks(self):
+        while True:
+            item = self.callbacks.get()
+            if item is None:
+                return
+            due, callback_url, sid = item
+            time.sleep(max(due - time.monotonic(), 0))
+            
+            undelivered = self.config.random.random() < self.config.undelivered_rate
+            for status in ("sent", "undelivered" if undelivered else "delivered"):
+                with self.lock:
+                    message = self.messages[sid]
+                    message['status'] = status
+                    message['date_updated'] = _twilio_time()
+                    if status == "sent":
+                        message['date_sent'] = message['date_updated']
+                    if status == "undelivered":
+                        message['error_code'] = 30003
+                        message['error_message'] = "Unreachable destination handset"
+                    payload = {
+                        'MessageSid': sid,
+                        'SmsSid': sid,
+                        'AccountSid': message['account_sid'],
+                        'From': message['from'],
+                        'To': message['to'],
+                        'MessageStatus': status,
+                        'SmsStatus': status,
+                        'ApiVersion': API_VERSION,
+                    }
+                    if status == "undelivered":
+                        payload['ErrorCode'] = "30003"
+                self._post_callback(callback_url, payload)
+    
+    def _post_callback(self, callback_url, payload):
+        data = urllib.parse.urlencode(payload).encode('utf-8')
+        request = urllib.request.Request(callback_url, data=data, method='POST')
+        if self.config.auth_token:
+            # Signed like Twilio does, so receivers can validate X-Twilio-Signature
+            signature = RequestValidator(self.config.auth_token).compute_signature(callback_url, payload)
+            request.add_header('X-Twilio-Signature', signature)
+        try:
+            with urllib.request.urlopen(request, timeout=5):
+                pass
+            self._count('callbacks_sent')
+        except OSError as e:
+            print(f"Status callback to {callback_url} failed: {e}")
+            self._count('callbacks_failed')
+
+def _make_handler(standin):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, so pooled clients reuse connections as they would with Twilio
+        protocol_version = "HTTP/1.1"
+        
+        def _respond(self, method):
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length).decode('utf-8') if length else ""
+            form = dict(urllib.parse.parse_qsl(raw))
+            path = urllib.parse.urlsplit(self.path).path
+            
+            status, body, extra_headers = standin.handle(method, path, self.headers, form)
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            for name, value in extra_headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+        
+        def do_GET(self):
+            self._respond('GET')
+        
+        def do_POST(self):
+            self._respond('POST')
+        
+        def log_message(self, format, *args):
+            pass
+    
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Twilio-compatible stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of sends answered with a 500")
+    parser.add_argument("--rate-limit", type=int, default=0, help="Accepted sends per second (0 = unlimited)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on 429")
+    parser.add_argument("--auth-token", help="Require this auth token (default: accept any)")
+    parser.add_argument("--callback-url", help="Default StatusCallback URL")
+    parser.add_argument("--callback-delay-ms", type=float, default=200)
+    parser.add_argument("--undelivered-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    
+    config = StandinConfig(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.jitter_ms,
+        failure_rate=args.failure_rate,
+        rate_limit=args.rate_limit,
+        retry_after_seconds=args.retry_after,
+        auth_token=args.auth_token,
+        callback_url=args.callback_url,
+        callback_delay_ms=args.callback_delay_ms,
+        undelivered_rate=args.undelivered_rate,
+        seed=args.seed
+    )
+    standin = TwilioStandin(config, args.host, args.port).start()
+    print(f"Twilio stand-in listening on {standin.base_url} (set TWILIO_API_BASE_URL to this)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        standin.stop()
+
+if __name__ == "__main__":
+    main()
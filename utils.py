@@ -1,6 +1,8 @@
 import re
 from datetime import datetime, timedelta
 
+import clock
+
 def format_phone_number(phone):
     """Format phone number to international format"""
     # Remove all non-digit characters
@@ -20,6 +22,18 @@ def format_phone_number(phone):
     
     return phone
 
+def normalize_phone(phone):
+    """Phone in +<country code> form, e.g. for WhatsApp links (numbers without a country code are Indian)"""
+    phone = phone.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
+    
+    if not phone.startswith('+'):
+        if phone.startswith('91'):
+            phone = '+' + phone
+        else:
+            phone = '+91' + phone
+    
+    return phone
+
 def validate_phone_number(phone):
     """Validate phone number format"""
     # Remove all non-digit characters
@@ -35,15 +49,25 @@ def validate_phone_number(phone):
     
     return False
 
+# Days a payment covers per membership type; anything else is treated as monthly
+MEMBERSHIP_PERIOD_DAYS = {
+    "Monthly Subscriber": 30,
+    "Quarterly": 90,
+    "Half Yearly": 180,
+    "Annual": 365
+}
+DEFAULT_PERIOD_DAYS = 30
+
 def calculate_membership_duration(membership_type):
     """Calculate duration in days for different membership types"""
-    duration_map = {
-        "Monthly Subscriber": 30,
-        "Quarterly": 90,
-        "Half Yearly": 180,
-        "Annual": 365
-    }
-    return duration_map.get(membership_type, 30)
+    return MEMBERSHIP_PERIOD_DAYS.get(membership_type, DEFAULT_PERIOD_DAYS)
+
+def calculate_next_due_date(payment_date, membership_type):
+    """Calculate the next due date based on membership type"""
+    if isinstance(payment_date, str):
+        payment_date = datetime.strptime(payment_date, '%Y-%m-%d').date()
+    
+    return payment_date + timedelta(days=calculate_membership_duration(membership_type))
 
 def format_currency(amount):
     """Format amount in Indian Rupees"""
@@ -60,7 +84,7 @@ def calculate_age_from_dob(date_of_birth):
     if isinstance(date_of_birth, str):
         date_of_birth = datetime.strptime(date_of_birth, '%Y-%m-%d').date()
     
-    today = datetime.now().date()
+    today = clock.today()
     age = today.year - date_of_birth.year
     
     # Adjust if birthday hasn't occurred this year
@@ -74,7 +98,7 @@ def generate_member_id(name, phone):
     # Take first 3 letters of name and last 4 digits of phone
     name_part = re.sub(r'[^a-zA-Z]', '', name)[:3].upper()
     phone_part = phone[-4:] if len(phone) >= 4 else phone
-    timestamp = datetime.now().strftime('%m%d')
+    timestamp = clock.now().strftime('%m%d')
     
     return f"{name_part}{phone_part}{timestamp}"
 
@@ -89,7 +113,7 @@ def validate_email(email):
 def get_next_business_day(date_obj=None):
     """Get next business day (Monday-Friday)"""
     if date_obj is None:
-        date_obj = datetime.now().date()
+        date_obj = clock.today()
     
     # If it's Friday (4), Saturday (5), or Sunday (6), move to Monday
     if date_obj.weekday() >= 4:
@@ -145,7 +169,7 @@ def export_data_summary(members_data, kids_data):
         'active_members': 0
     }
     
-    today = datetime.now().date()
+    today = clock.today()
     
     for member in members_data:
         summary['total_monthly_revenue'] += member.get('amount', 0)
@@ -0,0 +1,101 @@
+"""WhatsApp click-to-chat link sheets for manual sending.
+
+When Twilio isn't configured, reminders and announcements are sent by hand
+from wa.me links. build_reminder_links renders every reminder from one
+compiled template and builds all links in one pass; the result is a plain
+list of dicts the app pages through and offers as a CSV or standalone HTML
+link sheet.
+"""
+
+import io
+import csv
+import html
+import urllib.parse
+from datetime import datetime
+
+from template_engine import compile_template, render_template
+from utils import normalize_phone
+
+LINKS_PER_PAGE = 25
+SHEET_COLUMNS = ['name', 'phone', 'details', 'message', 'url']
+
+def whatsapp_url(phone, encoded_message):
+    """wa.me link for a phone in any of the app's formats and an already URL-encoded message"""
+    return f"https://wa.me/{normalize_phone(phone).lstrip('+')}?text={encoded_message}"
+
+def build_reminder_links(reminders, template):
+    """One link per reminder; template is the template text or a CompiledTemplate, compiled once"""
+    if isinstance(template, str):
+        template = compile_template(template)
+    links = []
+    for reminder in reminders:
+        message = render_template(template, reminder)
+        links.append({
+            'member_id': reminder['member_id'],
+            'name': reminder['member_name'],
+            'phone': reminder['phone'],
+            'details': f"₹{reminder['amount']} | {reminder['membership_type']}",
+            'message': message,
+            'url': whatsapp_url(reminder['phone'], urllib.parse.quote(message)),
+        })
+    return links
+
+def build_announcement_links(recipients, message):
+    """One link per recipient for the same announcement (encoded once)"""
+    encoded_message = urllib.parse.quote(message)
+    return [{
+        'member_id': recipient['id'],
+        'name': recipient['name'],
+        'phone': recipient['phone'],
+        'details': f"Type: {recipient.get('membership_type', 'Member')}",
+        'message': message,
+        'url': whatsapp_url(recipient['phone'], encoded_message),
+    } for recipient in recipients]
+
+def page_count(links, per_page=LINKS_PER_PAGE):
+    return max((len(links) + per_page - 1) // per_page, 1)
+
+def links_page(links, page, per_page=LINKS_PER_PAGE):
+    """Links on a 1-based page"""
+    start = (page - 1) * per_page
+    return links[start:start + per_page]
+
+def link_sheet_csv(links):
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=SHEET_COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    writer.writerows(links)
+    return output.getvalue()
+
+def link_sheet_html(links, title):
+    """Standalone HTML page with one Open WhatsApp button per recipient"""
+    rows = "\n".join(
+        f"<tr><td>{index}</td><td><strong>{html.escape(link['name'])}</strong><br>"
+        f"<small>{html.escape(link['phone'])} · {html.escape(link['details'])}</small></td>"
+        f"<td class=\"message\">{html.escape(link['message'])}</td>"
+        f"<td><a class=\"button\" href=\"{html.escape(link['url'])}\" target=\"_blank\">Open WhatsApp</a></td></tr>"
+        for index, link in enumerate(links, 1)
+    )
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)}</title>
+<style>
+body {{ font-family: sans-serif; margin: 2rem; }}
+table {{ border-collapse: collapse; width: 100%; }}
+td, th {{ border-bottom: 1px solid #ddd; padding: 0.5rem; vertical-align: top; text-align: left; }}
+td.message {{ white-space: pre-wrap; font-size: 0.9rem; color: #333; }}
+a.button {{ background: #25D366; color: white; padding: 0.5rem 1rem; border-radius: 5px; text-decoration: none; font-weight: bold; white-space: nowrap; }}
+</style>
+</head>
+<body>
+<h1>{html.escape(title)}</h1>
+<p>{len(links)} recipients · generated {datetime.now().strftime('%d-%m-%Y %H:%M')}</p>
+<table>
+<tr><th>#</th><th>Recipient</th><th>Message</th><th></th></tr>
+{rows}
+</table>
+</body>
+</html>
+"""